@@ -14,6 +14,7 @@ hiddenimports = [
     'PIL',
     'PIL.Image',
     'PIL.ImageTk',
+    'numpy',
     'selenium',
     'selenium.webdriver',
     'selenium.webdriver.chrome',
@@ -37,6 +38,31 @@ hiddenimports = [
     'src.screenshot_capture',
     'src.screenshot_management',
     'src.qa_features',
+    'src.retention',
+    'src.recompression',
+    'src.content_store',
+    'src.thumbnails',
+    'src.capture_pipeline',
+    'src.capture_metadata',
+    'src.history_index',
+    'src.visual_diff',
+    'src.change_regions',
+    'src.perceptual_hash',
+    'src.baseline_store',
+    'src.color_analysis',
+    'src.layout_similarity',
+    'src.masking',
+    'src.image_composer',
+    'src.contact_sheet',
+    'src.run_manifest',
+    'src.report_writer',
+    'src.pdf_report',
+    'src.background_jobs',
+    'src.run_diff',
+    'src.report_export',
+    'src.report_server',
+    'src.batch_capture',
+    'src.png_stream',
 ]
 
 a = Analysis(
@@ -48,7 +74,7 @@ a = Analysis(
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    excludes=['matplotlib'],
     win_no_prefer_redirects=False,
     win_private_assemblies=False,
     cipher=block_cipher,
@@ -0,0 +1,119 @@
+"""
+Startup benchmark for ScreenQA
+
+Measures how long `import main` takes (with a per-module breakdown from
+python -X importtime) and the time until the main window is drawn, each in a
+fresh interpreter. Fails when a budget is exceeded or when a dependency that
+should load lazily (selenium, reportlab, ...) is imported during startup.
+
+    python benchmark_startup.py [--runs 5] [--max-import-ms 600] [--max-window-ms 1500]
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Feature dependencies that must not be imported before their feature is used
+LAZY_MODULES = ('selenium', 'webdriver_manager', 'reportlab', 'matplotlib', 'requests', 'bs4')
+
+_WINDOW_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import tkinter as tk
+import main
+root = tk.Tk()
+app = main.ScreenQAApp(root)
+root.update()
+elapsed = (time.perf_counter() - started) * 1000
+root.destroy()
+print(json.dumps({'window_ms': elapsed, 'loaded': [m for m in %r if m in sys.modules]}))
+""" % (LAZY_MODULES,)
+
+
+def _run(args):
+    return subprocess.run([sys.executable] + args, cwd=ROOT, capture_output=True, text=True)
+
+
+def trace_imports():
+    """
+    Import main once under -X importtime
+    Returns: (total ms, [(cumulative ms, module)] sorted slowest first, loaded lazy modules)
+    """
+    result = _run(['-X', 'importtime', '-c',
+                   f"import json, sys, main; print(json.dumps([m for m in {LAZY_MODULES!r} if m in sys.modules]))"])
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    modules = []
+    total_us = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len('import time:'):].split('|'))
+        modules.append((int(cumulative) / 1000, name.strip()))
+        if name == 'main':
+            total_us = int(cumulative)
+    modules.sort(reverse=True)
+    return total_us / 1000, modules, json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def time_first_window():
+    """Milliseconds from interpreter start of the script to the first drawn window, or None without a display"""
+    result = _run(['-c', _WINDOW_SCRIPT])
+    if result.returncode != 0:
+        if 'TclError' in result.stderr:
+            return None
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure ScreenQA startup time")
+    parser.add_argument('--runs', type=int, default=5, help="Fresh interpreters per measurement")
+    parser.add_argument('--max-import-ms', type=float, default=600, help="Budget for import main")
+    parser.add_argument('--max-window-ms', type=float, default=1500, help="Budget for the first window")
+    parser.add_argument('--top', type=int, default=10, help="Slowest imports to list")
+    args = parser.parse_args()
+
+    failures = []
+
+    import_times = []
+    for _ in range(args.runs):
+        total, modules, loaded = trace_imports()
+        import_times.append(total)
+    import_ms = statistics.median(import_times)
+    print(f"import main: {import_ms:.0f} ms (median of {args.runs}, budget {args.max_import_ms:.0f} ms)")
+    for cumulative, name in modules[:args.top]:
+        print(f"  {cumulative:8.1f} ms  {name}")
+    if import_ms > args.max_import_ms:
+        failures.append(f"import main took {import_ms:.0f} ms")
+    if loaded:
+        failures.append(f"imported at startup: {', '.join(loaded)}")
+
+    window_times = []
+    for _ in range(args.runs):
+        window = time_first_window()
+        if window is None:
+            print("first window: skipped (no display)")
+            break
+        window_times.append(window['window_ms'])
+        if window['loaded']:
+            failures.append(f"imported while opening the window: {', '.join(window['loaded'])}")
+    if window_times:
+        window_ms = statistics.median(window_times)
+        print(f"first window: {window_ms:.0f} ms (median of {len(window_times)}, budget {args.max_window_ms:.0f} ms)")
+        if window_ms > args.max_window_ms:
+            failures.append(f"first window took {window_ms:.0f} ms")
+
+    for failure in sorted(set(failures)):
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
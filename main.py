@@ -8,11 +8,17 @@ import webbrowser
 import subprocess
 from datetime import datetime
 import json
+import re
 import threading
 
 # Add src directory to path for imports
 sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
 from screenshot_capture import ScreenshotCapture, AsyncScreenshotCapture
+from retention import RetentionEngine, RetentionPolicy, ColdStorage, format_retention_report
+from thumbnails import load_thumbnail, GALLERY_SIZE, html_url, report_thumbnails, thumbnail_img_attributes
+from report_writer import render_change_regions, render_layout_note
+from baseline_store import BaselineStore
+from background_jobs import JobRunner
 
 
 class ScreenQAApp:
@@ -30,9 +36,13 @@ class ScreenQAApp:
         self.url_var = tk.StringVar()
         self.selected_devices = []
         self.current_results = {}
+        self.current_manifest = None  # Run manifest the current results were read from
         self.device_vars = {}  # Initialize device variables dictionary
         self.screenshot_mode_var = tk.StringVar(value="viewport_only")  # Screenshot mode selection - default to viewport
         self.result_data = {}  # Store result data for tree items
+        self.jobs = JobRunner(root)  # Report generation runs here, off the UI thread
+        self.pending_reports = set()  # Report paths claimed by queued or running report jobs
+        self.report_server = None
         
         # Setup UI
         self.setup_ui()
@@ -431,7 +441,20 @@ class ScreenQAApp:
         file_menu.add_command(label="New Capture", command=self.start_capture, accelerator="Ctrl+Enter")
         file_menu.add_separator()
         file_menu.add_command(label="Open Screenshots Folder", command=self.open_screenshots_folder)
-        file_menu.add_command(label="Export Report", command=self.generate_report)
+        export_menu = tk.Menu(file_menu, tearoff=0)
+        file_menu.add_cascade(label="Export Report", menu=export_menu)
+        export_menu.add_command(label="HTML Report", command=lambda: self.generate_report('html'))
+        export_menu.add_command(label="PDF Report", command=lambda: self.generate_report('pdf'))
+        export_menu.add_command(label="Comparison Image", command=lambda: self.generate_report('comparison'))
+        export_menu.add_command(label="Device Matrix", command=lambda: self.generate_report('matrix'))
+        export_menu.add_separator()
+        export_menu.add_command(label="Shareable HTML (single file)", command=lambda: self.generate_report('shareable'))
+        export_menu.add_command(label="Shareable Zip Bundle", command=lambda: self.generate_report('bundle'))
+        export_menu.add_separator()
+        export_menu.add_command(label="Run Report by URL...", command=lambda: self.generate_run_report('url'))
+        export_menu.add_command(label="Run Report by Device...", command=lambda: self.generate_run_report('device'))
+        export_menu.add_command(label="Compare Runs...", command=self.compare_runs)
+        file_menu.add_command(label="Cancel Report Jobs", command=self.cancel_reports)
         file_menu.add_separator()
         file_menu.add_command(label="Exit", command=self.root.quit, accelerator="Alt+F4")
         
@@ -442,6 +465,10 @@ class ScreenQAApp:
         tools_menu.add_command(label="Save Log", command=self.save_log, accelerator="Ctrl+S")
         tools_menu.add_separator()
         tools_menu.add_command(label="Refresh Gallery", command=self.refresh_gallery)
+        tools_menu.add_command(label="Storage Cleanup...", command=self.run_storage_cleanup)
+        tools_menu.add_command(label="Recompress Screenshots...", command=self.run_recompression)
+        tools_menu.add_command(label="Start/Stop Report Server", command=self.toggle_report_server)
+        tools_menu.add_command(label="Resume or Retry Run...", command=self.resume_run)
         tools_menu.add_command(label="Toggle Sidebar", command=self.toggle_actions_panel, accelerator="F9")
         
         # Device selection submenu
@@ -996,7 +1023,8 @@ class ScreenQAApp:
         
         ttk.Button(controls_frame, text="Refresh Gallery", command=self.refresh_gallery).grid(row=0, column=0, padx=(0, 5))
         ttk.Button(controls_frame, text="Open Screenshots Folder", command=self.open_screenshots_folder).grid(row=0, column=1, padx=(0, 5))
-        ttk.Button(controls_frame, text="Generate Report", command=self.generate_report).grid(row=0, column=2)
+        ttk.Button(controls_frame, text="Generate Report", command=self.generate_report).grid(row=0, column=2, padx=(0, 5))
+        ttk.Button(controls_frame, text="Cancel Reports", command=self.cancel_reports).grid(row=0, column=3)
         
         # Gallery area
         gallery_container = ttk.Frame(parent)
@@ -1029,7 +1057,8 @@ class ScreenQAApp:
         hist_controls.grid(row=0, column=0, sticky=(tk.W, tk.E), pady=(0, 10))
         
         ttk.Button(hist_controls, text="Refresh History", command=self.refresh_history).grid(row=0, column=0, padx=(0, 5))
-        ttk.Button(hist_controls, text="Clear History", command=self.clear_history).grid(row=0, column=1)
+        ttk.Button(hist_controls, text="Clear History", command=self.clear_history).grid(row=0, column=1, padx=(0, 5))
+        ttk.Button(hist_controls, text="Approve as Baseline", command=self.approve_history_baseline).grid(row=0, column=2)
         
         # History list
         hist_frame = ttk.Frame(parent)
@@ -1402,6 +1431,7 @@ class ScreenQAApp:
             self.results_tree.delete(item)
         
         self.current_results = {}
+        self.current_manifest = None
         self.result_data = {}  # Clear previous result data
         self.log_message("INFO", "🧹 Cleared previous results")
         
@@ -1475,9 +1505,13 @@ class ScreenQAApp:
                 size_str = "N/A"
                 resolution = "N/A"
 
-    def capture_complete_enhanced(self, results):
+    def capture_complete_enhanced(self, manifest):
         """Enhanced capture completion with detailed logging"""
+        # Results are read back from the run manifest the capture recorded them in
+        results = manifest.results()
+        self.current_manifest = manifest
         self.current_results = results
+        self.log_message("INFO", f"🗂️ Run {manifest.run_id} recorded in {manifest.path}")
         
         # Stop progress bar and re-enable capture button
         self.progress_bar.stop()
@@ -1500,7 +1534,10 @@ class ScreenQAApp:
                 try:
                     file_size = os.path.getsize(result['screenshot_path'])
                     size_str = f"{file_size / 1024:.1f} KB"
-                    self.log_message("SUCCESS", f"✅ {device_name}: Screenshot saved ({size_str}) - {result['screenshot_path']}")
+                    if result.get('deduplicated'):
+                        self.log_message("SUCCESS", f"♻️ {device_name}: Unchanged, stored once ({size_str}) - {result['screenshot_path']}")
+                    else:
+                        self.log_message("SUCCESS", f"✅ {device_name}: Screenshot saved ({size_str}) - {result['screenshot_path']}")
                 except Exception as e:
                     size_str = "Unknown"
                     self.log_message("WARNING", f"⚠️ {device_name}: File size unknown - {str(e)}")
@@ -1615,6 +1652,54 @@ class ScreenQAApp:
         # Refresh gallery and history
         self.refresh_gallery()
         self.refresh_history()
+        
+        self.check_baselines(results)
+    
+    def check_baselines(self, results):
+        """Compare fresh captures with their approved baselines as a background job and report pass/fail"""
+        screenshots_dir = self.capture.screenshots_dir
+        paths = {name: r['screenshot_path'] for name, r in results.items() if r['success'] and r.get('screenshot_path')}
+        if not paths or not BaselineStore(screenshots_dir).list_baselines():
+            return
+        
+        def work(job):
+            from screenshot_management import ScreenshotManager
+            manager = ScreenshotManager(screenshots_dir)
+            checks = {}
+            for index, (device_name, path) in enumerate(paths.items(), 1):
+                job.progress(f"Checking {device_name} ({index}/{len(paths)})")
+                diff = manager.compare_with_baseline(path)
+                if diff is not None:
+                    checks[device_name] = diff
+            return checks
+        
+        def complete(job):
+            if job.status == 'failed':
+                self.log_message("ERROR", f"❌ Baseline check failed: {job.error}")
+            if job.status != 'done' or not job.result:
+                return
+            for device_name, diff in job.result.items():
+                # Reports reuse the verdict unless a newer capture has replaced these results
+                if self.current_results is results:
+                    results[device_name]['visual_diff'] = diff
+                if diff['passed']:
+                    self.log_message("SUCCESS", f"✅ {device_name}: Matches approved baseline")
+                else:
+                    self.log_message("WARNING", f"❌ {device_name}: Differs from approved baseline - "
+                                                f"{diff['mismatch_percent']:.2f}% changed in "
+                                                f"{diff['regions_total']} region(s) ({diff['overlay_path']})")
+            passed = sum(1 for diff in job.result.values() if diff['passed'])
+            self.status_var.set(f"Baseline check: {passed}/{len(job.result)} passed")
+            
+            # Show the verdict in the results panel, for the rows of this run
+            this_run = [id(result) for result in results.values()]
+            for item_id, result in getattr(self, 'result_data', {}).items():
+                diff = job.result.get(result.get('device')) if id(result) in this_run else None
+                if diff is not None and self.results_tree.exists(item_id):
+                    self.results_tree.set(item_id, 'Status', "Baseline pass" if diff['passed'] else "Baseline FAIL")
+        
+        job = self.jobs.submit("Baseline check", work, on_progress=self.report_progress, on_complete=complete)
+        self.log_message("INFO", f"🔍 Checking {len(paths)} capture(s) against approved baselines (job {job.id})")
     
     def open_screenshot(self, event):
         """Open selected screenshot"""
@@ -1660,8 +1745,7 @@ class ScreenQAApp:
             
             try:
                 # Load and resize image
-                img = Image.open(screenshot['filepath'])
-                img.thumbnail((200, 150), Image.Resampling.LANCZOS)
+                img = load_thumbnail(self.capture.screenshots_dir, screenshot['filepath'], GALLERY_SIZE)
                 photo = ImageTk.PhotoImage(img)
                 
                 # Image label
@@ -1697,11 +1781,11 @@ class ScreenQAApp:
                 size_str
             ))
     
-    def open_history_screenshot(self, event):
-        """Open screenshot from history"""
+    def get_selected_history_screenshot(self):
+        """History entry for the selected row, if any"""
         selection = self.history_tree.selection()
         if not selection:
-            return
+            return None
         
         item = self.history_tree.item(selection[0])
         # Find the screenshot file
@@ -1710,11 +1794,32 @@ class ScreenQAApp:
             if (screenshot['created'] == item['values'][0] and 
                 screenshot['domain'] == item['values'][1] and
                 screenshot['device'] == item['values'][2]):
-                self.open_file(screenshot['filepath'])
-                break
+                return screenshot
+        return None
+    
+    def open_history_screenshot(self, event):
+        """Open screenshot from history"""
+        screenshot = self.get_selected_history_screenshot()
+        if screenshot:
+            self.open_file(screenshot['filepath'])
+    
+    def approve_history_baseline(self):
+        """Approve the selected history capture as the baseline for its page, device and mode"""
+        screenshot = self.get_selected_history_screenshot()
+        if not screenshot:
+            messagebox.showinfo("Approve Baseline", "Select a screenshot in the history list first")
+            return
+        
+        try:
+            record = BaselineStore(self.capture.screenshots_dir).approve(screenshot['filepath'])
+            self.log_message("SUCCESS", f"📌 Baseline approved for {record['group_key']}: {record['filename']}")
+        except Exception as e:
+            self.log_message("ERROR", f"❌ Failed to approve baseline: {str(e)}")
+            messagebox.showerror("Error", f"Failed to approve baseline: {str(e)}")
     
     def open_file(self, filepath):
         """Open file with system default program"""
+        filepath = ColdStorage(self.capture.screenshots_dir).materialize(filepath)
         if os.path.exists(filepath):
             if sys.platform.startswith('win'):
                 os.startfile(filepath)
@@ -1738,34 +1843,317 @@ class ScreenQAApp:
                 for filename in os.listdir(self.capture.screenshots_dir):
                     if filename.endswith('.png'):
                         os.remove(os.path.join(self.capture.screenshots_dir, filename))
+                self.capture.content_store.gc()
                 self.refresh_history()
                 self.refresh_gallery()
                 messagebox.showinfo("History Cleared", "All screenshots have been deleted")
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to clear history: {str(e)}")
     
-    def generate_report(self):
-        """Generate a QA report"""
+    def run_storage_cleanup(self):
+        """Preview the retention policy from config/retention.json and apply it on confirmation, off the UI thread"""
+        config_path = os.path.join(os.path.dirname(__file__), 'config', 'retention.json')
+        policy = RetentionPolicy.load(config_path)
+        engine = RetentionEngine(self.capture.screenshots_dir)
+        
+        def planned(job):
+            if job.status != 'done':
+                self.log_message("ERROR", f"❌ Retention plan failed: {job.error}")
+                self.status_var.set("Storage cleanup failed")
+                return
+            report = job.result
+            summary = format_retention_report(report)
+            self.log_message("INFO", f"🧹 Retention dry run:\n{summary}")
+            self.status_var.set("Storage cleanup planned")
+            
+            if not report['delete'] and not report['cold']:
+                messagebox.showinfo("Storage Cleanup", "Nothing to clean up")
+                return
+            if messagebox.askyesno("Storage Cleanup", f"{summary}\n\nApply this retention policy?"):
+                # Deletes and cold-tier re-encoding can take minutes; the UI only hears about progress
+                self.jobs.submit("Storage cleanup",
+                                 lambda job: engine.apply(policy, dry_run=False, progress_callback=job.progress),
+                                 on_progress=self.report_progress, on_complete=applied)
+        
+        def applied(job):
+            if job.status == 'cancelled':
+                self.log_message("WARNING", "⏹️ Storage cleanup cancelled; captures already handled stay cleaned up")
+                self.status_var.set("Storage cleanup cancelled")
+                return
+            if job.status != 'done':
+                self.log_message("ERROR", f"❌ Retention failed: {job.error}")
+                self.status_var.set("Storage cleanup failed")
+                return
+            report = job.result
+            self.log_message("SUCCESS" if not report['errors'] else "WARNING",
+                             f"🧹 Retention applied:\n{format_retention_report(report)}")
+            self.status_var.set("Storage cleanup complete")
+            self.refresh_gallery()
+            self.refresh_history()
+        
+        self.jobs.submit("Storage cleanup plan", lambda job: engine.apply(policy, dry_run=True),
+                         on_complete=planned)
+        self.log_message("INFO", "🧹 Planning storage cleanup...")
+    
+    def run_recompression(self):
+        """Losslessly recompress every PNG capture on a process pool, as a background job"""
+        screenshots_dir = self.capture.screenshots_dir
+        if not messagebox.askyesno("Recompress Screenshots",
+                                   "Re-encode every PNG capture with maximum lossless compression?\n\n"
+                                   "Pixels are verified unchanged before a file is replaced; an interrupted "
+                                   "run continues where it stopped."):
+            return
+        
+        def work(job):
+            from recompression import batch_recompress
+            return batch_recompress(screenshots_dir, 'png_optimize', progress_callback=job.progress)
+        
+        def complete(job):
+            if job.status == 'cancelled':
+                self.log_message("WARNING", "⏹️ Recompression cancelled; finished files are kept and the next run resumes")
+                self.status_var.set("Recompression cancelled")
+                return
+            if job.status != 'done':
+                self.log_message("ERROR", f"❌ Recompression failed: {job.error}")
+                self.status_var.set("Recompression failed")
+                return
+            summary = job.result
+            self.log_message("SUCCESS" if not summary['errors'] else "WARNING",
+                             f"🗜️ Recompressed {summary['processed']} screenshots "
+                             f"({summary['resumed']} already done, {summary['errors']} errors), "
+                             f"saved {summary['bytes_saved'] / (1024 * 1024):.1f} MB")
+            self.status_var.set("Recompression complete")
+            self.refresh_gallery()
+            self.refresh_history()
+        
+        self.jobs.submit("Recompression", work, on_progress=self.report_progress, on_complete=complete)
+        self.log_message("INFO", "🗜️ Recompressing screenshots...")
+    
+    def generate_report(self, kind='html'):
+        """Generate a QA report (html, pdf, comparison, matrix, shareable or bundle) as a background job"""
         if not self.current_results:
             messagebox.showwarning("No Results", "Please capture some screenshots first")
             return
         
-        # Simple report generation
-        report_path = os.path.join(os.path.dirname(self.capture.screenshots_dir), 'reports', 
-                                 f'qa_report_{datetime.now().strftime("%Y%m%d_%H%M%S")}.html')
+        # Snapshot the inputs: a new capture may replace them while the report renders (and diffs are added)
+        results = {name: dict(result) for name, result in self.current_results.items()}
+        url = self.url_var.get()
+        screenshots_dir = self.capture.screenshots_dir
+        reports_dir = os.path.join(os.path.dirname(screenshots_dir), 'reports')
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        names = {'html': ('HTML report', f'qa_report_{timestamp}.html'),
+                 'pdf': ('PDF report', f'qa_report_{timestamp}.pdf'),
+                 'comparison': ('Comparison image', f'comparison_{timestamp}.png'),
+                 'matrix': ('Device matrix', f'device_matrix_{timestamp}.png'),
+                 'shareable': ('Shareable report', f'qa_report_{timestamp}_shareable.html'),
+                 'bundle': ('Report bundle', f'qa_report_{timestamp}.zip')}
+        label, filename = names[kind]
+        os.makedirs(reports_dir, exist_ok=True)
+        base, ext = os.path.splitext(filename)
+        stem, copy = base, 1
+        while True:
+            # Everything a report job writes: the report itself, or its _page<N> (matrix) / _part<N> (PDF) files
+            output_pattern = re.compile(re.escape(stem) + r'(_(page|part)\d+)?' + re.escape(ext) + '$')
+            report_path = os.path.join(reports_dir, stem + ext)
+            # Two reports of a kind started within a second get their own names, never each other's files
+            if report_path not in self.pending_reports and \
+                    not any(output_pattern.match(name) for name in os.listdir(reports_dir)):
+                break
+            copy += 1
+            stem = f'{base}_{copy}'
+        
+        def outputs():
+            return {os.path.join(reports_dir, name) for name in os.listdir(reports_dir) if output_pattern.match(name)}
+        
+        def build(job):
+            # Report modules pull in numpy and friends; load them with the first report
+            from screenshot_management import QAReportGenerator, ScreenshotManager, create_device_comparison_matrix
+            successful = {name: r for name, r in results.items() if r['success'] and r.get('screenshot_path')}
+            if kind in ('html', 'pdf', 'shareable', 'bundle'):
+                # Change regions against the approved baseline (or the previous capture) for every card,
+                # and the devices whose layout diverges from the rest
+                generator = QAReportGenerator(screenshots_dir, reports_dir)
+                generator.add_visual_diffs(results, progress_callback=job.progress)
+                generator.add_layout_similarity(results, progress_callback=job.progress)
+            if kind == 'html':
+                self.create_html_report(report_path, results, url, job.progress)
+            elif kind == 'pdf':
+                QAReportGenerator(screenshots_dir, reports_dir).generate_pdf_report(
+                    results, url, report_path, progress_callback=job.progress)
+            elif kind in ('shareable', 'bundle'):
+                QAReportGenerator(screenshots_dir, reports_dir).export_report(
+                    results, url, report_path, bundle=kind == 'bundle', progress_callback=job.progress)
+            elif kind == 'comparison':
+                if not ScreenshotManager(screenshots_dir).create_comparison_image(
+                        [r['screenshot_path'] for r in successful.values()], report_path,
+                        list(successful), columns=min(4, len(successful)) or None,
+                        progress_callback=job.progress):
+                    raise RuntimeError("A comparison needs at least two successful captures")
+            elif not create_device_comparison_matrix(results, report_path, screenshots_dir, job.progress):
+                raise RuntimeError("No successful captures to show")
+            # Large device matrices are split into _page<N> files
+            return report_path if os.path.exists(report_path) else os.path.join(reports_dir, f'{stem}_page1{ext}')
+        
+        def work(job):
+            existing = outputs()
+            try:
+                return build(job)
+            except BaseException:
+                # Cancelled or failed: remove the half-written report (or its parts) this job wrote, and only those
+                for path in outputs() - existing:
+                    try:
+                        os.remove(path)
+                    except OSError as e:
+                        print(f"Could not remove partial report {path}: {e}")
+                raise
+        
+        def complete(job):
+            self.pending_reports.discard(report_path)
+            self.report_complete(job)
+        
+        self.pending_reports.add(report_path)
+        job = self.jobs.submit(label, work, on_progress=self.report_progress, on_complete=complete)
+        self.log_message("INFO", f"📝 {label} queued (job {job.id}); you can keep capturing while it renders")
+        self.status_var.set(f"{label}: queued")
+    
+    def report_progress(self, job, message):
+        """Show the latest progress of a report job in the status bar"""
+        self.status_var.set(f"{job.name}: {message}")
+    
+    def report_complete(self, job):
+        """Notify the user when a report job finishes, fails or is cancelled"""
+        if job.status == 'done':
+            self.log_message("SUCCESS", f"✅ {job.name} saved to: {job.result}")
+            self.status_var.set(f"{job.name} ready")
+            messagebox.showinfo("Report Generated", f"Report saved to: {job.result}")
+            self.open_file(job.result)
+        elif job.status == 'cancelled':
+            self.log_message("WARNING", f"⏹️ {job.name} cancelled")
+            self.status_var.set(f"{job.name} cancelled")
+        else:
+            self.log_message("ERROR", f"❌ {job.name} failed: {job.error}")
+            self.status_var.set(f"{job.name} failed")
+            messagebox.showerror("Report Error", f"Failed to generate report: {job.error}")
+    
+    def generate_run_report(self, paginate='url'):
+        """Paginated HTML report for the current run (or a picked run manifest), as a background job"""
+        screenshots_dir = self.capture.screenshots_dir
+        if self.current_manifest is not None:
+            manifest_path = self.current_manifest.path
+        else:
+            manifest_path = filedialog.askopenfilename(
+                title="Select the run to report", initialdir=os.path.join(screenshots_dir, 'runs'),
+                filetypes=[("Run manifests", "*.jsonl"), ("All files", "*.*")])
+            if not manifest_path:
+                return
+        
+        reports_dir = os.path.join(os.path.dirname(screenshots_dir), 'reports')
+        
+        def work(job):
+            from screenshot_management import QAReportGenerator
+            return QAReportGenerator(screenshots_dir, reports_dir).generate_run_report(
+                manifest_path, paginate=paginate, progress_callback=job.progress)
+        
+        job = self.jobs.submit("Run report", work, on_progress=self.report_progress,
+                               on_complete=self.report_complete)
+        self.log_message("INFO", f"📝 Writing run report for {os.path.basename(manifest_path)}, "
+                                 f"one page per {paginate} (job {job.id})")
+    
+    def compare_runs(self):
+        """Pick two run manifests and report what changed between them, as a background job"""
+        screenshots_dir = self.capture.screenshots_dir
+        runs_dir = os.path.join(screenshots_dir, 'runs')
+        filetypes = [("Run manifests", "*.jsonl"), ("All files", "*.*")]
+        baseline = filedialog.askopenfilename(title="Select the earlier run", initialdir=runs_dir, filetypes=filetypes)
+        if not baseline:
+            return
+        candidate = filedialog.askopenfilename(title="Select the later run", initialdir=runs_dir, filetypes=filetypes)
+        if not candidate:
+            return
+        
+        reports_dir = os.path.join(os.path.dirname(screenshots_dir), 'reports')
         
-        os.makedirs(os.path.dirname(report_path), exist_ok=True)
+        def work(job):
+            from screenshot_management import QAReportGenerator
+            return QAReportGenerator(screenshots_dir, reports_dir).generate_run_diff(
+                baseline, candidate, progress_callback=job.progress)
+        
+        job = self.jobs.submit("Run comparison", work, on_progress=self.report_progress,
+                               on_complete=self.report_complete)
+        self.log_message("INFO", f"📝 Comparing {os.path.basename(baseline)} with {os.path.basename(candidate)} "
+                                 f"(job {job.id})")
+    
+    def resume_run(self):
+        """Pick a run manifest and capture whatever it has left to do, optionally retrying failed jobs, as a background job"""
+        from batch_capture import BatchCapture, plan_jobs
+        from run_manifest import RunManifest
+        runs_dir = os.path.join(self.capture.screenshots_dir, 'runs')
+        manifest_path = filedialog.askopenfilename(title="Select the run to resume", initialdir=runs_dir,
+                                                   filetypes=[("Run manifests", "*.jsonl"), ("All files", "*.*")])
+        if not manifest_path:
+            return
+        
+        batch = BatchCapture(self.capture)
+        pending, counts = plan_jobs(RunManifest(manifest_path), batch.max_attempts)
+        retry_failed = False
+        if counts['given_up']:
+            # Failed jobs have used up their attempts; retrying them is a separate choice
+            answer = messagebox.askyesnocancel(
+                "Retry Failed Captures",
+                f"{counts['given_up']} capture(s) in this run failed after {batch.max_attempts} attempts.\n\n"
+                f"Retry them with a fresh set of attempts? (No resumes only the {len(pending)} unfinished job(s).)")
+            if answer is None:
+                return
+            retry_failed = answer
+        
+        def work(job):
+            return batch.resume(manifest_path, progress_callback=job.progress, retry_failed=retry_failed)
+        
+        def complete(job):
+            if job.status == 'done':
+                summary = job.result
+                self.log_message("SUCCESS", f"✅ Run {summary['run_id']} resumed: {summary['captured']} captured, "
+                                            f"{summary['resumed']} already done, {summary['failed']} failed")
+                self.status_var.set(f"Run {summary['run_id']} complete")
+                self.refresh_gallery()
+                self.refresh_history()
+            else:
+                self.report_complete(job)
         
+        job = self.jobs.submit("Run resume", work, on_progress=self.report_progress, on_complete=complete)
+        self.log_message("INFO", f"🔁 Resuming {os.path.basename(manifest_path)} (job {job.id})")
+    
+    def toggle_report_server(self):
+        """Serve reports, the gallery and runs over HTTP on this machine, or stop serving"""
+        if self.report_server:
+            self.report_server.stop()
+            self.report_server = None
+            self.log_message("INFO", "🌐 Report server stopped")
+            return
+        
+        from report_server import ReportServer, DEFAULT_PORT
+        screenshots_dir = self.capture.screenshots_dir
+        reports_dir = os.path.join(os.path.dirname(screenshots_dir), 'reports')
         try:
-            self.create_html_report(report_path)
-            messagebox.showinfo("Report Generated", f"Report saved to: {report_path}")
-            self.open_file(report_path)
-        except Exception as e:
-            messagebox.showerror("Report Error", f"Failed to generate report: {str(e)}")
+            self.report_server = ReportServer(screenshots_dir, reports_dir, port=DEFAULT_PORT)
+        except OSError as e:
+            self.log_message("ERROR", f"❌ Could not start report server: {str(e)}")
+            return
+        url = self.report_server.start()
+        self.log_message("SUCCESS", f"🌐 Report server running at {url}")
+        self.open_url(url)
+    
+    def cancel_reports(self):
+        """Cancel every queued or running report job"""
+        count = self.jobs.cancel()
+        if count:
+            self.log_message("INFO", f"⏹️ Cancelling {count} report job(s)...")
+        else:
+            self.status_var.set("No report jobs running")
     
-    def create_html_report(self, report_path):
-        """Create HTML report"""
-        html_content = f"""
+    def create_html_report(self, report_path, results, url, progress_callback=None):
+        """Create HTML report, written to disk card by card"""
+        page_head = f"""
         <!DOCTYPE html>
         <html>
         <head>
@@ -1774,50 +2162,73 @@ class ScreenQAApp:
                 body {{ font-family: Arial, sans-serif; margin: 20px; }}
                 .header {{ background: #f0f0f0; padding: 20px; border-radius: 5px; }}
                 .screenshot {{ margin: 10px; padding: 10px; border: 1px solid #ddd; display: inline-block; }}
-                .screenshot img {{ max-width: 300px; max-height: 200px; }}
+                .screenshot img {{ max-width: 300px; max-height: 200px; width: auto; height: auto; }}
                 .success {{ color: green; }}
                 .error {{ color: red; }}
+                .diff-frame {{ position: relative; display: inline-block; }}
+                .diff-frame a {{ display: block; }}
+                .change-region {{ position: absolute; border: 2px solid #dc3545; background: rgba(220, 53, 69, 0.12); box-sizing: border-box; pointer-events: none; }}
+                .diff-summary {{ color: #dc3545; font-size: 0.9em; }}
             </style>
         </head>
         <body>
             <div class="header">
                 <h1>ScreenQA Testing Report</h1>
-                <p><strong>URL:</strong> {self.url_var.get()}</p>
+                <p><strong>URL:</strong> {url}</p>
                 <p><strong>Generated:</strong> {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
-                <p><strong>Total Devices:</strong> {len(self.current_results)}</p>
-                <p><strong>Successful Screenshots:</strong> {sum(1 for r in self.current_results.values() if r['success'])}</p>
+                <p><strong>Total Devices:</strong> {len(results)}</p>
+                <p><strong>Successful Screenshots:</strong> {sum(1 for r in results.values() if r['success'])}</p>
             </div>
             
             <h2>Screenshots</h2>
         """
         
-        for device_name, result in self.current_results.items():
-            if result['success']:
-                # Convert absolute path to relative for HTML
-                rel_path = os.path.relpath(result['screenshot_path'], os.path.dirname(report_path))
-                html_content += f"""
+        # Small lazily loaded thumbnails, generated in parallel; the full capture opens on click
+        report_dir = os.path.dirname(report_path)
+        thumbnails = report_thumbnails(
+            self.capture.screenshots_dir,
+            [r['screenshot_path'] for r in results.values() if r['success']],
+            progress_callback=progress_callback)
+        
+        with open(report_path, 'w', encoding='utf-8') as f:
+            f.write(page_head)
+            for index, (device_name, result) in enumerate(results.items(), 1):
+                if progress_callback:
+                    progress_callback(f"Writing report card {index}/{len(results)}")
+                if result['success']:
+                    full_url = html_url(result['screenshot_path'], report_dir)
+                    variants = thumbnails.get(result['screenshot_path'])
+                    img_attributes = (thumbnail_img_attributes(variants, report_dir, sizes='300px') if variants
+                                      else f'src="{full_url}" loading="lazy" decoding="async"')
+                    diff = result.get('visual_diff')
+                    diff_summary, region_boxes = render_change_regions(diff)
+                    if diff and diff.get('overlay_path'):
+                        diff_summary += f'<p><a href="{html_url(diff["overlay_path"], report_dir)}" target="_blank">View diff overlay</a></p>'
+                    diff_summary += render_layout_note(result.get('layout_similarity'))
+                    f.write(f"""
                 <div class="screenshot">
                     <h3>{device_name}</h3>
                     <p class="success">✓ Success</p>
                     <p>Resolution: {result['device_info']['width']}x{result['device_info']['height']}</p>
-                    <img src="{rel_path}" alt="{device_name} screenshot">
+                    {diff_summary}
+                    <div class="diff-frame">
+                        <a href="{full_url}" target="_blank"><img {img_attributes} alt="{device_name} screenshot"></a>
+                        {region_boxes}
+                    </div>
                 </div>
-                """
-            else:
-                html_content += f"""
+                """)
+                else:
+                    f.write(f"""
                 <div class="screenshot">
                     <h3>{device_name}</h3>
                     <p class="error">✗ Failed: {result['error']}</p>
                 </div>
-                """
-        
-        html_content += """
+                """)
+            
+            f.write("""
             </body>
         </html>
-        """
-        
-        with open(report_path, 'w', encoding='utf-8') as f:
-            f.write(html_content)
+        """)
     
     # Quick Action Methods for Resizable UI
     def quick_capture_mobile(self):
@@ -1868,8 +2279,7 @@ class ScreenQAApp:
                     preview_frame.columnconfigure(1, weight=1)
                     
                     # Load and resize image for thumbnail
-                    img = Image.open(screenshot['filepath'])
-                    img.thumbnail((60, 45), Image.Resampling.LANCZOS)
+                    img = load_thumbnail(self.capture.screenshots_dir, screenshot['filepath'], (60, 45))
                     photo = ImageTk.PhotoImage(img)
                     
                     # Thumbnail
@@ -1951,7 +2361,15 @@ def main():
     root.geometry(f'{width}x{height}+{x}+{y}')
     
     root.mainloop()
+    
+    # Stop report jobs at their next progress step instead of finishing them after the window is gone
+    app.jobs.shutdown()
+    if app.report_server:
+        app.report_server.stop()
 
 
 if __name__ == "__main__":
+    # Recompression runs on a process pool; a frozen build must not start the GUI again in its workers
+    import multiprocessing
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
@@ -0,0 +1,162 @@
+import queue
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+
+POLL_INTERVAL_MS = 100
+
+
+class JobCancelled(BaseException):
+    """Raised inside a job's work once it has been cancelled
+
+    Derives from BaseException, like KeyboardInterrupt, so the broad
+    `except Exception` handlers in report code do not swallow it.
+    """
+
+
+class Job:
+    """One unit of background work, with progress reporting and cooperative cancellation"""
+
+    def __init__(self, job_id: int, name: str, events: queue.Queue):
+        self.id = job_id
+        self.name = name
+        self.status = 'queued'  # queued, running, done, failed, cancelled
+        self.message = ''
+        self.result = None
+        self.error = None
+        self._events = events
+        self._cancel = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def cancel(self):
+        """Ask the job to stop at its next progress report (or before it starts)"""
+        self._cancel.set()
+
+    def check_cancelled(self):
+        if self._cancel.is_set():
+            raise JobCancelled(self.name)
+
+    def progress(self, message: str):
+        """Progress callback for the work function; also the point where a cancelled job stops"""
+        self.check_cancelled()
+        self._events.put((self, 'progress', message))
+
+
+class JobRunner:
+    """Runs jobs on worker threads and delivers their events on the Tk thread
+
+    Tk widgets may only be touched from the thread running the main loop, so
+    workers never call back into the UI directly: they queue events, and the
+    runner drains the queue from root.after() while any job is pending.
+    """
+
+    def __init__(self, root=None, max_workers: int = 2, poll_interval: int = POLL_INTERVAL_MS):
+        """
+        Args:
+            root: Tk root used to schedule polling (without one, call poll() yourself)
+            max_workers: Jobs running at the same time; further jobs wait in line
+            poll_interval: Milliseconds between event polls
+        """
+        self.root = root
+        self.poll_interval = poll_interval
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='screenqa-job')
+        self._events = queue.Queue()
+        self._ids = itertools.count(1)
+        self._jobs = {}  # id -> (job, on_progress, on_complete)
+        self._polling = False
+
+    def submit(self, name: str, work: Callable[[Job], Any],
+               on_progress: Optional[Callable[[Job, str], None]] = None,
+               on_complete: Optional[Callable[[Job], None]] = None) -> Job:
+        """
+        Queue a job
+        Args:
+            name: Display name
+            work: Called on a worker thread with the job; pass job.progress as its
+                  progress callback. Its return value becomes job.result
+            on_progress: Called on the Tk thread with (job, message); only the latest
+                         message per poll is delivered
+            on_complete: Called on the Tk thread once the job is done, failed or cancelled
+        Returns: The queued job
+        """
+        job = Job(next(self._ids), name, self._events)
+        self._jobs[job.id] = (job, on_progress, on_complete)
+        self._executor.submit(self._run, job, work)
+        self._schedule_poll()
+        return job
+
+    def _run(self, job: Job, work: Callable[[Job], Any]):
+        try:
+            job.check_cancelled()
+            self._events.put((job, 'status', 'running'))
+            job.result = work(job)
+            status = 'done'
+        except JobCancelled:
+            status = 'cancelled'
+        except Exception as e:
+            job.error = str(e)
+            status = 'failed'
+        self._events.put((job, 'status', status))
+
+    def active_jobs(self) -> List[Job]:
+        """Jobs that are queued or running"""
+        return [job for job, _, _ in self._jobs.values()]
+
+    def cancel(self, job_id: Optional[int] = None) -> int:
+        """Cancel one job, or every pending job; returns how many were asked to stop"""
+        jobs = [job for job in self.active_jobs() if job_id is None or job.id == job_id]
+        for job in jobs:
+            job.cancel()
+        return len(jobs)
+
+    def poll(self) -> int:
+        """Deliver queued events on the calling thread; returns the number of jobs still pending"""
+        latest_progress: Dict[int, str] = {}
+        finished = []
+        while True:
+            try:
+                job, kind, value = self._events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'progress':
+                latest_progress[job.id] = value
+            elif value == 'running':
+                job.status = 'running'
+            else:
+                finished.append((job, value))
+
+        for job_id, message in latest_progress.items():
+            if job_id in self._jobs:
+                job, on_progress, _ = self._jobs[job_id]
+                job.message = message
+                if on_progress:
+                    on_progress(job, message)
+
+        for job, status in finished:
+            _, _, on_complete = self._jobs.pop(job.id)
+            job.status = status
+            if on_complete:
+                on_complete(job)
+
+        return len(self._jobs)
+
+    def _schedule_poll(self):
+        if self.root is not None and not self._polling:
+            self._polling = True
+            self.root.after(self.poll_interval, self._poll_tick)
+
+    def _poll_tick(self):
+        self._polling = False
+        if self.poll():
+            self._schedule_poll()
+
+    def shutdown(self, cancel: bool = True):
+        """Stop accepting jobs; pending ones are cancelled unless cancel is False"""
+        if cancel:
+            self.cancel()
+        self._executor.shutdown(wait=False)
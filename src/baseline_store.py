@@ -0,0 +1,165 @@
+import os
+import json
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+import numpy as np
+from content_store import pixel_hash
+from history_index import HistoryIndex
+from retention import RetentionEngine, ARCHIVE_SEPARATOR, open_screenshot
+from visual_diff import BAND_HEIGHT, band_hashes, compare_images, decode_to_npy
+
+
+BASELINES_DIRNAME = '.baselines'
+MANIFEST_FILENAME = 'baselines.json'
+
+
+class BaselineStore:
+    """Approved baselines per page/device/mode, kept as decoded memory-mappable pixels
+
+    Approving a capture decodes it once into .baselines/<pixel hash>.npy and
+    pins the source capture against retention. Comparisons then map the
+    baseline straight from disk with no PNG decode, and reuse its stored band
+    hashes so only the candidate has to be hashed.
+    """
+
+    def __init__(self, screenshots_dir: str):
+        self.screenshots_dir = screenshots_dir
+        self.root = os.path.join(screenshots_dir, BASELINES_DIRNAME)
+        self.manifest_path = os.path.join(self.root, MANIFEST_FILENAME)
+        self.history_index = HistoryIndex(screenshots_dir)
+        self.retention = RetentionEngine(screenshots_dir)
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, Dict]:
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save(self, baselines: Dict[str, Dict]):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(baselines, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _entry_for(self, filepath: str) -> Dict:
+        """History index entry of a capture, syncing the index if it is not there yet"""
+        entry = self.history_index.get(filepath)
+        if entry is None:
+            self.history_index.sync()
+            entry = self.history_index.get(filepath)
+        if entry is None:
+            raise ValueError(f"Not a known capture: {filepath}")
+        return entry
+
+    def approve(self, filepath: str) -> Dict:
+        """
+        Make a capture the baseline for its page, device and mode
+        Args:
+            filepath: Capture path or archive reference
+        Returns: Baseline record (group, source capture, .npy path, size)
+        """
+        entry = self._entry_for(filepath)
+        # Exact pixels only: a perceptual hash or filename could hand back another capture's decoded pixels
+        with open_screenshot(filepath) as img:
+            key = pixel_hash(img)
+        npy_path = os.path.join(self.root, f'{key}.npy')
+
+        os.makedirs(self.root, exist_ok=True)
+        if not os.path.exists(npy_path):
+            tmp_path = npy_path + '.tmp.npy'
+            pixels = decode_to_npy(filepath, tmp_path)
+            del pixels
+            os.replace(tmp_path, npy_path)
+
+        pixels = np.load(npy_path, mmap_mode='r')
+        record = {
+            'group_key': entry['group_key'],
+            'filepath': filepath,
+            'filename': entry['filename'],
+            'npy': os.path.basename(npy_path),
+            'width': int(pixels.shape[1]),
+            'height': int(pixels.shape[0]),
+            'band_height': BAND_HEIGHT,
+            'band_hashes': band_hashes(pixels, BAND_HEIGHT),
+            'approved': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
+        del pixels
+
+        with self._lock:
+            baselines = self._load()
+            previous = baselines.get(entry['group_key'])
+            baselines[entry['group_key']] = record
+            self._save(baselines)
+
+        # Baseline captures must survive retention; unpin the one it replaces unless still in use
+        if ARCHIVE_SEPARATOR not in filepath:
+            self.retention.set_pinned(entry['filename'])
+        if previous and previous['filename'] != record['filename']:
+            self._release(previous, baselines)
+        return record
+
+    def _release(self, record: Dict, baselines: Dict[str, Dict]):
+        """Unpin a replaced baseline capture and drop its pixels once nothing references them"""
+        if not any(b['filename'] == record['filename'] for b in baselines.values()):
+            self.retention.set_pinned(record['filename'], False)
+        if not any(b['npy'] == record['npy'] for b in baselines.values()):
+            npy_path = os.path.join(self.root, record['npy'])
+            if os.path.exists(npy_path):
+                os.remove(npy_path)
+
+    def remove(self, group_key: str) -> bool:
+        """Forget the baseline of a group"""
+        with self._lock:
+            baselines = self._load()
+            record = baselines.pop(group_key, None)
+            if record is None:
+                return False
+            self._save(baselines)
+        self._release(record, baselines)
+        return True
+
+    def get(self, group_key: str) -> Optional[Dict]:
+        """Baseline record of a group"""
+        return self._load().get(group_key)
+
+    def list_baselines(self) -> List[Dict]:
+        """All baseline records ordered by group"""
+        return sorted(self._load().values(), key=lambda record: record['group_key'])
+
+    def baseline_for(self, filepath: str) -> Optional[Dict]:
+        """Baseline record for the group a capture belongs to"""
+        try:
+            return self.get(self._entry_for(filepath)['group_key'])
+        except ValueError:
+            return None
+
+    def pixels(self, record: Dict) -> np.ndarray:
+        """Read-only memory map of a baseline's decoded RGBA pixels"""
+        return np.load(os.path.join(self.root, record['npy']), mmap_mode='r')
+
+    def compare(self, filepath, group_key: Optional[str] = None, max_mismatch_percent: float = 0.0,
+                **options) -> Optional[Dict]:
+        """
+        Diff a capture against its group's approved baseline
+        Args:
+            filepath: Capture path, or an in-memory capture frame together with group_key
+            group_key: Group to compare against (defaults to the capture's own group)
+            max_mismatch_percent: Share of changed pixels a capture may have and still pass
+            options: Passed to visual_diff.compare_images (tolerance, overlay path, ...)
+        Returns: Diff result with a 'passed' verdict, or None when the group has no baseline
+        """
+        record = self.get(group_key) if group_key else self.baseline_for(filepath)
+        if record is None:
+            return None
+
+        if record.get('band_height', BAND_HEIGHT) == options.get('band_height', BAND_HEIGHT):
+            options.setdefault('baseline_hashes', record['band_hashes'])
+        result = compare_images(os.path.join(self.root, record['npy']), filepath, **options)
+        result['baseline_path'] = record['filepath']
+        result['baseline_group'] = record['group_key']
+        result['passed'] = result['mismatch_percent'] <= max_mismatch_percent
+        return result
@@ -0,0 +1,245 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+from run_manifest import RunManifest
+
+
+MAX_ATTEMPTS = 3
+DEFAULT_WORKERS = 2
+RETRY_DELAY = 5  # Seconds before a failed job goes back in line; lets a struggling browser or site recover
+
+
+def plan_jobs(manifest: RunManifest, max_attempts: int = MAX_ATTEMPTS,
+              retry_failed: bool = False) -> Tuple[List[Dict], Dict]:
+    """
+    Work left in a run: every URL x device job in its header that has neither succeeded nor run out of attempts
+    Args:
+        manifest: Run manifest whose header lists the URLs and device profiles
+        max_attempts: Attempts per job, counting those already recorded
+        retry_failed: Also plan jobs that ran out of attempts, with a fresh set of attempts
+    Returns: (pending jobs as {'url', 'device', 'attempts'}, counts of done / given up jobs)
+    """
+    header = manifest.header() or {}
+    urls = header.get('urls') or ([header['url']] if header.get('url') else [])
+    devices = list(header.get('devices') or {})
+    states = manifest.job_states()
+
+    pending = []
+    counts = {'total': len(urls) * len(devices), 'done': 0, 'given_up': 0}
+    for url in urls:
+        for device_name in devices:
+            state = states.get((url, device_name), {'success': None, 'attempts': 0})
+            if state['success']:
+                counts['done'] += 1
+            elif state['attempts'] >= max_attempts and retry_failed:
+                pending.append({'url': url, 'device': device_name, 'attempts': 0})
+            elif state['attempts'] >= max_attempts:
+                counts['given_up'] += 1
+            else:
+                pending.append({'url': url, 'device': device_name, 'attempts': state['attempts']})
+    return pending, counts
+
+
+def _conflict_key(job: Dict) -> Tuple[str, str]:
+    # Capture filenames are domain + device + a timestamp in seconds; two such jobs must not run at once
+    return urlparse(job['url']).netloc, job['device']
+
+
+class BatchCapture:
+    """Captures many URLs on many devices as one resumable run
+
+    Job state lives in the run manifest: each job's final outcome is a
+    result line and every failed attempt before it an attempt line, all
+    written durably as they happen. Resuming reads the manifest back, skips
+    jobs that succeeded, retries failed ones until they run out of attempts
+    and schedules the rest for however many workers are available now. Jobs
+    that already ran out of attempts are only retried when asked to.
+    """
+
+    def __init__(self, capture, workers: int = DEFAULT_WORKERS, max_attempts: int = MAX_ATTEMPTS,
+                 retry_delay: float = RETRY_DELAY):
+        """
+        Args:
+            capture: ScreenshotCapture providing devices, browsers and the write pipeline
+            workers: Browsers running at the same time
+            max_attempts: Attempts per URL x device job before it is recorded as failed
+            retry_delay: Seconds a failed job waits before it is retried
+        """
+        self.capture = capture
+        self.workers = max(1, workers)
+        self.max_attempts = max(1, max_attempts)
+        self.retry_delay = retry_delay
+
+    def start(self, urls: List[str], device_names: List[str], screenshot_mode: str = "full_page",
+              progress_callback: Optional[callable] = None) -> Dict:
+        """
+        Start a new batch run
+        Args:
+            urls: Website URLs to capture
+            device_names: Devices to capture each URL on
+            screenshot_mode: "full_page", "viewport_only", or "auto"
+            progress_callback: Optional callback for progress updates
+        Returns: Run summary (see run())
+        """
+        known = self.capture.devices['devices']
+        for device_name in device_names:
+            if device_name not in known:
+                print(f"Device '{device_name}' not found in configuration; skipping it")
+        manifest = RunManifest.create(
+            self.capture.screenshots_dir, urls=list(dict.fromkeys(urls)), screenshot_mode=screenshot_mode,
+            max_attempts=self.max_attempts,
+            devices={name: known[name] for name in device_names if name in known})
+        return self.run(manifest, progress_callback)
+
+    def resume(self, manifest_path: str, progress_callback: Optional[callable] = None,
+               retry_failed: bool = False) -> Dict:
+        """
+        Continue an interrupted run from its manifest
+        Args:
+            manifest_path: Run manifest (JSONL)
+            progress_callback: Optional callback for progress updates
+            retry_failed: Also retry jobs that ran out of attempts, each with a fresh set of max_attempts
+        Returns: Run summary (see run())
+        """
+        return self.run(RunManifest(manifest_path), progress_callback, retry_failed)
+
+    def run(self, manifest: RunManifest, progress_callback: Optional[callable] = None,
+            retry_failed: bool = False) -> Dict:
+        """
+        Capture every job of a run that is still pending
+        Args:
+            manifest: Run manifest created by start() or capture_multiple_devices()
+            progress_callback: Optional callback for progress updates
+            retry_failed: Also retry jobs that ran out of attempts, each with a fresh set of max_attempts
+        Returns: Summary with the manifest path and counts of resumed, captured, retried and failed jobs
+        """
+        header = manifest.header() or {}
+        screenshot_mode = header.get('screenshot_mode', 'full_page')
+        pending, counts = plan_jobs(manifest, self.max_attempts, retry_failed)
+        summary = {
+            'run_id': manifest.run_id,
+            'path': manifest.path,
+            'total': counts['total'],
+            'resumed': counts['done'],
+            'captured': 0,
+            'retried': 0,
+            'failed': counts['given_up'],
+            'planned': len(pending)
+        }
+        if progress_callback and counts['done']:
+            progress_callback(f"Resuming {manifest.run_id}: {counts['done']}/{counts['total']} jobs already done, "
+                              f"{len(pending)} to go on {self.workers} workers")
+
+        running = {}  # future -> job
+        busy = set()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='batch-capture') as executor:
+            try:
+                while pending or running:
+                    now = time.time()
+                    # Fill free workers with the first jobs that are due and do not clash with a running one
+                    for job in list(pending):
+                        if len(running) >= self.workers:
+                            break
+                        if job.get('not_before', 0) > now or _conflict_key(job) in busy:
+                            continue
+                        pending.remove(job)
+                        busy.add(_conflict_key(job))
+                        running[executor.submit(self._capture_job, manifest, job, screenshot_mode)] = job
+
+                    if not running:
+                        time.sleep(max(0.0, min(job.get('not_before', 0) for job in pending) - now))
+                        continue
+
+                    done, _ = wait(running, timeout=1, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        job = running.pop(future)
+                        busy.discard(_conflict_key(job))
+                        self._settle(manifest, job, future.result(), pending, summary, progress_callback)
+            finally:
+                # Stopped early (cancelled or crashed): still record the captures already in flight
+                for future, job in running.items():
+                    try:
+                        self._settle(manifest, job, future.result(), [], summary, None)
+                    except Exception as e:
+                        print(f"Could not record {job['device']} for {job['url']}: {e}")
+
+        manifest.finish(captured=summary['captured'], failed=summary['failed'])
+        return summary
+
+    def _capture_job(self, manifest: RunManifest, job: Dict, screenshot_mode: str) -> Dict:
+        """Capture one URL on one device and wait for its file to be written; runs on a worker thread"""
+        success, frame, error = self.capture.capture_frame(job['url'], job['device'], None, screenshot_mode,
+                                                           manifest.run_id)
+        result = {
+            'success': success,
+            'screenshot_path': frame.filepath if success else "",
+            'error': error,
+            'screenshot_mode': screenshot_mode
+        }
+        if success:
+            try:
+                self.capture.pipeline.wait(frame)
+                result.update(frame.results)
+            except Exception as e:
+                result.update({
+                    'success': False,
+                    'screenshot_path': "",
+                    'error': f"Error saving screenshot for {job['device']}: {str(e)}"
+                })
+        return result
+
+    def _settle(self, manifest: RunManifest, job: Dict, result: Dict, pending: List[Dict], summary: Dict,
+                progress_callback: Optional[callable]):
+        """Record a finished attempt: a result when it succeeded or ran out of attempts, otherwise a retry"""
+        job['attempts'] += 1
+        label = f"{job['device']} - {job['url']}"
+        if result['success'] or job['attempts'] >= self.max_attempts:
+            manifest.append(job['url'], job['device'], dict(result, attempts=job['attempts']))
+            summary['captured' if result['success'] else 'failed'] += 1
+            message = f"Captured {label}" if result['success'] else \
+                f"Failed {label} after {job['attempts']} attempts: {result['error']}"
+        else:
+            manifest.append_attempt(job['url'], job['device'], result['error'], job['attempts'])
+            job['not_before'] = time.time() + self.retry_delay
+            pending.append(job)
+            summary['retried'] += 1
+            message = f"Retrying {label} (attempt {job['attempts']} of {self.max_attempts} failed)"
+
+        if progress_callback:
+            finished = summary['resumed'] + summary['captured'] + summary['failed']
+            progress_callback(f"[{finished}/{summary['total']}] {message}")
+
+
+if __name__ == "__main__":
+    import argparse
+    from screenshot_capture import ScreenshotCapture
+
+    parser = argparse.ArgumentParser(description="Capture many URLs on many devices as one resumable run")
+    parser.add_argument('urls_file', nargs='?', help="Text file with one URL per line")
+    parser.add_argument('--devices', nargs='*', default=None, help="Device names (defaults to all)")
+    parser.add_argument('--mode', default='full_page', choices=['full_page', 'viewport_only', 'auto'])
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    parser.add_argument('--max-attempts', type=int, default=MAX_ATTEMPTS)
+    parser.add_argument('--resume', metavar='MANIFEST', help="Continue an interrupted run from its manifest")
+    parser.add_argument('--retry-failed', action='store_true',
+                        help="With --resume, also retry jobs that ran out of attempts")
+    args = parser.parse_args()
+
+    capture = ScreenshotCapture()
+    batch = BatchCapture(capture, args.workers, args.max_attempts)
+    try:
+        if args.resume:
+            summary = batch.resume(args.resume, progress_callback=print, retry_failed=args.retry_failed)
+        elif args.urls_file:
+            with open(args.urls_file, 'r', encoding='utf-8') as f:
+                urls = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+            summary = batch.start(urls, args.devices or list(capture.devices['devices']), args.mode,
+                                  progress_callback=print)
+        else:
+            parser.error("give a URLs file or --resume MANIFEST")
+    finally:
+        capture.pipeline.close()
+
+    print(f"Run {summary['run_id']}: {summary['captured']} captured, {summary['resumed']} already done, "
+          f"{summary['failed']} failed, {summary['retried']} retries - {summary['path']}")
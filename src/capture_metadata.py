@@ -0,0 +1,155 @@
+import io
+import os
+import json
+import zlib
+import struct
+from typing import BinaryIO, Dict, Optional, Union
+
+
+METADATA_KEY = 'screenqa'
+METADATA_VERSION = 1
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+CAPTURE_MODES = ('viewport_only', 'auto')
+
+_XMP_OPEN = b'<x:xmpmeta xmlns:x="adobe:ns:meta/"><screenqa><![CDATA['
+_XMP_CLOSE = b']]></screenqa></x:xmpmeta>'
+
+
+def _png_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    """Serialize one PNG chunk with its CRC"""
+    crc = zlib.crc32(chunk_type + data) & 0xffffffff
+    return struct.pack('>I', len(data)) + chunk_type + data + struct.pack('>I', crc)
+
+
+def embed_metadata(png_bytes: bytes, metadata: Dict) -> bytes:
+    """
+    Insert capture metadata as an iTXt chunk right after IHDR
+    Args:
+        png_bytes: Encoded PNG as returned by the browser
+        metadata: JSON-serializable capture metadata
+    Returns: PNG bytes with the chunk spliced in (pixel data is not re-encoded)
+    """
+    if not png_bytes.startswith(PNG_SIGNATURE):
+        raise ValueError("Not a PNG image")
+
+    # iTXt: keyword, null, compression flag, compression method, language, null, translated keyword, null, text
+    payload = dict(metadata, version=METADATA_VERSION)
+    data = METADATA_KEY.encode('latin-1') + b'\x00\x00\x00\x00\x00' + json.dumps(payload).encode('utf-8')
+
+    # Placing the chunk before IDAT lets readers stop before any pixel data
+    ihdr_length = struct.unpack('>I', png_bytes[8:12])[0]
+    ihdr_end = 8 + 12 + ihdr_length
+    return png_bytes[:ihdr_end] + _png_chunk(b'iTXt', data) + png_bytes[ihdr_end:]
+
+
+def metadata_xmp(metadata: Dict) -> bytes:
+    """Wrap capture metadata in an XMP packet for WebP/AVIF outputs"""
+    payload = dict(metadata, version=METADATA_VERSION)
+    return _XMP_OPEN + json.dumps(payload).encode('utf-8') + _XMP_CLOSE
+
+
+def _parse_text_chunk(chunk_type: bytes, data: bytes) -> Optional[Dict]:
+    """Decode a tEXt/zTXt/iTXt chunk if it carries ScreenQA metadata"""
+    keyword, _, rest = data.partition(b'\x00')
+    if keyword != METADATA_KEY.encode('latin-1'):
+        return None
+
+    if chunk_type == b'tEXt':
+        text = rest
+    elif chunk_type == b'zTXt':
+        text = zlib.decompress(rest[1:])
+    else:
+        compressed = rest[0] == 1
+        _, _, rest = rest[2:].partition(b'\x00')  # language tag
+        _, _, text = rest.partition(b'\x00')  # translated keyword
+        if compressed:
+            text = zlib.decompress(text)
+    return json.loads(text.decode('utf-8'))
+
+
+def _parse_xmp(data: bytes) -> Optional[Dict]:
+    """Extract metadata from an XMP packet written by metadata_xmp()"""
+    start = data.find(_XMP_OPEN)
+    end = data.find(_XMP_CLOSE)
+    if start < 0 or end < 0:
+        return None
+    return json.loads(data[start + len(_XMP_OPEN):end].decode('utf-8'))
+
+
+def _read_png_metadata(f: BinaryIO) -> Optional[Dict]:
+    """Walk PNG chunk headers, reading only text chunks and stopping at the first IDAT"""
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            return None
+        length, chunk_type = struct.unpack('>I4s', header)
+        if chunk_type in (b'IDAT', b'IEND'):
+            return None
+        if chunk_type in (b'tEXt', b'zTXt', b'iTXt'):
+            metadata = _parse_text_chunk(chunk_type, f.read(length))
+            if metadata is not None:
+                return metadata
+            f.read(4)  # CRC
+        else:
+            f.seek(length + 4, io.SEEK_CUR)
+
+
+def _read_webp_metadata(f: BinaryIO) -> Optional[Dict]:
+    """Walk RIFF chunk headers, skipping image data, and read the XMP chunk"""
+    f.read(4)  # WEBP
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            return None
+        fourcc, length = struct.unpack('<4sI', header)
+        if fourcc == b'XMP ':
+            return _parse_xmp(f.read(length))
+        f.seek(length + (length & 1), io.SEEK_CUR)
+
+
+def read_metadata(source: Union[str, BinaryIO]) -> Optional[Dict]:
+    """
+    Read embedded capture metadata without decoding pixel data
+    Args:
+        source: Capture path or open binary file (e.g. an archive member)
+    Returns: Metadata dictionary, or None if the file carries none
+    """
+    if isinstance(source, str):
+        with open(source, 'rb') as f:
+            return read_metadata(f)
+
+    try:
+        signature = source.read(8)
+        if signature == PNG_SIGNATURE:
+            return _read_png_metadata(source)
+        if signature[:4] == b'RIFF':
+            return _read_webp_metadata(source)
+        # AVIF keeps XMP as an item inside the ISO-BMFF container; the files are small enough to scan
+        return _parse_xmp(signature + source.read())
+    except (ValueError, struct.error, zlib.error, UnicodeDecodeError) as e:
+        print(f"Unreadable capture metadata: {e}")
+        return None
+
+
+def parse_capture_filename(filename: str) -> Dict:
+    """Best-effort domain/device/mode/timestamp from a capture filename (for files without metadata)"""
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    parts = stem.rsplit('_', 2)
+    if len(parts) != 3:
+        return {'domain': stem, 'device': '', 'screenshot_mode': 'full_page', 'timestamp': ''}
+
+    prefix, date, time_ = parts
+    mode = 'full_page'
+    for candidate in CAPTURE_MODES:
+        if prefix.endswith('_' + candidate):
+            mode = candidate
+            prefix = prefix[:-len(candidate) - 1]
+            break
+
+    domain, _, device = prefix.partition('_')
+    return {
+        'domain': domain,
+        'device': device,
+        'screenshot_mode': mode,
+        'timestamp': f'{date}_{time_}'
+    }
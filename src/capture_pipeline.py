@@ -0,0 +1,197 @@
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Callable, Dict, List, Optional, Union
+from PIL import Image
+from content_store import ContentStore, pixel_hash
+from capture_metadata import embed_metadata
+from masking import DEFAULT_FILL, encode_png, mask_image, scale_boxes
+from perceptual_hash import image_hashes
+from retention import open_screenshot
+from thumbnails import make_thumbnail, save_thumbnail, thumbnail_path
+
+
+class CaptureFrame:
+    """A captured screenshot held in memory while pipeline stages run"""
+
+    def __init__(self, png_bytes: bytes, filepath: str, info: Optional[Dict] = None):
+        self.png_bytes = png_bytes
+        self.filepath = filepath
+        self.filename = os.path.basename(filepath)
+        self.info = info or {}
+        self.results = {}
+        self.write_future = None
+        self._image = None
+
+    @property
+    def image(self) -> Image.Image:
+        """Decoded pixels, decoded once and shared by every stage"""
+        if self._image is None:
+            self._image = Image.open(io.BytesIO(self.png_bytes))
+            self._image.load()
+        return self._image
+
+    def replace_image(self, image: Image.Image, png_bytes: bytes):
+        """Swap in edited pixels and their encoding for the stages that follow"""
+        if self._image is not None and self._image is not image:
+            self._image.close()
+        self._image = image
+        self.png_bytes = png_bytes
+
+    def release(self):
+        """Drop the decoded image and encoded bytes once the frame is written"""
+        if self._image is not None:
+            self._image.close()
+            self._image = None
+        self.png_bytes = None
+
+
+def mask_stage(pipeline: 'CapturePipeline', frame: CaptureFrame):
+    """Blank dynamic regions before anything hashes, dedups or diffs the pixels"""
+    resolved = frame.info.get('masks')
+    if not resolved:
+        return
+    boxes = scale_boxes(resolved, frame.image.width)
+    frame.results['masks'] = boxes
+    if boxes:
+        masked = mask_image(frame.image, boxes, resolved.get('fill', DEFAULT_FILL))
+        frame.replace_image(masked, encode_png(masked))
+
+
+def hash_stage(pipeline: 'CapturePipeline', frame: CaptureFrame):
+    """Pixel hash for content-addressed storage"""
+    frame.results['pixel_hash'] = pixel_hash(frame.image)
+
+
+def metadata_stage(pipeline: 'CapturePipeline', frame: CaptureFrame):
+    """Basic image facts taken from the decoded buffer"""
+    img = frame.image
+    frame.results.update({
+        'width': img.width,
+        'height': img.height,
+        'image_mode': img.mode,
+        'encoded_size': len(frame.png_bytes)
+    })
+
+
+def perceptual_hash_stage(pipeline: 'CapturePipeline', frame: CaptureFrame):
+    """dHash/pHash for near-duplicate and change search across history"""
+    frame.results.update(image_hashes(frame.image))
+
+
+def embed_metadata_stage(pipeline: 'CapturePipeline', frame: CaptureFrame):
+    """Splice capture metadata into the PNG as a text chunk ahead of the pixel data"""
+    metadata = frame.info.get('metadata')
+    if not metadata:
+        return
+    metadata = dict(metadata, **{key: frame.results.get(key)
+                                 for key in ('width', 'height', 'pixel_hash', 'dhash', 'phash')})
+    if 'masks' in frame.results:
+        metadata['masks'] = frame.results['masks']
+    frame.png_bytes = embed_metadata(frame.png_bytes, metadata)
+    frame.results['metadata'] = metadata
+    frame.results['encoded_size'] = len(frame.png_bytes)
+
+
+def thumbnail_stage(pipeline: 'CapturePipeline', frame: CaptureFrame):
+    """Gallery thumbnail from the in-memory image, written in the background"""
+    thumb = make_thumbnail(frame.image)
+    path = thumbnail_path(pipeline.screenshots_dir, frame.filename)
+    frame.results['thumbnail_path'] = path
+    pipeline.submit_write(save_thumbnail, thumb, path)
+
+
+DEFAULT_STAGES = [mask_stage, hash_stage, metadata_stage, perceptual_hash_stage, embed_metadata_stage, thumbnail_stage]
+
+
+class CapturePipeline:
+    """Runs in-process stages on captured PNG bytes and writes each file once, asynchronously
+
+    Stages are callables ``stage(pipeline, frame)`` that read ``frame.image`` /
+    ``frame.png_bytes`` and add entries to ``frame.results``.
+    """
+
+    def __init__(self, screenshots_dir: str, content_store: Optional[ContentStore] = None,
+                 stages: Optional[List[Callable]] = None, writer_threads: int = 2):
+        self.screenshots_dir = screenshots_dir
+        self.content_store = content_store or ContentStore(screenshots_dir)
+        self.stages = list(stages) if stages is not None else list(DEFAULT_STAGES)
+        self._writer = ThreadPoolExecutor(max_workers=writer_threads, thread_name_prefix='capture-writer')
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def add_stage(self, stage: Callable, before: Optional[Callable] = None):
+        """Register an extra stage, optionally ahead of an existing one"""
+        if before is not None and before in self.stages:
+            self.stages.insert(self.stages.index(before), stage)
+        else:
+            self.stages.append(stage)
+
+    def submit_write(self, fn: Callable, *args) -> Future:
+        """Queue background I/O that flush() will wait for"""
+        future = self._writer.submit(fn, *args)
+        with self._lock:
+            self._pending.append(future)
+        return future
+
+    def process(self, png_bytes: bytes, filepath: str, info: Optional[Dict] = None) -> CaptureFrame:
+        """
+        Run all stages on a capture and queue its single file write
+        Args:
+            png_bytes: Encoded screenshot as returned by the browser
+            filepath: Final capture path in the screenshots directory
+            info: Capture context (url, device, mode, ...) for stages
+        Returns: Frame with stage results; the write completes on flush()
+        """
+        frame = CaptureFrame(png_bytes, filepath, info)
+        for stage in self.stages:
+            stage(self, frame)
+
+        frame.write_future = self.submit_write(self._write_frame, frame)
+        return frame
+
+    def _write_frame(self, frame: CaptureFrame) -> Dict:
+        """Store the encoded bytes once (skipped on a dedup hit) and link the capture name"""
+        try:
+            digest = frame.results.get('pixel_hash') or pixel_hash(frame.image)
+            stored = self.content_store.put_bytes(frame.png_bytes, frame.filepath, digest,
+                                                  frame.results.get('metadata'))
+            frame.results['deduplicated'] = stored['deduplicated']
+            return stored
+        finally:
+            frame.release()
+
+    def wait(self, frame: CaptureFrame) -> Dict:
+        """Block until one frame is on disk"""
+        return frame.write_future.result()
+
+    def flush(self) -> List[str]:
+        """Wait for all queued writes; returns error messages for failed ones"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+
+        errors = []
+        for future in pending:
+            try:
+                future.result()
+            except Exception as e:
+                errors.append(str(e))
+        return errors
+
+    def close(self):
+        self.flush()
+        self._writer.shutdown(wait=True)
+
+
+def open_image(source: Union[str, bytes, Image.Image, CaptureFrame]) -> Image.Image:
+    """Image from a path, encoded bytes, a decoded image or an in-memory capture frame"""
+    if isinstance(source, Image.Image):
+        return source
+    if isinstance(source, CaptureFrame):
+        if source.png_bytes is not None or source._image is not None:
+            return source.image
+        return open_image(source.filepath)
+    if isinstance(source, (bytes, bytearray)):
+        return Image.open(io.BytesIO(source))
+    return open_screenshot(source)
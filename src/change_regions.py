@@ -0,0 +1,154 @@
+from typing import Dict, List, Tuple
+import numpy as np
+
+
+CELL_SIZE = 8
+MERGE_DISTANCE = 3
+MAX_REGIONS = 20
+
+
+def cell_grid(height: int, width: int, cell: int = CELL_SIZE) -> np.ndarray:
+    """Empty per-cell changed pixel counts for an image"""
+    return np.zeros(((height + cell - 1) // cell, (width + cell - 1) // cell), dtype=np.int64)
+
+
+def add_band_cells(counts: np.ndarray, changed: np.ndarray, top: int, cell: int = CELL_SIZE):
+    """Add one band's changed pixels to the per-cell counts, so bands can be dropped once counted"""
+    ys, xs = np.nonzero(changed)
+    if not len(ys):
+        return
+    first = top // cell
+    last = (top + changed.shape[0] - 1) // cell + 1
+    grid_width = counts.shape[1]
+    cells = ((ys + top) // cell - first) * grid_width + xs // cell
+    counts[first:last] += np.bincount(cells, minlength=(last - first) * grid_width).reshape(-1, grid_width)
+
+
+def downsample_mask(band_masks: Dict[int, Tuple[np.ndarray, np.ndarray]],
+                    height: int, width: int, cell: int = CELL_SIZE) -> np.ndarray:
+    """Count changed pixels per cell x cell block, built from the changed bands only"""
+    counts = cell_grid(height, width, cell)
+    for top, (changed, _) in band_masks.items():
+        add_band_cells(counts, changed, top, cell)
+    return counts
+
+
+def _dilate(grid: np.ndarray, radius: int) -> np.ndarray:
+    """Square dilation via running sums, so the cost does not grow with the radius"""
+    if radius <= 0:
+        return grid
+    result = grid.astype(np.int32)
+    for axis in (0, 1):
+        padded = np.pad(result, [(radius + 1, radius) if a == axis else (0, 0) for a in (0, 1)])
+        sums = np.cumsum(padded, axis=axis)
+        size = 2 * radius + 1
+        if axis == 0:
+            result = sums[size:] - sums[:-size]
+        else:
+            result = sums[:, size:] - sums[:, :-size]
+    return result > 0
+
+
+def _runs(grid: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Horizontal runs of set cells as (row, start, end) arrays, end exclusive"""
+    padded = np.zeros((grid.shape[0], grid.shape[1] + 2), dtype=np.int8)
+    padded[:, 1:-1] = grid
+    edges = np.diff(padded, axis=1)
+    starts = np.argwhere(edges == 1)
+    ends = np.argwhere(edges == -1)
+    return starts[:, 0], starts[:, 1], ends[:, 1]
+
+
+def label_cells(grid: np.ndarray) -> np.ndarray:
+    """
+    8-connected component labels for a boolean grid in a single pass over its runs
+    Returns: Integer label per cell (0 for background)
+    """
+    rows, starts, ends = _runs(grid)
+    parent = list(range(len(rows)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    # Runs are in row-major order; sweep each pair of adjacent rows with two pointers
+    row_begin = np.searchsorted(rows, np.arange(grid.shape[0] + 1))
+    for row in range(1, grid.shape[0]):
+        i, i_end = row_begin[row - 1], row_begin[row]
+        j, j_end = row_begin[row], row_begin[row + 1]
+        while i < i_end and j < j_end:
+            if starts[i] <= ends[j] and starts[j] <= ends[i]:
+                a, b = find(i), find(j)
+                if a != b:
+                    parent[max(a, b)] = min(a, b)
+            if ends[i] < ends[j]:
+                i += 1
+            else:
+                j += 1
+
+    labels = np.zeros(grid.shape, dtype=np.int32)
+    for run in range(len(rows)):
+        labels[rows[run], starts[run]:ends[run]] = find(run) + 1
+    return labels
+
+
+def find_change_regions(band_masks: Dict[int, Tuple[np.ndarray, np.ndarray]], height: int, width: int,
+                        cell: int = CELL_SIZE, merge_distance: int = MERGE_DISTANCE,
+                        max_regions: int = MAX_REGIONS) -> List[Dict]:
+    """
+    Cluster changed pixels into bounding boxes
+    Args:
+        band_masks: Changed bands from visual_diff.diff_arrays
+        height: Image height
+        width: Image width
+        cell: Downsampling factor for the mask
+        merge_distance: Regions closer than this many cells are merged
+        max_regions: Number of regions to return, largest first (0 for all)
+    Returns: Regions with pixel box, area and changed pixel count, ranked by area
+    """
+    return regions_from_cells(downsample_mask(band_masks, height, width, cell), height, width, cell,
+                              merge_distance, max_regions)
+
+
+def regions_from_cells(counts: np.ndarray, height: int, width: int, cell: int = CELL_SIZE,
+                       merge_distance: int = MERGE_DISTANCE, max_regions: int = MAX_REGIONS) -> List[Dict]:
+    """Cluster per-cell changed pixel counts (see add_band_cells) into bounding boxes, as find_change_regions"""
+    changed_cells = counts > 0
+    if not changed_cells.any():
+        return []
+
+    # Label the dilated grid so nearby changes join, then box only the truly changed cells
+    labels = label_cells(_dilate(changed_cells, merge_distance))
+    ys, xs = np.nonzero(changed_cells)
+    _, component = np.unique(labels[ys, xs], return_inverse=True)
+    components = component.max() + 1
+
+    top = np.full(components, counts.shape[0])
+    left = np.full(components, counts.shape[1])
+    bottom = np.zeros(components, dtype=np.int64)
+    right = np.zeros(components, dtype=np.int64)
+    np.minimum.at(top, component, ys)
+    np.minimum.at(left, component, xs)
+    np.maximum.at(bottom, component, ys + 1)
+    np.maximum.at(right, component, xs + 1)
+    pixels = np.bincount(component, weights=counts[ys, xs], minlength=components)
+
+    regions = []
+    for index in range(components):
+        x = int(left[index]) * cell
+        y = int(top[index]) * cell
+        region_width = min(width, int(right[index]) * cell) - x
+        region_height = min(height, int(bottom[index]) * cell) - y
+        regions.append({
+            'x': x,
+            'y': y,
+            'width': region_width,
+            'height': region_height,
+            'area': region_width * region_height,
+            'changed_pixels': int(pixels[index])
+        })
+
+    regions.sort(key=lambda r: r['area'], reverse=True)
+    return regions[:max_regions] if max_regions else regions
@@ -0,0 +1,98 @@
+from typing import Dict, Tuple
+import numpy as np
+from PIL import Image
+
+
+SAMPLE_PIXELS = 65536
+QUANTIZE_BITS = 5
+DOMINANT_COLORS = 5
+KMEANS_ITERATIONS = 10
+ALPHA_THRESHOLD = 128
+
+
+def _sample(img: Image.Image, sample_pixels: int) -> np.ndarray:
+    """Nearest-neighbour sample of about sample_pixels pixels as RGBA
+
+    Nearest sampling keeps real page colours; filtering would invent blends along every edge.
+    """
+    ratio = min((sample_pixels / (img.width * img.height)) ** 0.5, 1.0)
+    size = (max(1, round(img.width * ratio)), max(1, round(img.height * ratio)))
+    small = img.resize(size, Image.Resampling.NEAREST) if ratio < 1.0 else img
+    if small.mode != 'RGBA':
+        small = small.convert('RGBA')
+    return np.asarray(small).reshape(-1, 4)
+
+
+def _kmeans(points: np.ndarray, weights: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Weighted k-means over histogram bins, seeded with the k most frequent bins"""
+    order = np.argsort(weights)[::-1]
+    centers = points[order[:k]].astype(np.float32)
+    for _ in range(KMEANS_ITERATIONS):
+        distances = ((points[:, None, :] - centers[None, :, :]) ** 2).sum(axis=-1)
+        assignment = distances.argmin(axis=1)
+        totals = np.bincount(assignment, weights=weights, minlength=len(centers))
+        updated = centers.copy()
+        for channel in range(3):
+            sums = np.bincount(assignment, weights=weights * points[:, channel], minlength=len(centers))
+            nonempty = totals > 0
+            updated[nonempty, channel] = sums[nonempty] / totals[nonempty]
+        if np.allclose(updated, centers, atol=0.5):
+            centers = updated
+            break
+        centers = updated
+
+    distances = ((points[:, None, :] - centers[None, :, :]) ** 2).sum(axis=-1)
+    totals = np.bincount(distances.argmin(axis=1), weights=weights, minlength=len(centers))
+    return centers, totals
+
+
+def color_profile(img: Image.Image, sample_pixels: int = SAMPLE_PIXELS, bits: int = QUANTIZE_BITS,
+                  k: int = DOMINANT_COLORS) -> Dict:
+    """
+    Colour profile of a capture from a downsampled view
+    Args:
+        img: Image in any mode (RGB, RGBA, P, L, ...)
+        sample_pixels: Approximate number of pixels analysed
+        bits: Bits kept per channel when quantising (5 -> 32 levels)
+        k: Number of dominant colours to find
+    Returns: Dominant colours with estimated full-size pixel counts, quantised colour count,
+             per-channel histograms, mean colour and transparent share
+    """
+    pixels = _sample(img, sample_pixels)
+    opaque = pixels[pixels[:, 3] >= ALPHA_THRESHOLD, :3]
+    scale = (img.width * img.height) / max(len(pixels), 1)
+    profile = {
+        'sample_pixels': int(len(pixels)),
+        'transparent_ratio': round(1.0 - len(opaque) / max(len(pixels), 1), 4),
+        'dominant_colors': [],
+        'unique_colors': 0,
+        'mean_color': None,
+        'histograms': {}
+    }
+    if not len(opaque):
+        return profile
+
+    # Quantise and histogram in one bincount over packed bin indices
+    shift = 8 - bits
+    levels = opaque >> shift
+    bins = (levels[:, 0].astype(np.int32) << (2 * bits)) | (levels[:, 1].astype(np.int32) << bits) | levels[:, 2]
+    histogram = np.bincount(bins, minlength=1 << (3 * bits))
+    occupied = np.nonzero(histogram)[0]
+    mask = (1 << bits) - 1
+    centers_of_bins = np.stack([(occupied >> (2 * bits)) & mask, (occupied >> bits) & mask, occupied & mask], axis=1)
+    points = (centers_of_bins << shift) + (1 << shift) // 2
+
+    centers, totals = _kmeans(points.astype(np.float32), histogram[occupied].astype(np.float64),
+                              min(k, len(occupied)))
+    ranked = np.argsort(totals)[::-1]
+    profile['dominant_colors'] = [
+        (int(round(totals[i] * scale)), tuple(int(round(c)) for c in centers[i]))
+        for i in ranked if totals[i] > 0
+    ]
+    profile['unique_colors'] = int(len(occupied))
+    profile['mean_color'] = tuple(int(round(c)) for c in opaque.mean(axis=0))
+    profile['histograms'] = {
+        channel: np.bincount(opaque[:, index] >> 4, minlength=16).tolist()
+        for index, channel in enumerate(('red', 'green', 'blue'))
+    }
+    return profile
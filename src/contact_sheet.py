@@ -0,0 +1,111 @@
+import os
+from typing import List, Optional, Tuple
+import numpy as np
+from PIL import Image, ImageDraw
+from image_composer import label_font
+from retention import ARCHIVE_SEPARATOR
+from thumbnails import load_thumbnail
+
+
+CELL_SIZE = (240, 400)
+COLUMNS = 6
+ROWS_PER_PAGE = 4
+LABEL_HEIGHT = 40
+PADDING = 12
+BACKGROUND = (255, 255, 255)
+PLACEHOLDER = (233, 236, 239)
+
+
+def _capture_size(ref: str) -> Optional[Tuple[int, int]]:
+    """Capture dimensions from the image header; archive members are not opened just for this"""
+    if ARCHIVE_SEPARATOR in ref:
+        return None
+    try:
+        with Image.open(ref) as img:
+            return img.size
+    except OSError:
+        return None
+
+
+def _page_paths(output_path: str, pages: int) -> List[str]:
+    """output_path for a single page, otherwise <stem>_page<N><ext> per page"""
+    if pages == 1:
+        return [output_path]
+    stem, ext = os.path.splitext(output_path)
+    return [f'{stem}_page{page}{ext}' for page in range(1, pages + 1)]
+
+
+def _tile(screenshots_dir: str, ref: str, cell_size: Tuple[int, int]) -> Optional[np.ndarray]:
+    """Cached thumbnail of a capture flattened to RGB, or None if it cannot be loaded"""
+    try:
+        thumb = load_thumbnail(screenshots_dir, ref, cell_size)
+    except Exception as e:
+        print(f"Error loading thumbnail for {ref}: {e}")
+        return None
+    if thumb.mode == 'RGB':
+        return np.asarray(thumb)
+    rgba = np.asarray(thumb.convert('RGBA'), dtype=np.uint16)
+    alpha = rgba[:, :, 3:4]
+    return ((rgba[:, :, :3] * alpha + np.array(BACKGROUND, dtype=np.uint16) * (255 - alpha)) // 255).astype(np.uint8)
+
+
+def contact_sheet(entries: List[Tuple[str, str]], output_path: str, screenshots_dir: str,
+                  columns: int = COLUMNS, rows_per_page: int = ROWS_PER_PAGE,
+                  cell_size: Tuple[int, int] = CELL_SIZE,
+                  progress_callback: Optional[callable] = None) -> List[str]:
+    """
+    Grid of capture thumbnails with labels, split across pages for large catalogs
+    Args:
+        entries: (label, capture path or archive reference) pairs in display order
+        output_path: Image path; multi-page sheets get a _page<N> suffix
+        screenshots_dir: Screenshots directory holding the thumbnail cache
+        columns: Cells per row
+        rows_per_page: Rows per page
+        cell_size: Thumbnail box per cell, cached alongside the gallery thumbnails
+        progress_callback: Optional callback for progress updates
+    Returns: Paths of the written pages
+    """
+    if not entries:
+        return []
+
+    per_page = columns * rows_per_page
+    pages = (len(entries) + per_page - 1) // per_page
+    cell_width, cell_height = cell_size
+    pitch_x = cell_width + PADDING
+    pitch_y = cell_height + LABEL_HEIGHT + PADDING
+    font = label_font(12)
+
+    paths = _page_paths(output_path, pages)
+    for page, path in enumerate(paths):
+        page_entries = entries[page * per_page:(page + 1) * per_page]
+        rows = (len(page_entries) + columns - 1) // columns
+        used_columns = min(columns, len(page_entries))
+        canvas = np.empty((rows * pitch_y + PADDING, used_columns * pitch_x + PADDING, 3), dtype=np.uint8)
+        canvas[:] = BACKGROUND
+
+        # Thumbnails are placed with array slices; only labels go through ImageDraw
+        captions = []
+        for index, (label, ref) in enumerate(page_entries):
+            if progress_callback:
+                progress_callback(f"Adding capture {page * per_page + index + 1}/{len(entries)} to contact sheet")
+            row, column = divmod(index, columns)
+            x = PADDING + column * pitch_x
+            y = PADDING + row * pitch_y
+            tile = _tile(screenshots_dir, ref, cell_size)
+            if tile is None:
+                canvas[y:y + cell_height, x:x + cell_width] = PLACEHOLDER
+                captions.append((x, y + cell_height + 4, f"{label}\nError loading"))
+                continue
+
+            left = x + (cell_width - tile.shape[1]) // 2
+            canvas[y:y + tile.shape[0], left:left + tile.shape[1]] = tile
+            size = _capture_size(ref)
+            captions.append((x, y + cell_height + 4, f"{label}\n{size[0]}x{size[1]}" if size else label))
+
+        sheet = Image.fromarray(canvas)
+        draw = ImageDraw.Draw(sheet)
+        for x, y, caption in captions:
+            draw.multiline_text((x, y), caption, fill='black', font=font, spacing=2)
+        sheet.save(path, compress_level=6)
+        sheet.close()
+    return paths
@@ -0,0 +1,341 @@
+import os
+import json
+import shutil
+import hashlib
+import threading
+from datetime import datetime
+from typing import Dict, Optional
+from PIL import Image
+
+
+STORE_DIRNAME = '.store'
+LOCK_FILENAME = '.lock'
+
+try:
+    import fcntl
+
+    def _lock_file(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+    def _unlock_file(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+except ImportError:  # Windows
+    import msvcrt
+
+    def _lock_file(f):
+        f.seek(0)
+        while True:
+            try:
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)  # Itself retries for about 10 seconds
+                return
+            except OSError:
+                continue
+
+    def _unlock_file(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class _StoreLock:
+    """Serialises writers of one store: threads through a re-entrant lock, processes through a lock file
+
+    One instance exists per store directory in a process, however many
+    ContentStore objects point at it, so retention, recompression and the
+    capture pipeline never run gc() and writes at the same time.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+
+    def __enter__(self) -> '_StoreLock':
+        self._lock.acquire()
+        if self._depth == 0:
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                self._file = open(self.path, 'a+b')
+                _lock_file(self._file)
+            except BaseException:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                self._lock.release()
+                raise
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0:
+            try:
+                _unlock_file(self._file)
+            finally:
+                self._file.close()
+                self._file = None
+        self._lock.release()
+
+
+_store_locks = {}
+_store_locks_guard = threading.Lock()
+
+
+def _store_lock(root: str) -> _StoreLock:
+    """The process-wide lock of a store directory"""
+    with _store_locks_guard:
+        key = os.path.normcase(os.path.realpath(root))
+        if key not in _store_locks:
+            _store_locks[key] = _StoreLock(os.path.join(root, LOCK_FILENAME))
+        return _store_locks[key]
+
+
+def pixel_hash(img: Image.Image) -> str:
+    """Hash decoded pixels so re-encoded but identical captures collide"""
+    if img.mode not in ('RGB', 'RGBA'):
+        img = img.convert('RGBA')
+    if img.mode == 'RGBA' and img.getchannel('A').getextrema() == (255, 255):
+        img = img.convert('RGB')
+
+    digest = hashlib.blake2b(digest_size=32)
+    digest.update(f"{img.mode}:{img.width}x{img.height}:".encode('ascii'))
+    digest.update(img.tobytes())
+    return digest.hexdigest()
+
+
+def file_pixel_hash(filepath: str) -> str:
+    """Pixel hash of an image file"""
+    with Image.open(filepath) as img:
+        return pixel_hash(img)
+
+
+class ContentStore:
+    """Content-addressed storage for screenshots, deduplicated by pixel hash
+
+    Each unique image is stored once under .store/objects/<aa>/<hash>.png and
+    captures in the screenshots directory are hardlinks to it (or copies on
+    filesystems without hardlink support). An append-only index maps capture
+    filenames to pixel hashes.
+    """
+
+    def __init__(self, screenshots_dir: str):
+        self.screenshots_dir = screenshots_dir
+        self.root = os.path.join(screenshots_dir, STORE_DIRNAME)
+        self.objects_dir = os.path.join(self.root, 'objects')
+        self.index_path = os.path.join(self.root, 'index.jsonl')
+        # Shared by every ContentStore on this directory; re-entrant, as writes record their entry while holding it
+        self._lock = _store_lock(self.root)
+        self._index = None
+        self._index_offset = 0  # Bytes of the index file read into _index
+        self._recent = {}
+
+    def object_path(self, digest: str, extension: str = '.png') -> str:
+        """Location of the stored object for a pixel hash"""
+        return os.path.join(self.objects_dir, digest[:2], digest + extension)
+
+    def contains(self, digest: str, extension: str = '.png') -> bool:
+        """Whether an object with this pixel hash is already stored"""
+        return os.path.exists(self.object_path(digest, extension))
+
+    def _link(self, source: str, target: str) -> bool:
+        """Atomically point target at source; returns True if a hardlink was used"""
+        tmp_path = target + '.link'
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        try:
+            os.link(source, tmp_path)
+            linked = True
+        except OSError:
+            shutil.copy2(source, tmp_path)
+            linked = False
+        os.replace(tmp_path, target)
+        return linked
+
+    def ingest(self, filepath: str, digest: Optional[str] = None) -> Dict:
+        """
+        Move a freshly written capture into the store and link it back
+        Args:
+            filepath: Capture file in the screenshots directory
+            digest: Pixel hash if already known (skips decoding)
+        Returns: Record with pixel_hash, deduplicated flag and bytes_saved
+        """
+        digest = digest or file_pixel_hash(filepath)
+        extension = os.path.splitext(filepath)[1]
+        object_path = self.object_path(digest, extension)
+        size = os.path.getsize(filepath)
+
+        with self._lock:
+            deduplicated = os.path.exists(object_path)
+            if deduplicated:
+                linked = self._link(object_path, filepath)
+            else:
+                os.makedirs(os.path.dirname(object_path), exist_ok=True)
+                os.replace(filepath, object_path)
+                linked = self._link(object_path, filepath)
+            # Indexed before the lock is released, so gc() never sees a linked object without its reference
+            return self.record(os.path.basename(filepath), digest, size, deduplicated, linked)
+
+    def put_bytes(self, data: bytes, filepath: str, digest: str,
+                  metadata: Optional[Dict] = None) -> Dict:
+        """Store encoded image bytes by pixel hash; the write is skipped entirely on a hit"""
+        extension = os.path.splitext(filepath)[1]
+        object_path = self.object_path(digest, extension)
+
+        with self._lock:
+            deduplicated = os.path.exists(object_path)
+            if not deduplicated:
+                os.makedirs(os.path.dirname(object_path), exist_ok=True)
+                tmp_path = object_path + '.tmp'
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, object_path)
+            linked = self._link(object_path, filepath)
+            return self.record(os.path.basename(filepath), digest, len(data), deduplicated, linked, metadata)
+
+    def record(self, filename: str, digest: str, size: int,
+               deduplicated: bool, linked: bool, metadata: Optional[Dict] = None) -> Dict:
+        """Append a capture -> object entry to the index
+
+        Deduplicated captures share the object (and its embedded metadata) with
+        the first capture, so their own metadata is kept in the index entry.
+        """
+        entry = {
+            'filename': filename,
+            'pixel_hash': digest,
+            'size': size,
+            'deduplicated': deduplicated,
+            'bytes_saved': size if deduplicated and linked else 0,
+            'created': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
+        if metadata and deduplicated:
+            entry['metadata'] = metadata
+
+        with self._lock:
+            os.makedirs(self.root, exist_ok=True)
+            with open(self.index_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + '\n')
+            if self._index is not None:
+                self._index[filename] = entry
+            self._recent[filename] = entry
+        return entry
+
+    def load_index(self) -> Dict[str, Dict]:
+        """Capture filename -> latest index entry"""
+        with self._lock:
+            if self._index is None:
+                self._index = {}
+                self._index_offset = 0
+                self._read_index()
+            return self._index
+
+    def _read_index(self):
+        """Merge index lines appended since the last read (by this or any other store instance)"""
+        try:
+            with open(self.index_path, 'rb') as f:
+                f.seek(self._index_offset)
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break  # Another writer is mid-append; read the line once it is complete
+                    self._index_offset += len(line)
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    self._index[entry['filename']] = entry
+        except FileNotFoundError:
+            pass
+
+    def lookup(self, filename: str) -> Optional[Dict]:
+        """Index entry for a capture filename"""
+        filename = os.path.basename(filename)
+        if filename in self._recent:
+            return self._recent[filename]
+        entry = self.load_index().get(filename)
+        if entry is None:
+            # Recorded after this index was loaded, e.g. through another ContentStore
+            with self._lock:
+                self._read_index()
+                entry = self._index.get(filename)
+        return entry
+
+    def gc(self) -> Dict:
+        """Remove objects no live capture refers to any more and compact the index
+
+        References come from the index: an entry holds its object while the
+        capture still exists and is that object (a hardlink, or an unchanged
+        copy where hardlinks are unavailable). Captures that were deleted,
+        recompressed or replaced release it. Entries of captures that live on
+        in the cold tier (as WebP or inside an archive) release their object
+        but stay indexed, since deduplicated captures keep their metadata there.
+        """
+        # Imported here: retention builds on this module
+        from retention import ColdStorage, SCREENSHOT_EXTENSIONS
+
+        with self._lock:
+            index = self.load_index()
+            self._read_index()
+            archived = {os.path.splitext(entry['filename'])[0]
+                        for entry in ColdStorage(self.screenshots_dir).list_entries()}
+            live = {}
+            referenced = set()
+            for name, entry in index.items():
+                capture_path = os.path.join(self.screenshots_dir, name)
+                if not os.path.exists(capture_path):
+                    stem = os.path.splitext(name)[0]
+                    if stem in archived or any(os.path.exists(os.path.join(self.screenshots_dir, stem + extension))
+                                               for extension in SCREENSHOT_EXTENSIONS):
+                        live[name] = entry
+                    continue
+                live[name] = entry
+                object_path = self.object_path(entry['pixel_hash'], os.path.splitext(name)[1])
+                try:
+                    if os.path.samefile(capture_path, object_path) or \
+                            os.path.getsize(capture_path) == os.path.getsize(object_path):
+                        referenced.add(object_path)
+                except OSError:
+                    continue
+
+            removed = 0
+            freed = 0
+            if os.path.isdir(self.objects_dir):
+                for prefix in os.listdir(self.objects_dir):
+                    prefix_dir = os.path.join(self.objects_dir, prefix)
+                    for name in os.listdir(prefix_dir):
+                        path = os.path.join(prefix_dir, name)
+                        if path in referenced or name.endswith('.tmp'):
+                            continue
+                        freed += os.path.getsize(path)
+                        os.remove(path)
+                        removed += 1
+
+            if len(live) != len(index) and os.path.exists(self.index_path):
+                tmp_path = self.index_path + '.tmp'
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    for entry in live.values():
+                        f.write(json.dumps(entry) + '\n')
+                os.replace(tmp_path, self.index_path)
+            self._index = live
+            self._index_offset = os.path.getsize(self.index_path) if os.path.exists(self.index_path) else 0
+            self._recent = {name: entry for name, entry in self._recent.items() if name in live}
+
+        return {'objects_removed': removed, 'bytes_freed': freed}
+
+    def stats(self) -> Dict:
+        """Object count and on-disk size of the store versus logical capture size"""
+        objects = 0
+        stored_bytes = 0
+        if os.path.isdir(self.objects_dir):
+            for prefix in os.listdir(self.objects_dir):
+                prefix_dir = os.path.join(self.objects_dir, prefix)
+                for name in os.listdir(prefix_dir):
+                    objects += 1
+                    stored_bytes += os.path.getsize(os.path.join(prefix_dir, name))
+
+        index = self.load_index()
+        return {
+            'objects': objects,
+            'captures': len(index),
+            'stored_bytes': stored_bytes,
+            'logical_bytes': sum(entry['size'] for entry in index.values()),
+            'deduplicated': sum(1 for entry in index.values() if entry.get('deduplicated'))
+        }
@@ -0,0 +1,345 @@
+import os
+import json
+import sqlite3
+import zipfile
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from capture_metadata import read_metadata, parse_capture_filename
+from content_store import ContentStore
+from perceptual_hash import MultiIndexHash, image_hashes, hamming, to_signed, to_unsigned
+from retention import ColdStorage, SCREENSHOT_EXTENSIONS, ARCHIVE_SEPARATOR, capture_time, open_screenshot
+
+
+HISTORY_DB_FILENAME = 'history.db'
+SCHEMA_VERSION = 3  # 3: re-read recompressed captures whose metadata was dropped
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS captures (
+    filepath TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    domain TEXT,
+    device TEXT,
+    screenshot_mode TEXT,
+    url TEXT,
+    timestamp TEXT,
+    captured TEXT,
+    size INTEGER,
+    mtime REAL,
+    width INTEGER,
+    height INTEGER,
+    metadata TEXT,
+    group_key TEXT,
+    dhash INTEGER,
+    phash INTEGER,
+    prev_distance INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_captures_captured ON captures (captured);
+CREATE INDEX IF NOT EXISTS idx_captures_device ON captures (device);
+CREATE INDEX IF NOT EXISTS idx_captures_group ON captures (group_key, captured);
+"""
+
+_COLUMNS = ('filepath', 'filename', 'domain', 'device', 'screenshot_mode', 'url', 'timestamp',
+            'captured', 'size', 'mtime', 'width', 'height', 'metadata', 'group_key', 'dhash', 'phash')
+
+
+def capture_group(url: Optional[str], domain: str, device: str, screenshot_mode: str) -> str:
+    """Key shared by successive captures of the same page, device and mode"""
+    return f"{url or domain}|{device}|{screenshot_mode}"
+
+
+class HistoryIndex:
+    """SQLite index of captures, rebuilt from metadata embedded in the files themselves
+
+    Only files whose size or mtime changed since the last sync are read, and
+    those reads stop at the image header, so a full rebuild is a cheap
+    parallel scan.
+    """
+
+    def __init__(self, screenshots_dir: str, max_workers: int = 8, content_store: Optional[ContentStore] = None):
+        """
+        Args:
+            screenshots_dir: Screenshots directory
+            max_workers: Files read in parallel during a sync
+            content_store: Store the captures are written through (shared, so its index sees new captures)
+        """
+        self.screenshots_dir = screenshots_dir
+        self.db_path = os.path.join(screenshots_dir, HISTORY_DB_FILENAME)
+        self.max_workers = max_workers
+        self.content_store = content_store or ContentStore(screenshots_dir)
+        self._lock = threading.Lock()
+        self._hash_table_cache = None
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(self.screenshots_dir, exist_ok=True)
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        # The index is a cache of the files, so an outdated schema is simply rebuilt
+        if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            conn.executescript("DROP TABLE IF EXISTS captures;")
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.executescript(_SCHEMA)
+        return conn
+
+    def _list_files(self) -> Dict[str, Tuple[str, int, float]]:
+        """Capture reference -> (filename, size, mtime) for loose files and archive members"""
+        files = {}
+        if os.path.isdir(self.screenshots_dir):
+            with os.scandir(self.screenshots_dir) as it:
+                for entry in it:
+                    if entry.is_file() and entry.name.endswith(SCREENSHOT_EXTENSIONS):
+                        stats = entry.stat()
+                        files[entry.path] = (entry.name, stats.st_size, stats.st_mtime)
+
+        # Archive members never change once packed, so their size is signature enough
+        for entry in ColdStorage(self.screenshots_dir).list_entries():
+            files[entry['filepath']] = (entry['filename'], entry['size'], 0.0)
+        return files
+
+    def _read_row(self, filepath: str, filename: str, size: int, mtime: float) -> Tuple:
+        """Build an index row from a capture's embedded metadata"""
+        try:
+            if ARCHIVE_SEPARATOR in filepath:
+                archive_path, member = filepath.split(ARCHIVE_SEPARATOR, 1)
+                with zipfile.ZipFile(archive_path) as archive, archive.open(member) as f:
+                    metadata = read_metadata(f)
+            else:
+                metadata = read_metadata(filepath)
+        except (OSError, zipfile.BadZipFile) as e:
+            print(f"Could not read metadata from {filepath}: {e}")
+            metadata = None
+
+        # Deduplicated captures share the first capture's file; their own metadata is in the store index.
+        # Stems are compared because recompressed captures keep the metadata naming their original .png
+        stem = os.path.splitext(filename)[0]
+        if metadata and metadata.get('filename') and os.path.splitext(metadata['filename'])[0] != stem:
+            stored = self.content_store.lookup(filename) or self.content_store.lookup(stem + '.png')
+            metadata = stored.get('metadata') if stored else None
+
+        parsed = parse_capture_filename(filename)
+        metadata = metadata or {}
+        captured = metadata.get('captured') or \
+            datetime.fromtimestamp(capture_time(filename, mtime)).isoformat(timespec='seconds')
+
+        hashes = {key: metadata[key] for key in ('dhash', 'phash') if metadata.get(key)}
+        if len(hashes) < 2:
+            # Captures from before perceptual hashing are decoded once here
+            try:
+                with open_screenshot(filepath) as img:
+                    hashes = image_hashes(img)
+            except Exception as e:
+                print(f"Could not hash {filepath}: {e}")
+                hashes = {'dhash': None, 'phash': None}
+
+        domain = metadata.get('domain', parsed['domain'])
+        device = metadata.get('device', parsed['device'])
+        screenshot_mode = metadata.get('screenshot_mode', parsed['screenshot_mode'])
+        return (
+            filepath,
+            filename,
+            domain,
+            device,
+            screenshot_mode,
+            metadata.get('url'),
+            parsed['timestamp'],
+            captured,
+            size,
+            mtime,
+            metadata.get('width'),
+            metadata.get('height'),
+            json.dumps(metadata) if metadata else None,
+            capture_group(metadata.get('url'), domain, device, screenshot_mode),
+            to_signed(int(hashes['dhash'], 16)) if hashes['dhash'] else None,
+            to_signed(int(hashes['phash'], 16)) if hashes['phash'] else None
+        )
+
+    def _update_prev_distances(self, conn: sqlite3.Connection, groups: set):
+        """pHash distance of each capture to the previous capture in its group"""
+        updates = []
+        for group in groups:
+            previous = None
+            for row in conn.execute("SELECT filepath, phash FROM captures WHERE group_key = ? "
+                                    "ORDER BY captured", (group,)):
+                distance = None
+                if previous is not None and row['phash'] is not None:
+                    distance = hamming(to_unsigned(previous), to_unsigned(row['phash']))
+                updates.append((distance, row['filepath']))
+                previous = row['phash']
+        conn.executemany("UPDATE captures SET prev_distance = ? WHERE filepath = ?", updates)
+
+    def sync(self, progress_callback: Optional[callable] = None) -> Dict:
+        """
+        Bring the index up to date with the screenshots directory
+        Args:
+            progress_callback: Optional callback for progress updates
+        Returns: Counts of scanned, updated and removed captures
+        """
+        with self._lock:
+            files = self._list_files()
+            conn = self._connect()
+            try:
+                known = {row['filepath']: (row['size'], row['mtime'])
+                         for row in conn.execute("SELECT filepath, size, mtime FROM captures")}
+
+                changed = [(path, name, size, mtime) for path, (name, size, mtime) in files.items()
+                           if known.get(path) != (size, mtime)]
+                removed = [path for path in known if path not in files]
+
+                if changed and progress_callback:
+                    progress_callback(f"Indexing {len(changed)} captures...")
+
+                with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                    rows = list(executor.map(lambda item: self._read_row(*item), changed))
+
+                groups = {row[_COLUMNS.index('group_key')] for row in rows}
+                if removed:
+                    placeholders = ', '.join('?' * len(removed))
+                    groups.update(row['group_key'] for row in conn.execute(
+                        f"SELECT DISTINCT group_key FROM captures WHERE filepath IN ({placeholders})", removed))
+
+                with conn:
+                    conn.executemany(
+                        f"INSERT OR REPLACE INTO captures ({', '.join(_COLUMNS)}) "
+                        f"VALUES ({', '.join('?' * len(_COLUMNS))})",
+                        rows
+                    )
+                    conn.executemany("DELETE FROM captures WHERE filepath = ?", [(path,) for path in removed])
+                    self._update_prev_distances(conn, groups)
+            finally:
+                conn.close()
+
+            if changed or removed:
+                self._hash_table_cache = None
+
+        return {'scanned': len(files), 'updated': len(changed), 'removed': len(removed)}
+
+    def rebuild(self, progress_callback: Optional[callable] = None) -> Dict:
+        """Drop the index and rebuild it from the files alone"""
+        with self._lock:
+            if os.path.exists(self.db_path):
+                os.remove(self.db_path)
+        return self.sync(progress_callback)
+
+    def query(self, device: Optional[str] = None, domain: Optional[str] = None,
+              limit: Optional[int] = None, screenshot_mode: Optional[str] = None,
+              search: Optional[str] = None, since: Optional[str] = None, until: Optional[str] = None,
+              offset: int = 0) -> List[Dict]:
+        """
+        Indexed captures, newest first
+        Args:
+            device: Only this device
+            domain: Only this domain
+            limit: Maximum number of entries
+            screenshot_mode: Only this screenshot mode
+            search: Substring of the URL or filename
+            since: Captured at or after this ISO date/time
+            until: Captured before this ISO date/time
+            offset: Entries to skip, for paging
+        Returns: History entries
+        """
+        sql = "SELECT * FROM captures"
+        clauses = []
+        params = []
+        for column, value in (('device', device), ('domain', domain), ('screenshot_mode', screenshot_mode)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if search:
+            clauses.append("(url LIKE ? ESCAPE '\\' OR filename LIKE ? ESCAPE '\\')")
+            pattern = '%' + search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            params.extend((pattern, pattern))
+        if since:
+            clauses.append("captured >= ?")
+            params.append(since)
+        if until:
+            clauses.append("captured < ?")
+            params.append(until)
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY captured DESC"
+        if limit is not None or offset:
+            sql += " LIMIT ? OFFSET ?"
+            params.extend((-1 if limit is None else limit, offset))
+
+        conn = self._connect()
+        try:
+            return [self._row_to_entry(row) for row in conn.execute(sql, params)]
+        finally:
+            conn.close()
+
+    def facets(self) -> Dict[str, List[str]]:
+        """Distinct devices, domains and screenshot modes, for filter menus"""
+        conn = self._connect()
+        try:
+            return {column: [row[0] for row in conn.execute(
+                        f"SELECT DISTINCT {column} FROM captures WHERE {column} IS NOT NULL AND {column} != '' "
+                        f"ORDER BY {column}")]
+                    for column in ('device', 'domain', 'screenshot_mode')}
+        finally:
+            conn.close()
+
+    def _query_one(self, sql: str, params: Tuple) -> Optional[Dict]:
+        conn = self._connect()
+        try:
+            row = conn.execute(sql, params).fetchone()
+            return self._row_to_entry(row) if row else None
+        finally:
+            conn.close()
+
+    def get(self, filepath: str) -> Optional[Dict]:
+        """Index entry for one capture"""
+        return self._query_one("SELECT * FROM captures WHERE filepath = ?", (filepath,))
+
+    def previous_capture(self, filepath: str) -> Optional[Dict]:
+        """Most recent earlier capture of the same page, device and mode"""
+        return self._query_one(
+            "SELECT prev.* FROM captures cur JOIN captures prev ON prev.group_key = cur.group_key "
+            "AND prev.captured < cur.captured WHERE cur.filepath = ? ORDER BY prev.captured DESC LIMIT 1",
+            (filepath,)
+        )
+
+    def last_change(self, group_key: str, threshold: int = 10) -> Optional[Dict]:
+        """
+        Latest capture in a group whose pHash moved more than threshold bits from the one before
+        Args:
+            group_key: capture_group() of the page/device/mode
+            threshold: Hamming distance (0-64) that counts as a visual change
+        Returns: The first capture after the change, or None if the page never changed that much
+        """
+        return self._query_one(
+            "SELECT * FROM captures WHERE group_key = ? AND prev_distance > ? ORDER BY captured DESC LIMIT 1",
+            (group_key, threshold)
+        )
+
+    def _hash_table(self) -> MultiIndexHash:
+        """Multi-index hash table over every indexed pHash, built once per index state"""
+        if self._hash_table_cache is None:
+            table = MultiIndexHash()
+            conn = self._connect()
+            try:
+                for row in conn.execute("SELECT filepath, phash FROM captures WHERE phash IS NOT NULL"):
+                    table.add(to_unsigned(row['phash']), row['filepath'])
+            finally:
+                conn.close()
+            self._hash_table_cache = table
+        return self._hash_table_cache
+
+    def similar(self, phash: str, max_distance: int = 6) -> List[Tuple[int, str]]:
+        """Captures whose pHash is within max_distance bits, closest first, as (distance, filepath)"""
+        return self._hash_table().search(int(phash, 16), max_distance)
+
+    def nearest(self, phash: str) -> Optional[Tuple[int, str]]:
+        """Single closest capture to a pHash as (distance, filepath)"""
+        return self._hash_table().nearest(int(phash, 16))
+
+    @staticmethod
+    def _row_to_entry(row: sqlite3.Row) -> Dict:
+        """History entry in the shape get_screenshot_history has always returned"""
+        entry = dict(row)
+        entry['created'] = datetime.fromisoformat(entry['captured']).strftime('%Y-%m-%d %H:%M:%S')
+        entry['metadata'] = json.loads(entry['metadata']) if entry['metadata'] else {}
+        for key in ('dhash', 'phash'):
+            if entry[key] is not None:
+                entry[key] = f'{to_unsigned(entry[key]):016x}'
+        return entry
@@ -0,0 +1,141 @@
+import math
+from functools import lru_cache
+from typing import List, Optional, Sequence, Tuple
+from PIL import Image, ImageDraw, ImageFont
+from capture_pipeline import CaptureFrame, open_image
+
+
+TARGET_HEIGHT = 4096
+LABEL_HEIGHT = 50
+LABEL_FONT_SIZE = 16
+BACKGROUND = 'white'
+
+
+@lru_cache(maxsize=8)
+def label_font(size: int = LABEL_FONT_SIZE) -> ImageFont.ImageFont:
+    """Label font, looked up once per size"""
+    try:
+        return ImageFont.truetype("arial.ttf", size)
+    except OSError:
+        return ImageFont.load_default()
+
+
+def _owned(source) -> bool:
+    """Whether opening this source creates an image we must close ourselves"""
+    if isinstance(source, Image.Image):
+        return False
+    if isinstance(source, CaptureFrame):
+        return source.png_bytes is None and source._image is None
+    return True
+
+
+def fit_size(size: Tuple[int, int], target_width: Optional[int], target_height: Optional[int]) -> Tuple[int, int]:
+    """Size scaled down (never up) to fit the target box, aspect ratio kept"""
+    width, height = size
+    scale = 1.0
+    if target_width:
+        scale = min(scale, target_width / width)
+    if target_height:
+        scale = min(scale, target_height / height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def source_size(source) -> Tuple[int, int]:
+    """Pixel size of a capture, read from the header without decoding"""
+    img = open_image(source)
+    try:
+        return img.size
+    finally:
+        if _owned(source):
+            img.close()
+
+
+def load_scaled(source, size: Tuple[int, int]) -> Image.Image:
+    """
+    Decode a capture straight to a smaller RGB size
+    JPEG inputs decode at reduced scale via draft(); others are box-reduced by
+    an integer factor before the final resample. Images opened here are closed
+    before returning.
+    """
+    original = open_image(source)
+    try:
+        if original.format == 'JPEG':
+            original.draft('RGB', size)
+        if original.mode in ('RGBA', 'LA', 'P'):
+            img = _flatten(original)
+        elif original.mode != 'RGB':
+            img = original.convert('RGB')
+        else:
+            img = original
+        if img.size == size:
+            return img.copy() if img is original else img
+        scaled = img.resize(size, Image.Resampling.BILINEAR, reducing_gap=2.0)
+        if img is not original:
+            img.close()
+        return scaled
+    finally:
+        if _owned(source):
+            original.close()
+
+
+def _flatten(img: Image.Image) -> Image.Image:
+    """Composite transparency onto the background colour"""
+    rgba = img if img.mode == 'RGBA' else img.convert('RGBA')
+    flat = Image.new('RGB', rgba.size, BACKGROUND)
+    flat.paste(rgba, mask=rgba.getchannel('A'))
+    if rgba is not img:
+        rgba.close()
+    return flat
+
+
+def compose(sources: Sequence, output_path: str, labels: Optional[List[str]] = None,
+            columns: Optional[int] = None, target_width: Optional[int] = None,
+            target_height: Optional[int] = TARGET_HEIGHT, label_height: int = LABEL_HEIGHT,
+            progress_callback: Optional[callable] = None) -> Tuple[int, int]:
+    """
+    Lay captures out side by side or in a grid, scaled before they are composed
+    Args:
+        sources: Capture paths, archive references, images or capture frames
+        output_path: Where to save the composed image
+        labels: Caption under each capture
+        columns: Captures per row (all in one row by default)
+        target_width: Maximum width of each cell
+        target_height: Maximum height of each cell
+        label_height: Space reserved under each row for captions
+        progress_callback: Optional callback for progress updates
+    Returns: Size of the composed image
+    """
+    columns = columns or len(sources)
+    label_height = label_height if labels else 0
+
+    # Headers only: plan every cell before any pixels are decoded
+    sizes = [fit_size(source_size(source), target_width, target_height) for source in sources]
+    rows = math.ceil(len(sources) / columns)
+    column_widths = [max(sizes[i][0] for i in range(c, len(sizes), columns)) for c in range(columns)]
+    row_heights = [max(size[1] for size in sizes[r * columns:(r + 1) * columns]) for r in range(rows)]
+    column_x = [sum(column_widths[:c]) for c in range(columns)]
+    row_y = [sum(row_heights[:r]) + r * label_height for r in range(rows)]
+
+    canvas = Image.new('RGB', (sum(column_widths), row_y[-1] + row_heights[-1] + label_height), BACKGROUND)
+    draw = ImageDraw.Draw(canvas)
+    font = label_font()
+
+    # One input decoded at a time, so peak memory is the canvas plus a single capture
+    for index, (source, size) in enumerate(zip(sources, sizes)):
+        if progress_callback:
+            progress_callback(f"Composing capture {index + 1}/{len(sources)}")
+        row, column = divmod(index, columns)
+        x, y = column_x[column], row_y[row]
+        tile = load_scaled(source, size)
+        canvas.paste(tile, (x + (column_widths[column] - size[0]) // 2, y))
+        tile.close()
+
+        if labels and index < len(labels):
+            text_bbox = draw.textbbox((0, 0), labels[index], font=font)
+            text_x = x + (column_widths[column] - (text_bbox[2] - text_bbox[0])) // 2
+            draw.text((text_x, y + row_heights[row] + 10), labels[index], fill='black', font=font)
+
+    canvas.save(output_path)
+    size = canvas.size
+    canvas.close()
+    return size
@@ -0,0 +1,121 @@
+from typing import Dict, List, Tuple
+import numpy as np
+from PIL import Image
+
+
+NORMALIZED_WIDTH = 128
+MAX_NORMALIZED_HEIGHT = 1024
+WINDOW_RADIUS = 3
+EDGE_WEIGHT = 0.5
+OUTLIER_Z = 2.5
+MIN_OUTLIER_GAP = 0.05
+
+# SSIM stabilising constants for maps scaled to [0, 1]
+_C1 = 0.01 ** 2
+_C2 = 0.03 ** 2
+
+
+def _box_mean(maps: np.ndarray, radius: int) -> np.ndarray:
+    """Mean over every full (2r+1)^2 window of each map in a stack, via running sums along both axes"""
+    size = 2 * radius + 1
+    sums = np.zeros((maps.shape[0], maps.shape[1] + 1, maps.shape[2] + 1), dtype=np.float64)
+    np.cumsum(maps, axis=1, out=sums[:, 1:, 1:])
+    np.cumsum(sums[:, 1:, 1:], axis=2, out=sums[:, 1:, 1:])
+    window = sums[:, size:, size:] - sums[:, :-size, size:] - sums[:, size:, :-size] + sums[:, :-size, :-size]
+    return (window / (size * size)).astype(np.float32)
+
+
+def reduce_for_layout(img: Image.Image, width: int = 2 * NORMALIZED_WIDTH) -> Image.Image:
+    """Small copy of a capture with its aspect ratio kept, so the full-size pixels can be closed before scoring"""
+    if img.mode not in ('L', 'RGB', 'RGBA'):
+        img = img.convert('RGBA')
+    height = max(1, round(img.height * width / img.width))
+    return img.resize((width, height), Image.Resampling.BILINEAR, reducing_gap=2.0)
+
+
+def layout_maps(img: Image.Image, height: int, width: int = NORMALIZED_WIDTH) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Luminance and edge maps of a capture normalised to width x height
+    Returns: (luminance, edges) as float32 arrays in [0, 1]
+    """
+    if img.mode not in ('L', 'RGB', 'RGBA'):
+        img = img.convert('RGBA')
+    small = img.resize((width, height), Image.Resampling.BILINEAR, reducing_gap=2.0)
+    luminance = np.asarray(small.convert('L'), dtype=np.float32) / 255.0
+
+    edges = np.zeros_like(luminance)
+    edges[:, :-1] += np.abs(np.diff(luminance, axis=1))
+    edges[:-1, :] += np.abs(np.diff(luminance, axis=0))
+    return luminance, np.minimum(edges, 1.0)
+
+
+def _pairwise_ssim(maps: np.ndarray, radius: int) -> np.ndarray:
+    """Mean SSIM between every pair of maps in a stack, as a symmetric matrix"""
+    count = len(maps)
+    means = _box_mean(maps, radius)
+    variances = _box_mean(maps * maps, radius) - means * means
+    matrix = np.ones((count, count), dtype=np.float32)
+    for i in range(count):
+        # One batched window pass per row covers all of map i's partners
+        partners = np.arange(i + 1, count)
+        if not len(partners):
+            continue
+        covariances = _box_mean(maps[i] * maps[partners], radius) - means[i] * means[partners]
+        numerator = (2 * means[i] * means[partners] + _C1) * (2 * covariances + _C2)
+        denominator = (means[i] ** 2 + means[partners] ** 2 + _C1) * (variances[i] + variances[partners] + _C2)
+        scores = (numerator / denominator).mean(axis=(1, 2))
+        matrix[i, partners] = scores
+        matrix[partners, i] = scores
+    return matrix
+
+
+def score_layouts(images: Dict[str, Image.Image], width: int = NORMALIZED_WIDTH,
+                  edge_weight: float = EDGE_WEIGHT, outlier_z: float = OUTLIER_Z) -> Dict:
+    """
+    Score how structurally consistent captures of one URL are across devices
+    Args:
+        images: Device label -> capture
+        width: Common width every capture is scaled to
+        edge_weight: Share of the score taken from edge maps rather than luminance
+        outlier_z: Robust z-score below which a device counts as diverging
+    Returns: Pairwise similarity matrix, per-device scores and the outlier devices
+    """
+    labels = list(images)
+    result = {'labels': labels, 'matrix': [], 'devices': {}, 'outliers': []}
+    if len(labels) < 2:
+        return result
+
+    # Scale to a common width, then to the median scaled height so every map lines up
+    heights = [img.height * width / img.width for img in images.values()]
+    height = int(min(max(np.median(heights), 8), MAX_NORMALIZED_HEIGHT))
+    luminance, edges = zip(*(layout_maps(images[label], height, width) for label in labels))
+
+    matrix = ((1.0 - edge_weight) * _pairwise_ssim(np.stack(luminance), WINDOW_RADIUS) +
+              edge_weight * _pairwise_ssim(np.stack(edges), WINDOW_RADIUS))
+    off_diagonal = ~np.eye(len(labels), dtype=bool)
+    scores = np.array([np.median(matrix[i][off_diagonal[i]]) for i in range(len(labels))])
+
+    # Median/MAD keep one broken device from dragging the reference point towards itself
+    center = float(np.median(scores))
+    spread = 1.4826 * float(np.median(np.abs(scores - center))) + 1e-6
+    for label, score, nearest in zip(labels, scores, _nearest(matrix, labels)):
+        z = (score - center) / spread
+        outlier = bool(z < -outlier_z and center - score > MIN_OUTLIER_GAP)
+        result['devices'][label] = {
+            'score': round(float(score), 4),
+            'z': round(float(z), 2),
+            'most_similar': nearest,
+            'outlier': outlier
+        }
+        if outlier:
+            result['outliers'].append(label)
+
+    result['matrix'] = [[round(float(value), 4) for value in row] for row in matrix]
+    result['outliers'].sort(key=lambda label: result['devices'][label]['score'])
+    return result
+
+
+def _nearest(matrix: np.ndarray, labels: List[str]) -> List[str]:
+    """Most similar other device for each device"""
+    masked = matrix - 2.0 * np.eye(len(labels))
+    return [labels[int(i)] for i in masked.argmax(axis=1)]
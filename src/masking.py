@@ -0,0 +1,126 @@
+import io
+import json
+from fnmatch import fnmatch
+from typing import Dict, List, Optional, Sequence
+from urllib.parse import urlparse
+from PIL import Image, ImageDraw
+
+
+DEFAULT_FILL = (128, 128, 128)
+
+# Page-coordinate boxes of every rendered element matching each selector, plus the CSS viewport width.
+# innerWidth includes the vertical scrollbar, as the screenshot does; clientWidth would not.
+_RESOLVE_SCRIPT = """
+var selectors = arguments[0];
+var boxes = [];
+for (var i = 0; i < selectors.length; i++) {
+    var elements;
+    try { elements = document.querySelectorAll(selectors[i]); } catch (e) { continue; }
+    for (var j = 0; j < elements.length; j++) {
+        var rect = elements[j].getBoundingClientRect();
+        if (rect.width > 0 && rect.height > 0) {
+            boxes.push({selector: selectors[i], x: rect.left + window.scrollX, y: rect.top + window.scrollY,
+                        width: rect.width, height: rect.height});
+        }
+    }
+}
+return {boxes: boxes, css_width: window.innerWidth || document.documentElement.clientWidth,
+        pixel_ratio: window.devicePixelRatio || 1};
+"""
+
+
+class MaskConfig:
+    """Per-URL dynamic-region masks (config/masks.json)
+
+    Each entry lists CSS selectors, resolved to boxes in the page at capture
+    time, and static rectangles in CSS pixels. URL patterns are shell-style
+    globs matched against the full URL or the bare domain; every matching
+    entry applies, on top of the "default" entry.
+    """
+
+    def __init__(self, default: Optional[Dict] = None, urls: Optional[Dict[str, Dict]] = None,
+                 fill: Sequence[int] = DEFAULT_FILL):
+        self.default = default or {}
+        self.urls = urls or {}
+        self.fill = tuple(fill)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'MaskConfig':
+        return cls(data.get('default'), data.get('urls'), data.get('fill', DEFAULT_FILL))
+
+    @classmethod
+    def load(cls, config_path: str) -> 'MaskConfig':
+        """Load mask definitions from a JSON file; no file means nothing is masked"""
+        try:
+            with open(config_path, 'r') as f:
+                return cls.from_dict(json.load(f))
+        except FileNotFoundError:
+            return cls()
+
+    def for_url(self, url: str) -> Dict[str, List]:
+        """Selectors and static rectangles that apply to a URL"""
+        domain = urlparse(url).netloc
+        entries = [self.default] + [entry for pattern, entry in self.urls.items()
+                                    if fnmatch(url, pattern) or fnmatch(domain, pattern)]
+        selectors = []
+        rects = []
+        for entry in entries:
+            selectors.extend(s for s in entry.get('selectors', []) if s not in selectors)
+            rects.extend(entry.get('rects', []))
+        return {'selectors': selectors, 'rects': rects}
+
+
+def resolve_masks(driver, masks: Dict[str, List]) -> Optional[Dict]:
+    """
+    Resolve a URL's mask definitions against the loaded page
+    Args:
+        driver: WebDriver with the page loaded and sized as it will be captured
+        masks: MaskConfig.for_url() result
+    Returns: CSS-pixel boxes, viewport width and pixel ratio for scale_boxes, or None when nothing is masked
+    """
+    if not masks['selectors'] and not masks['rects']:
+        return None
+
+    # Run even for static rectangles only: they need the viewport width to be scaled too
+    resolved = driver.execute_script(_RESOLVE_SCRIPT, masks['selectors'])
+    resolved['boxes'].extend(dict(rect, selector=None) for rect in masks['rects'])
+    return resolved
+
+
+def scale_boxes(resolved: Dict, image_width: int) -> List[Dict]:
+    """Mask boxes in image pixels; the CSS-to-image scale comes from the capture's width over the viewport's"""
+    if resolved.get('css_width'):
+        scale = image_width / resolved['css_width']
+    else:
+        scale = resolved.get('pixel_ratio') or 1.0
+    boxes = []
+    for box in resolved['boxes']:
+        left = max(0, int(box['x'] * scale))
+        top = max(0, int(box['y'] * scale))
+        right = int(round((box['x'] + box['width']) * scale))
+        bottom = int(round((box['y'] + box['height']) * scale))
+        if right > left and bottom > top:
+            boxes.append({'x': left, 'y': top, 'width': right - left, 'height': bottom - top,
+                          'selector': box.get('selector')})
+    return boxes
+
+
+def mask_image(img: Image.Image, boxes: List[Dict], fill: Sequence[int] = DEFAULT_FILL) -> Image.Image:
+    """Blank the boxes in place with a solid fill"""
+    if img.mode == 'P':
+        img = img.convert('RGBA')
+    color = tuple(fill) + (255,) if img.mode == 'RGBA' else tuple(fill)
+    if img.mode == 'L':
+        color = fill[0]
+    draw = ImageDraw.Draw(img)
+    for box in boxes:
+        draw.rectangle((box['x'], box['y'], box['x'] + box['width'] - 1, box['y'] + box['height'] - 1),
+                       fill=color)
+    return img
+
+
+def encode_png(img: Image.Image) -> bytes:
+    """Re-encode a masked capture at the browser's usual compression level"""
+    buffer = io.BytesIO()
+    img.save(buffer, format='PNG', compress_level=6)
+    return buffer.getvalue()
@@ -0,0 +1,189 @@
+import io
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from image_composer import fit_size, load_scaled, source_size
+
+
+COLUMNS = 2
+ROWS = 2
+MAX_PAGES = 200
+IMAGE_DPI = 110
+JPEG_QUALITY = 70
+PREFETCH = 16
+
+MARGIN = 36
+CAPTION_HEIGHT = 40
+
+
+def prepare_jpeg(ref: str, box: Tuple[int, int], quality: int = JPEG_QUALITY) -> Tuple[bytes, int, int]:
+    """Downsample a capture to fit a pixel box and encode it as JPEG; returns (data, width, height)"""
+    size = fit_size(source_size(ref), *box)
+    img = load_scaled(ref, size)
+    buffer = io.BytesIO()
+    img.save(buffer, format='JPEG', quality=quality, optimize=False)
+    img.close()
+    return buffer.getvalue(), size[0], size[1]
+
+
+def prefetch(executor: ThreadPoolExecutor, fn, items: Iterable, window: int) -> Iterator:
+    """executor.map in order, but with at most window items in flight, so results never pile up"""
+    pending = deque()
+    try:
+        for item in items:
+            pending.append((item, executor.submit(fn, item)))
+            if len(pending) >= window:
+                yield pending.popleft()
+        while pending:
+            yield pending.popleft()
+    finally:
+        # The consumer stopped early (error or cancellation): drop work that has not started
+        for _, future in pending:
+            future.cancel()
+
+
+def _fit_text(c, text: str, font: str, size: float, width: float) -> str:
+    """Trim text with an ellipsis until it fits the given width"""
+    if c.stringWidth(text, font, size) <= width:
+        return text
+    while text and c.stringWidth(text + '…', font, size) > width:
+        text = text[:-1]
+    return text + '…'
+
+
+class PDFReportWriter:
+    """Image-rich PDF reports written a bounded number of pages at a time
+
+    Captures are downsampled to JPEG on a worker pool a few results ahead of
+    the page being drawn, and embedded as-is (no re-encoding by reportlab).
+    reportlab keeps a document in memory until it is saved, so each file is
+    closed after max_pages pages and the report continues in a _partN file;
+    memory is bounded by one part, not by the run.
+    """
+
+    def __init__(self, columns: int = COLUMNS, rows: int = ROWS, max_pages: Optional[int] = MAX_PAGES,
+                 quality: int = JPEG_QUALITY, workers: int = 4):
+        """
+        Args:
+            columns: Captures per row
+            rows: Rows of captures per page
+            max_pages: Pages per file before the report continues in a new part (None for no limit)
+            quality: JPEG quality of embedded captures
+            workers: Image preparation threads
+        """
+        self.columns = columns
+        self.rows = rows
+        self.max_pages = max_pages
+        self.quality = quality
+        self.workers = workers
+
+    def write(self, output_path: str, title_lines: List[str], results: Iterable[Tuple[str, Dict]],
+              progress_callback: Optional[callable] = None) -> List[str]:
+        """
+        Write a report
+        Args:
+            output_path: PDF path; further parts get a _part<N> suffix
+            title_lines: Lines under the title on the first page (URL, stats, ...)
+            results: (caption, result) pairs in display order; may be a generator
+            progress_callback: Optional callback for progress updates
+        Returns: Paths of the written files
+        """
+        from reportlab.pdfgen import canvas
+        from reportlab.lib.pagesizes import A4
+        from reportlab.lib.utils import ImageReader
+
+        page_width, page_height = A4
+        cell_width = (page_width - 2 * MARGIN) / self.columns
+        cell_height = (page_height - 2 * MARGIN) / self.rows
+        image_width = cell_width - 12
+        image_height = cell_height - CAPTION_HEIGHT - 12
+        box = (round(image_width / 72 * IMAGE_DPI), round(image_height / 72 * IMAGE_DPI))
+        per_page = self.columns * self.rows
+
+        stem, ext = os.path.splitext(output_path)
+        paths = [output_path]
+        c = canvas.Canvas(output_path, pagesize=A4)
+        self._title_page(c, page_width, page_height, title_lines)
+        pages = 1
+        slot = 0
+
+        def prepare(item):
+            _, result = item
+            if not result.get('success') or not result.get('screenshot_path'):
+                return None
+            try:
+                return prepare_jpeg(result['screenshot_path'], box, self.quality)
+            except Exception as e:
+                print(f"Could not prepare {result['screenshot_path']} for PDF: {e}")
+                return None
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for (caption, result), future in prefetch(executor, prepare, results, PREFETCH):
+                if slot == 0:
+                    c.showPage()
+                    pages += 1
+                    if self.max_pages and pages > self.max_pages:
+                        # Close this part so its pages leave memory, and continue in the next file
+                        c.save()
+                        paths.append(f'{stem}_part{len(paths) + 1}{ext}')
+                        c = canvas.Canvas(paths[-1], pagesize=A4)
+                        pages = 1
+                    if progress_callback:
+                        progress_callback(f"Writing PDF part {len(paths)}, page {pages}")
+
+                row, column = divmod(slot, self.columns)
+                x = MARGIN + column * cell_width + 6
+                top = page_height - MARGIN - row * cell_height - 6
+                prepared = future.result()
+                if prepared:
+                    data, width, height = prepared
+                    scale = min(image_width / width, image_height / height)
+                    draw_width, draw_height = width * scale, height * scale
+                    c.drawImage(ImageReader(io.BytesIO(data)), x + (image_width - draw_width) / 2,
+                                top - draw_height, draw_width, draw_height)
+                else:
+                    c.setStrokeColorRGB(0.8, 0.8, 0.8)
+                    c.rect(x, top - image_height, image_width, image_height)
+
+                self._caption(c, x, top - image_height - 14, image_width, caption, result)
+                slot = (slot + 1) % per_page
+
+        c.save()
+        return paths
+
+    def _title_page(self, c, page_width: float, page_height: float, title_lines: List[str]):
+        c.setFont("Helvetica-Bold", 24)
+        c.drawCentredString(page_width / 2, page_height - 100, "ScreenQA Testing Report")
+        c.setFont("Helvetica", 12)
+        y = page_height - 150
+        for line in title_lines + [f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"]:
+            c.drawCentredString(page_width / 2, y,
+                                _fit_text(c, line, "Helvetica", 12, page_width - 2 * MARGIN))
+            y -= 20
+
+    def _caption(self, c, x: float, y: float, width: float, caption: str, result: Dict):
+        """Caption, status and diff summary under a capture"""
+        c.setFillColorRGB(0, 0, 0)
+        c.setFont("Helvetica-Bold", 9)
+        c.drawString(x, y, _fit_text(c, caption, "Helvetica-Bold", 9, width))
+
+        c.setFont("Helvetica", 8)
+        if result.get('success'):
+            device_info = result.get('device_info') or {}
+            details = f"{device_info.get('platform', 'Unknown')} • {device_info.get('width')}x{device_info.get('height')}"
+            diff = result.get('visual_diff')
+            if diff and 'passed' in diff:
+                details += " • baseline PASS" if diff['passed'] else " • baseline FAIL"
+            if diff and diff.get('mismatch_pixels'):
+                details += f" • {diff['mismatch_percent']:.2f}% changed"
+            if (result.get('layout_similarity') or {}).get('outlier'):
+                details += " • layout diverges"
+            if diff and (diff.get('passed') is False or ('passed' not in diff and diff.get('mismatch_pixels'))):
+                c.setFillColorRGB(0.86, 0.21, 0.27)
+        else:
+            details = f"FAILED: {result.get('error') or 'Unknown error'}"
+            c.setFillColorRGB(0.86, 0.21, 0.27)
+        c.drawString(x, y - 12, _fit_text(c, details, "Helvetica", 8, width))
+        c.setFillColorRGB(0, 0, 0)
@@ -0,0 +1,143 @@
+from itertools import combinations
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from PIL import Image
+
+
+HASH_SIZE = 8
+PHASH_FACTOR = 4
+HASH_BITS = HASH_SIZE * HASH_SIZE
+
+
+def _grayscale(img: Image.Image, size: Tuple[int, int]) -> np.ndarray:
+    """Downsample to a small greyscale array; reducing_gap box-reduces large captures first"""
+    if img.mode not in ('L', 'RGB', 'RGBA'):
+        img = img.convert('RGBA')
+    small = img.resize(size, Image.Resampling.BILINEAR, reducing_gap=2.0)
+    return np.asarray(small.convert('L'), dtype=np.float32)
+
+
+def _bits_to_int(bits: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), 'big')
+
+
+def dhash(img: Image.Image, hash_size: int = HASH_SIZE) -> int:
+    """Difference hash: sign of horizontal gradients on a (hash_size + 1) x hash_size thumbnail"""
+    pixels = _grayscale(img, (hash_size + 1, hash_size))
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+
+_DCT_CACHE = {}
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    """Orthonormal DCT-II basis, so a 2-D DCT is two matrix products"""
+    if n not in _DCT_CACHE:
+        k = np.arange(n)[:, None]
+        x = np.arange(n)[None, :]
+        basis = np.cos(np.pi * (2 * x + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+        basis[0] /= np.sqrt(2.0)
+        _DCT_CACHE[n] = basis.astype(np.float32)
+    return _DCT_CACHE[n]
+
+
+def phash(img: Image.Image, hash_size: int = HASH_SIZE, factor: int = PHASH_FACTOR) -> int:
+    """Perceptual hash: low-frequency DCT coefficients thresholded at their median"""
+    n = hash_size * factor
+    pixels = _grayscale(img, (n, n))
+    basis = _dct_matrix(n)
+    low = (basis @ pixels @ basis.T)[:hash_size, :hash_size]
+    return _bits_to_int(low > np.median(low))
+
+
+def image_hashes(img: Image.Image) -> Dict[str, str]:
+    """dHash and pHash of an image as fixed-width hex strings"""
+    width = HASH_BITS // 4
+    return {
+        'dhash': f'{dhash(img):0{width}x}',
+        'phash': f'{phash(img):0{width}x}'
+    }
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+def to_signed(value: int) -> int:
+    """Store a 64-bit hash in an SQLite INTEGER column"""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def to_unsigned(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+
+def _flip_masks(bits: int, max_flips: int) -> List[int]:
+    """All masks of up to max_flips set bits within a bits-wide word"""
+    masks = [0]
+    for flips in range(1, max_flips + 1):
+        for positions in combinations(range(bits), flips):
+            masks.append(sum(1 << p for p in positions))
+    return masks
+
+
+class MultiIndexHash:
+    """Multi-index hashing over 64-bit hashes for Hamming-distance range queries
+
+    Each hash is split into CHUNKS 16-bit substrings, each with its own table.
+    By the pigeonhole principle a hash within distance r of the query agrees
+    with it to within r // CHUNKS bits on at least one chunk, so a query only
+    probes a few table buckets and verifies the candidates found there.
+    """
+
+    CHUNKS = 4
+    CHUNK_BITS = HASH_BITS // CHUNKS
+
+    def __init__(self):
+        self.tables = [{} for _ in range(self.CHUNKS)]
+        self.hashes = []
+        self.items = []
+        self._masks = {}
+
+    def _chunks(self, value: int) -> List[int]:
+        mask = (1 << self.CHUNK_BITS) - 1
+        return [(value >> (self.CHUNK_BITS * i)) & mask for i in range(self.CHUNKS)]
+
+    def add(self, value: int, item):
+        """Insert a hash with its payload"""
+        position = len(self.hashes)
+        self.hashes.append(value)
+        self.items.append(item)
+        for table, chunk in zip(self.tables, self._chunks(value)):
+            table.setdefault(chunk, []).append(position)
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def search(self, value: int, max_distance: int) -> List[Tuple[int, object]]:
+        """Items within max_distance, closest first"""
+        flips = max_distance // self.CHUNKS
+        if flips not in self._masks:
+            self._masks[flips] = _flip_masks(self.CHUNK_BITS, flips)
+
+        seen = set()
+        matches = []
+        for table, chunk in zip(self.tables, self._chunks(value)):
+            for mask in self._masks[flips]:
+                for position in table.get(chunk ^ mask, ()):
+                    if position in seen:
+                        continue
+                    seen.add(position)
+                    distance = hamming(value, self.hashes[position])
+                    if distance <= max_distance:
+                        matches.append((distance, self.items[position]))
+        matches.sort(key=lambda match: match[0])
+        return matches
+
+    def nearest(self, value: int, max_distance: int = 15) -> Optional[Tuple[int, object]]:
+        """Closest item within max_distance, widening the search one chunk-flip level at a time"""
+        for radius in range(self.CHUNKS - 1, max_distance + self.CHUNKS, self.CHUNKS):
+            matches = self.search(value, min(radius, max_distance))
+            if matches:
+                return matches[0]
+        return None
@@ -0,0 +1,168 @@
+import zlib
+import struct
+from typing import BinaryIO, Iterator, Tuple
+import numpy as np
+from PIL import Image
+
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+READ_SIZE = 256 * 1024
+
+# Colour type -> Pillow mode for the 8-bit, non-interlaced layouts that can be read a band at a time.
+# In these modes Pillow's raw layout is the PNG scanline layout, so a decoded row can be fed back as a row.
+_BAND_MODES = {0: 'L', 2: 'RGB', 3: 'P', 4: 'LA', 6: 'RGBA'}
+_CHANNELS = {'L': 1, 'RGB': 3, 'P': 1, 'LA': 2, 'RGBA': 4}
+
+
+class UnsupportedPng(ValueError):
+    """The file is not a PNG that can be streamed (another format, interlaced, 16-bit, ...)"""
+
+
+class PngBandReader:
+    """Decodes a PNG a band of rows at a time, so memory follows the band size rather than the page height
+
+    The zlib stream is inflated here, exactly one band of filtered scanlines
+    at a time, and each band is unfiltered by Pillow's own PNG decoder. The
+    band is prefixed with the previous band's last row (stored unfiltered), so
+    filters that refer to the row above decode correctly.
+    """
+
+    def __init__(self, f: BinaryIO):
+        self.f = f
+        if f.read(8) != PNG_SIGNATURE:
+            raise UnsupportedPng("Not a PNG file")
+
+        palette = transparency = None
+        self.mode = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise UnsupportedPng("PNG has no image data")
+            length, chunk_type = struct.unpack('>I4s', header)
+            if chunk_type == b'IDAT':
+                self._idat_left = length
+                break
+            data = f.read(length)
+            f.read(4)  # CRC
+            if chunk_type == b'IHDR':
+                self.width, self.height, depth, color_type, _, _, interlace = struct.unpack('>IIBBBBB', data)
+                if depth != 8 or interlace or color_type not in _BAND_MODES:
+                    raise UnsupportedPng(f"PNG layout not streamable (depth {depth}, colour type {color_type}, "
+                                         f"interlace {interlace})")
+                self.mode = _BAND_MODES[color_type]
+            elif chunk_type == b'PLTE':
+                palette = data
+            elif chunk_type == b'tRNS':
+                transparency = data
+
+        if self.mode is None:
+            raise UnsupportedPng("PNG has no header")
+        if transparency is not None and self.mode != 'P':
+            raise UnsupportedPng("Colour-keyed transparency is not streamed")
+
+        self._palette = None
+        if self.mode == 'P':
+            # Palette index -> RGBA lookup, transparency included
+            self._palette = np.zeros((256, 4), dtype=np.uint8)
+            self._palette[:, 3] = 255
+            colors = np.frombuffer(palette or b'', dtype=np.uint8).reshape(-1, 3)[:256]
+            self._palette[:len(colors), :3] = colors
+            if transparency:
+                alpha = np.frombuffer(transparency, dtype=np.uint8)[:256]
+                self._palette[:len(alpha), 3] = alpha
+
+        self._stride = self.width * _CHANNELS[self.mode] + 1
+        self._inflate = zlib.decompressobj()
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        return self.width, self.height
+
+    def _read_idat(self) -> bytes:
+        """Next piece of compressed image data, crossing IDAT chunk boundaries"""
+        while self._idat_left == 0:
+            self.f.read(4)  # CRC of the finished chunk
+            header = self.f.read(8)
+            if len(header) < 8:
+                return b''
+            length, chunk_type = struct.unpack('>I4s', header)
+            if chunk_type != b'IDAT':
+                self._idat_left = -1
+                return b''
+            self._idat_left = length
+        if self._idat_left < 0:
+            return b''
+        data = self.f.read(min(READ_SIZE, self._idat_left))
+        self._idat_left -= len(data)
+        return data
+
+    def bands(self, band_height: int) -> Iterator[np.ndarray]:
+        """Yield the image as RGBA arrays of band_height rows (the last band may be shorter)"""
+        previous_row = None
+        for top in range(0, self.height, band_height):
+            rows = min(band_height, self.height - top)
+            scanlines = bytearray()
+            if previous_row is not None:
+                scanlines += b'\x00'  # Filter type None: the row is stored as-is
+                scanlines += previous_row
+            target = len(scanlines) + rows * self._stride
+            while len(scanlines) < target:
+                data = self._inflate.unconsumed_tail or self._read_idat()
+                if not data:
+                    raise ValueError(f"PNG data ends at row {top + (len(scanlines) // self._stride)}")
+                scanlines += self._inflate.decompress(data, target - len(scanlines))
+
+            decoded_rows = rows + (previous_row is not None)
+            # Stored (level 0) deflate is a copy; it only wraps the scanlines for Pillow's decoder
+            band = Image.frombytes(self.mode, (self.width, decoded_rows), zlib.compress(scanlines, 0),
+                                   'zip', self.mode)
+            previous_row = band.crop((0, decoded_rows - 1, self.width, decoded_rows)).tobytes()
+            if self._palette is not None:
+                pixels = self._palette[np.asarray(band)]
+            else:
+                pixels = np.asarray(band if self.mode == 'RGBA' else band.convert('RGBA'))
+            yield pixels[decoded_rows - rows:]
+
+
+class PngBandWriter:
+    """Writes an RGB PNG a band of rows at a time"""
+
+    def __init__(self, path: str, width: int, height: int, compress_level: int = 3):
+        self.width = width
+        self.height = height
+        self._file = open(path, 'wb')
+        self._deflate = zlib.compressobj(compress_level)
+        self._file.write(PNG_SIGNATURE)
+        self._chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+
+    def _chunk(self, chunk_type: bytes, data: bytes):
+        self._file.write(struct.pack('>I', len(data)) + chunk_type + data)
+        self._file.write(struct.pack('>I', zlib.crc32(chunk_type + data)))
+
+    def write(self, rows: np.ndarray):
+        """Append RGB rows of shape (n, width, 3)"""
+        flat = rows.reshape(rows.shape[0], self.width * 3)
+        # Sub filter: each byte minus the same channel of the pixel to its left (uint8 wraps as PNG expects)
+        scanlines = np.empty((rows.shape[0], flat.shape[1] + 1), dtype=np.uint8)
+        scanlines[:, 0] = 1
+        scanlines[:, 1:4] = flat[:, :3]
+        np.subtract(flat[:, 3:], flat[:, :-3], out=scanlines[:, 4:])
+        data = self._deflate.compress(scanlines.tobytes())
+        if data:
+            self._chunk(b'IDAT', data)
+
+    def close(self):
+        if self._file is None:
+            return
+        try:
+            self._chunk(b'IDAT', self._deflate.flush())
+            self._chunk(b'IEND', b'')
+        finally:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self) -> 'PngBandWriter':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -2,20 +2,30 @@ import time
 import json
 import os
 from typing import Dict, List, Tuple, Optional
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
 from PIL import Image, ImageDraw, ImageFont
-import requests
 from urllib.parse import urlparse, urljoin
 from datetime import datetime
 import statistics
 
 
+def create_headless_driver(*arguments: str):
+    """Headless Chrome for analysis runs; Selenium is only imported once a check actually runs"""
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.chrome.service import Service
+    from webdriver_manager.chrome import ChromeDriverManager
+    
+    chrome_options = Options()
+    chrome_options.add_argument('--headless')
+    chrome_options.add_argument('--no-sandbox')
+    chrome_options.add_argument('--disable-dev-shm-usage')
+    for argument in arguments:
+        chrome_options.add_argument(argument)
+    
+    service = Service(ChromeDriverManager().install())
+    return webdriver.Chrome(service=service, options=chrome_options)
+
+
 class PerformanceAnalyzer:
     """Analyzes website performance across different devices"""
     
@@ -24,15 +34,10 @@ class PerformanceAnalyzer:
     
     def measure_load_time(self, url: str, device_config: Dict) -> Dict:
         """Measure page load time for specific device"""
-        chrome_options = Options()
-        chrome_options.add_argument('--headless')
-        chrome_options.add_argument('--no-sandbox')
-        chrome_options.add_argument('--disable-dev-shm-usage')
-        chrome_options.add_argument(f'--window-size={device_config["width"]},{device_config["height"]}')
-        chrome_options.add_argument(f'--user-agent={device_config["user_agent"]}')
+        from selenium.webdriver.support.ui import WebDriverWait
         
-        service = Service(ChromeDriverManager().install())
-        driver = webdriver.Chrome(service=service, options=chrome_options)
+        driver = create_headless_driver(f'--window-size={device_config["width"]},{device_config["height"]}',
+                                        f'--user-agent={device_config["user_agent"]}')
         
         try:
             start_time = time.time()
@@ -174,13 +179,7 @@ class ResponsiveAnalyzer:
         breakpoints = custom_breakpoints or self.breakpoints
         results = {}
         
-        chrome_options = Options()
-        chrome_options.add_argument('--headless')
-        chrome_options.add_argument('--no-sandbox')
-        chrome_options.add_argument('--disable-dev-shm-usage')
-        
-        service = Service(ChromeDriverManager().install())
-        driver = webdriver.Chrome(service=service, options=chrome_options)
+        driver = create_headless_driver()
         
         try:
             for bp_name, width in breakpoints.items():
@@ -217,6 +216,8 @@ class ResponsiveAnalyzer:
     
     def analyze_layout_at_breakpoint(self, driver, width: int) -> Dict:
         """Analyze layout characteristics at specific breakpoint"""
+        from selenium.webdriver.common.by import By
+        
         try:
             # Get viewport dimensions
             viewport = driver.execute_script("return {width: window.innerWidth, height: window.innerHeight};")
@@ -296,13 +297,9 @@ class AccessibilityChecker:
     
     def check_accessibility(self, url: str) -> Dict:
         """Perform basic accessibility checks"""
-        chrome_options = Options()
-        chrome_options.add_argument('--headless')
-        chrome_options.add_argument('--no-sandbox')
-        chrome_options.add_argument('--disable-dev-shm-usage')
+        from selenium.webdriver.common.by import By
         
-        service = Service(ChromeDriverManager().install())
-        driver = webdriver.Chrome(service=service, options=chrome_options)
+        driver = create_headless_driver()
         
         try:
             driver.get(url)
@@ -387,6 +384,8 @@ class AccessibilityChecker:
     
     def check_basic_contrast(self, driver) -> List[str]:
         """Basic color contrast checking"""
+        from selenium.webdriver.common.by import By
+        
         issues = []
         
         try:
@@ -431,13 +430,9 @@ class SEOAnalyzer:
     
     def analyze_seo(self, url: str) -> Dict:
         """Perform basic SEO analysis"""
-        chrome_options = Options()
-        chrome_options.add_argument('--headless')
-        chrome_options.add_argument('--no-sandbox')
-        chrome_options.add_argument('--disable-dev-shm-usage')
+        from selenium.webdriver.common.by import By
         
-        service = Service(ChromeDriverManager().install())
-        driver = webdriver.Chrome(service=service, options=chrome_options)
+        driver = create_headless_driver()
         
         try:
             driver.get(url)
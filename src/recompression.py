@@ -0,0 +1,319 @@
+import os
+import json
+import shutil
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, List, Optional
+from PIL import Image, PngImagePlugin
+from capture_metadata import METADATA_KEY, read_metadata, metadata_xmp
+from content_store import ContentStore
+
+
+# target name -> (output extension, lossless)
+RECOMPRESS_TARGETS = {
+    'png_optimize': ('.png', True),
+    'png_palette': ('.png', True),
+    'png_quantize': ('.png', False),
+    'webp_lossless': ('.webp', True),
+}
+# No AVIF target: Pillow has no lossless AVIF mode, so every file would fail verification after a full encode
+
+
+def _pixels_equal(a: Image.Image, b: Image.Image) -> bool:
+    """Compare decoded pixel data of two images in a common mode"""
+    mode = 'RGBA' if 'A' in a.getbands() or 'A' in b.getbands() or a.mode == 'P' else 'RGB'
+    return a.size == b.size and a.convert(mode).tobytes() == b.convert(mode).tobytes()
+
+
+def _encode(img: Image.Image, tmp_path: str, target: str, colors: int,
+            metadata: Optional[Dict] = None) -> Optional[str]:
+    """Encode an image for a target, carrying capture metadata over; returns a skip reason or None"""
+    pnginfo = None
+    xmp = b''
+    if metadata:
+        pnginfo = PngImagePlugin.PngInfo()
+        pnginfo.add_itxt(METADATA_KEY, json.dumps(metadata))
+        xmp = metadata_xmp(metadata)
+
+    if target == 'png_optimize':
+        img.save(tmp_path, format='PNG', optimize=True, pnginfo=pnginfo)
+
+    elif target == 'png_palette':
+        # Lossless only when the image already fits in a 256 colour palette
+        if img.mode in ('RGBA', 'LA') and img.getchannel('A').getextrema() != (255, 255):
+            return 'has_alpha'
+        rgb = img.convert('RGB')
+        if rgb.getcolors(maxcolors=256) is None:
+            return 'too_many_colors'
+        rgb.quantize(colors=256, method=Image.Quantize.MAXCOVERAGE, dither=Image.Dither.NONE) \
+            .save(tmp_path, format='PNG', optimize=True, pnginfo=pnginfo)
+
+    elif target == 'png_quantize':
+        method = Image.Quantize.FASTOCTREE
+        img.quantize(colors=colors, method=method).save(tmp_path, format='PNG', optimize=True, pnginfo=pnginfo)
+
+    elif target == 'webp_lossless':
+        img.save(tmp_path, format='WEBP', lossless=True, method=6, xmp=xmp)
+
+    return None
+
+
+def recompress_file(filepath: str, target: str = 'png_optimize', colors: int = 256,
+                    only_if_smaller: bool = True, verify: bool = True) -> Dict:
+    """
+    Recompress a single screenshot with an atomic write
+    Args:
+        filepath: PNG file to recompress
+        target: One of RECOMPRESS_TARGETS
+        colors: Palette size for "png_quantize"
+        only_if_smaller: Keep the original when the new encoding is not smaller
+        verify: Decode lossless outputs and check the pixels round-trip exactly
+    Returns: Result dictionary with bytes before/after/saved and the output path
+    """
+    if target not in RECOMPRESS_TARGETS:
+        raise ValueError(f"Unknown recompression target '{target}'")
+
+    extension, lossless = RECOMPRESS_TARGETS[target]
+    output_path = os.path.splitext(filepath)[0] + extension
+    tmp_path = output_path + '.tmp'
+    stats = os.stat(filepath)
+    result = {
+        'file': os.path.basename(filepath),
+        'target': target,
+        'output': os.path.basename(filepath),
+        'bytes_before': stats.st_size,
+        'bytes_after': stats.st_size,
+        'bytes_saved': 0,
+        'status': 'skipped',
+        'reason': ''
+    }
+
+    try:
+        metadata = read_metadata(filepath)
+        with Image.open(filepath) as img:
+            img.load()
+            skip_reason = _encode(img, tmp_path, target, colors, metadata)
+            if skip_reason:
+                result['reason'] = skip_reason
+                return result
+
+            if verify and lossless:
+                with Image.open(tmp_path) as encoded:
+                    if not _pixels_equal(img, encoded):
+                        result['reason'] = 'not_lossless'
+                        return result
+
+        new_size = os.path.getsize(tmp_path)
+        if only_if_smaller and new_size >= stats.st_size:
+            result['reason'] = 'not_smaller'
+            return result
+
+        os.replace(tmp_path, output_path)
+        # Keep capture times so retention ordering is unaffected
+        os.utime(output_path, (stats.st_atime, stats.st_mtime))
+        if output_path != filepath:
+            os.remove(filepath)
+
+        result.update({
+            'output': os.path.basename(output_path),
+            'bytes_after': new_size,
+            'bytes_saved': stats.st_size - new_size,
+            'status': 'done'
+        })
+        return result
+
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def link_aliases(output_path: str, alias_paths: List[str]) -> List[str]:
+    """Point other hardlinks of a recompressed file at the new output, keeping their names"""
+    extension = os.path.splitext(output_path)[1]
+    linked = []
+    for alias in alias_paths:
+        new_path = os.path.splitext(alias)[0] + extension
+        tmp_path = new_path + '.link'
+        try:
+            os.link(output_path, tmp_path)
+        except OSError:
+            shutil.copy2(output_path, tmp_path)
+        os.replace(tmp_path, new_path)
+        if new_path != alias:
+            os.remove(alias)
+        linked.append(new_path)
+    return linked
+
+
+def group_by_inode(filepaths: List[str]) -> Dict[str, List[str]]:
+    """Map one representative path to the other hardlinks of the same file"""
+    groups = {}
+    representatives = {}
+    for filepath in filepaths:
+        stats = os.stat(filepath)
+        key = (stats.st_dev, stats.st_ino) if stats.st_nlink > 1 else filepath
+        if key in representatives:
+            groups[representatives[key]].append(filepath)
+        else:
+            representatives[key] = filepath
+            groups[filepath] = []
+    return groups
+
+
+def _recompress_worker(args) -> Dict:
+    """Process pool entry point"""
+    filepath, target, colors, only_if_smaller = args
+    try:
+        return recompress_file(filepath, target, colors, only_if_smaller)
+    except Exception as e:
+        stats_size = os.path.getsize(filepath) if os.path.exists(filepath) else 0
+        return {
+            'file': os.path.basename(filepath),
+            'target': target,
+            'output': os.path.basename(filepath),
+            'bytes_before': stats_size,
+            'bytes_after': stats_size,
+            'bytes_saved': 0,
+            'status': 'error',
+            'reason': str(e)
+        }
+
+
+class RecompressionJournal:
+    """Append-only JSONL journal so interrupted batches can resume"""
+
+    def __init__(self, journal_path: str):
+        self.journal_path = journal_path
+        self._file = None
+
+    def completed(self) -> Dict[str, Dict]:
+        """Files already handled (done or skipped) keyed by filename"""
+        completed = {}
+        if not os.path.exists(self.journal_path):
+            return completed
+
+        with open(self.journal_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # Torn last line from an interrupted run
+                if entry.get('status') in ('done', 'skipped'):
+                    completed[entry['file']] = entry
+        return completed
+
+    def append(self, entry: Dict):
+        """Durably record one result"""
+        if self._file is None:
+            self._file = open(self.journal_path, 'a', encoding='utf-8')
+        self._file.write(json.dumps(entry) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def batch_recompress(screenshots_dir: str, target: str = 'png_optimize',
+                     workers: Optional[int] = None, colors: int = 256,
+                     only_if_smaller: bool = True, journal_path: Optional[str] = None,
+                     progress_callback: Optional[callable] = None) -> Dict:
+    """
+    Recompress all PNG screenshots in a directory on a process pool
+    Args:
+        screenshots_dir: Directory with screenshots
+        target: One of RECOMPRESS_TARGETS
+        workers: Number of worker processes (defaults to CPU count)
+        colors: Palette size for "png_quantize"
+        only_if_smaller: Keep originals that would not shrink
+        journal_path: Resume journal (defaults to .recompress_<target>.jsonl in the directory)
+        progress_callback: Optional callback for progress updates
+    Returns: Summary with per-file results, total bytes saved and the store objects collected afterwards
+    """
+    if target not in RECOMPRESS_TARGETS:
+        raise ValueError(f"Unknown recompression target '{target}'")
+
+    journal = RecompressionJournal(journal_path or os.path.join(screenshots_dir, f'.recompress_{target}.jsonl'))
+    completed = journal.completed()
+    pending = sorted(
+        os.path.join(screenshots_dir, name) for name in os.listdir(screenshots_dir)
+        if name.endswith('.png') and name not in completed
+    )
+    # Deduplicated captures share one file; recompress it once and relink the rest
+    aliases = group_by_inode(pending)
+    pending = sorted(aliases)
+
+    summary = {
+        'target': target,
+        'total': len(pending) + len(completed),
+        'resumed': len(completed),
+        'processed': 0,
+        'errors': 0,
+        'bytes_saved': 0,
+        'files': []
+    }
+
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = workers * 4  # Bounded submission keeps memory flat on huge directories
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            queue = iter(pending)
+            in_flight = set()
+
+            while True:
+                for filepath in queue:
+                    in_flight.add(executor.submit(_recompress_worker, (filepath, target, colors, only_if_smaller)))
+                    if len(in_flight) >= max_in_flight:
+                        break
+
+                if not in_flight:
+                    break
+
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result = future.result()
+                    alias_paths = aliases.get(os.path.join(screenshots_dir, result['file']), [])
+                    if result['status'] == 'done' and alias_paths:
+                        output_path = os.path.join(screenshots_dir, result['output'])
+                        # Aliases are hardlinks of one file: the space is saved once, however many names it has
+                        result['aliases'] = [os.path.basename(p) for p in link_aliases(output_path, alias_paths)]
+                    journal.append(result)
+                    for alias in alias_paths:
+                        journal.append(dict(result, file=os.path.basename(alias), bytes_saved=0))
+                    summary['files'].append(result)
+                    summary['processed'] += 1
+                    summary['bytes_saved'] += result['bytes_saved']
+                    if result['status'] == 'error':
+                        summary['errors'] += 1
+
+                    if progress_callback:
+                        progress_callback(
+                            f"[{summary['processed']}/{len(pending)}] {result['file']}: "
+                            f"{result['status']}, saved {result['bytes_saved'] / 1024:.1f} KB"
+                        )
+    finally:
+        journal.close()
+
+    # Replaced captures are still held by their content store objects until those are collected
+    if any(result['status'] == 'done' for result in summary['files']):
+        summary['store_gc'] = ContentStore(screenshots_dir).gc()
+
+    return summary
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Recompress ScreenQA screenshots")
+    parser.add_argument('screenshots_dir')
+    parser.add_argument('--target', default='png_optimize', choices=sorted(RECOMPRESS_TARGETS))
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--colors', type=int, default=256)
+    args = parser.parse_args()
+
+    summary = batch_recompress(args.screenshots_dir, args.target, args.workers, args.colors,
+                               progress_callback=print)
+    print(f"Processed {summary['processed']} files ({summary['resumed']} already done), "
+          f"{summary['errors']} errors, saved {summary['bytes_saved'] / (1024 * 1024):.1f} MB")
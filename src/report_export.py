@@ -0,0 +1,253 @@
+import io
+import os
+import json
+import shutil
+import base64
+import zipfile
+import tempfile
+import threading
+from html import escape
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+from image_composer import fit_size, load_scaled, source_size
+from pdf_report import PREFETCH, prefetch
+from report_writer import REPORT_CSS, render_change_regions, render_layout_note
+
+
+WEBP_QUALITY = 60
+HTML_MAX_SIZE = (480, 1920)     # Inline thumbnails: enough for a card, small enough to keep one file shareable
+BUNDLE_MAX_SIZE = (1280, 5120)  # Bundle previews: readable full-page captures at a fraction of the PNG size
+WEBP_METHOD = 2  # Within ~5% of the size of the default (4) at about half the encode time
+
+
+def encode_webp(ref: str, box: Tuple[int, int], quality: int = WEBP_QUALITY) -> Tuple[bytes, int, int]:
+    """Downsample a capture to fit a pixel box and encode it as WebP; returns (data, width, height)"""
+    size = fit_size(source_size(ref), *box)
+    img = load_scaled(ref, size)
+    buffer = io.BytesIO()
+    img.save(buffer, format='WEBP', quality=quality, method=WEBP_METHOD)
+    img.close()
+    return buffer.getvalue(), size[0], size[1]
+
+
+def render_export_card(title: str, result: Dict, img_src: Optional[str], size: Optional[Tuple[int, int]],
+                       note: str = '', href: Optional[str] = None) -> str:
+    """
+    HTML card for an exported capture; like render_device_card, but the image comes with the report
+    Args:
+        title: Card heading
+        result: Capture result
+        img_src: Embedded image (data URI or path inside the bundle), or None if it was left out
+        size: Dimensions of the embedded image, if known
+        note: Why the image was left out
+        href: Link for the image (the full-size capture, where there is one)
+    Returns: Card markup
+    """
+    title = escape(title)
+    if not result.get('success'):
+        return f"""
+                        <div class="device-card">
+                            <div class="device-header">
+                                <div class="device-name error">✗ {title}</div>
+                                <div class="device-info">Capture failed</div>
+                            </div>
+                            <div class="error-message">
+                                {escape(str(result.get('error') or 'Unknown error occurred'))}
+                            </div>
+                        </div>
+        """
+
+    device_info = result.get('device_info') or {}
+    resolution = f"{device_info.get('width', 'Unknown')}x{device_info.get('height', 'Unknown')}"
+    platform = device_info.get('platform', 'Unknown')
+    diff_summary, region_boxes = render_change_regions(result.get('visual_diff'))
+    diff_summary += render_layout_note(result.get('layout_similarity'))
+    if img_src:
+        dimensions = f'width="{size[0]}" height="{size[1]}" ' if size else ''
+        image = (f'<img src="{img_src}" {dimensions}loading="lazy" '
+                 f'decoding="async" alt="{title} screenshot" class="screenshot">')
+        if href:
+            image = f'<a href="{href}" target="_blank" title="Open full-size capture">{image}</a>'
+    else:
+        image = f'<div class="device-info">{escape(note or "Image not included")}</div>'
+        region_boxes = ''
+    return f"""
+                        <div class="device-card">
+                            <div class="device-header">
+                                <div class="device-name success">✓ {title}</div>
+                                <div class="device-info">{platform} • {resolution}</div>
+                                {diff_summary}
+                            </div>
+                            <div class="screenshot-container">
+                                <div class="diff-frame">
+                                    {image}
+                                    {region_boxes}
+                                </div>
+                            </div>
+                        </div>
+        """
+
+
+class ReportExporter:
+    """Self-contained report exports that survive being moved or shared
+
+    Captures are downsampled and WebP-encoded on a worker pool a bounded
+    number of results ahead of the writer, and each card is written as soon
+    as its image is ready, so a run is streamed rather than held in memory.
+    A total size cap stops embedding (and encoding) images once the budget
+    is spent; the remaining results are still listed.
+    """
+
+    def __init__(self, quality: int = WEBP_QUALITY, max_size: Optional[Tuple[int, int]] = None,
+                 max_total_bytes: Optional[int] = None, workers: int = 4):
+        """
+        Args:
+            quality: WebP quality of embedded images
+            max_size: Box each image is scaled into (defaults depend on the export format)
+            max_total_bytes: Budget for all embedded images (None for no limit)
+            workers: Encoding threads
+        """
+        self.quality = quality
+        self.max_size = max_size
+        self.max_total_bytes = max_total_bytes
+        self.workers = workers
+
+    def export_html(self, output_path: str, title: str, subtitle: str, results: Iterable[Tuple[str, Dict]],
+                    progress_callback: Optional[callable] = None) -> str:
+        """
+        Write a single HTML file with every image inlined as a WebP data URI
+        Args:
+            output_path: HTML path
+            title: Report heading
+            subtitle: Line under the heading (URL, run id, ...)
+            results: (card title, result) pairs in display order; may be a generator
+            progress_callback: Optional callback for progress updates
+        Returns: Path of the written file
+        """
+        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write(self._page_head(title, subtitle, f'<style>\n{REPORT_CSS}\n</style>'))
+            for card_title, result, image, note in self._encoded(results, self.max_size or HTML_MAX_SIZE,
+                                                                 progress_callback):
+                img_src = None
+                if image:
+                    data, width, height = image
+                    img_src = 'data:image/webp;base64,' + base64.b64encode(data).decode('ascii')
+                f.write(render_export_card(card_title, result, img_src, image and image[1:], note))
+            f.write(self._page_tail())
+        return output_path
+
+    def export_zip(self, output_path: str, title: str, subtitle: str, results: Iterable[Tuple[str, Dict]],
+                   progress_callback: Optional[callable] = None) -> str:
+        """
+        Write a zip bundle: index.html, WebP previews under images/ and a manifest.json describing them
+        Args:
+            output_path: Zip path
+            title: Report heading
+            subtitle: Line under the heading (URL, run id, ...)
+            results: (card title, result) pairs in display order; may be a generator
+            progress_callback: Optional callback for progress updates
+        Returns: Path of the written bundle
+        """
+        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+        entries = []
+        # A zip member has to be written in one go, so the page is staged in a temporary file
+        # while the images stream straight into the archive
+        with zipfile.ZipFile(output_path, 'w', compression=zipfile.ZIP_DEFLATED) as bundle, \
+                tempfile.TemporaryFile('w+b') as page:
+            page.write(self._page_head(title, subtitle, '<link rel="stylesheet" href="report.css">').encode('utf-8'))
+            for number, (card_title, result, image, note) in enumerate(
+                    self._encoded(results, self.max_size or BUNDLE_MAX_SIZE, progress_callback), 1):
+                entry = {key: result.get(key) for key in ('url', 'device', 'screenshot_mode', 'success',
+                                                          'error', 'pixel_hash', 'device_info', 'visual_diff',
+                                                          'layout_similarity')
+                         if result.get(key) is not None}
+                entry.update(title=card_title, source=os.path.basename(result.get('screenshot_path') or ''))
+                img_src = None
+                if image:
+                    data, width, height = image
+                    img_src = f'images/{number:06d}.webp'
+                    # WebP is already compressed; deflating it again only costs time
+                    bundle.writestr(img_src, data, compress_type=zipfile.ZIP_STORED)
+                    entry.update(image=img_src, width=width, height=height)
+                elif note:
+                    entry['note'] = note
+                entries.append(entry)
+                page.write(render_export_card(card_title, result, img_src, image and image[1:], note).encode('utf-8'))
+            page.write(self._page_tail().encode('utf-8'))
+
+            page.seek(0)
+            with bundle.open('index.html', 'w', force_zip64=True) as member:
+                shutil.copyfileobj(page, member)
+            bundle.writestr('report.css', REPORT_CSS)
+            bundle.writestr('manifest.json', json.dumps({
+                'title': title,
+                'subtitle': subtitle,
+                'exported': datetime.now().isoformat(timespec='seconds'),
+                'quality': self.quality,
+                'results': entries
+            }, indent=1, default=str))
+        return output_path
+
+    def _encoded(self, results: Iterable[Tuple[str, Dict]], box: Tuple[int, int],
+                 progress_callback: Optional[callable]):
+        """Yield (title, result, (data, width, height) or None, note) in order, encoding ahead in parallel"""
+        budget_spent = threading.Event()
+
+        def encode(item):
+            _, result = item
+            if not result.get('success') or not result.get('screenshot_path') or budget_spent.is_set():
+                return None
+            try:
+                return encode_webp(result['screenshot_path'], box, self.quality)
+            except Exception as e:
+                print(f"Could not encode {result['screenshot_path']} for export: {e}")
+                return e
+
+        total_bytes = 0
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for done, ((title, result), future) in enumerate(prefetch(executor, encode, results, PREFETCH), 1):
+                image = future.result()
+                note = ''
+                if isinstance(image, Exception):
+                    image, note = None, f"Image could not be read: {image}"
+                elif image and self.max_total_bytes and total_bytes + len(image[0]) > self.max_total_bytes:
+                    # Everything after this point is listed without images; stop encoding them
+                    budget_spent.set()
+                if budget_spent.is_set() and result.get('success'):
+                    image, note = None, "Image left out: export size cap reached"
+                if image:
+                    total_bytes += len(image[0])
+                if progress_callback:
+                    progress_callback(f"Exported {done} results ({total_bytes / (1024 * 1024):.1f} MB of images)")
+                yield title, result, image, note
+
+    def _page_head(self, title: str, subtitle: str, stylesheet: str) -> str:
+        return f"""<!DOCTYPE html>
+<html>
+<head>
+    <title>{escape(title)}</title>
+    <meta charset="utf-8">
+    {stylesheet}
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1>{escape(title)}</h1>
+            <p>{escape(subtitle)}</p>
+        </div>
+        <div class="content">
+            <div class="device-grid">
+"""
+
+    def _page_tail(self) -> str:
+        return f"""            </div>
+        </div>
+        <div class="footer">
+            Generated by ScreenQA • {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+        </div>
+    </div>
+</body>
+</html>
+"""
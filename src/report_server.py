@@ -0,0 +1,520 @@
+import os
+import re
+import time
+import argparse
+import mimetypes
+import threading
+import zipfile
+from html import escape
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, quote, unquote, urlencode, urlparse
+from history_index import HistoryIndex
+from report_export import render_export_card
+from report_writer import REPORT_CSS, render_page_head
+from retention import ARCHIVE_SEPARATOR, ColdStorage, is_safe_member, open_screenshot
+from run_manifest import RUNS_DIRNAME, RunManifest
+from thumbnails import REPORT_FORMAT, REPORT_MAX_ASPECT, make_thumbnail, save_thumbnail, thumbnail_path
+
+
+DEFAULT_PORT = 8765
+DERIVATIVE_WIDTHS = (160, 320, 640, 960, 1280, 1920)
+GALLERY_PAGE_SIZE = 60
+RUN_PAGE_SIZE = 100
+SYNC_INTERVAL = 30  # Seconds between history index syncs triggered by gallery requests
+CHUNK_SIZE = 64 * 1024
+
+# Only images are served from the screenshots directory, never the index database or configuration
+IMAGE_EXTENSIONS = ('.png', '.webp', '.avif', '.jpg', '.jpeg')
+REPORT_EXTENSIONS = ('.html', '.pdf', '.zip')
+
+SERVER_CSS = """
+.nav form { display: inline; }
+.nav input, .nav select { margin-right: 6px; }
+.gallery-grid {
+    display: grid;
+    grid-template-columns: repeat(auto-fill, minmax(240px, 1fr));
+    gap: 16px;
+    margin-top: 20px;
+}
+.gallery-item {
+    border: 1px solid #dee2e6;
+    border-radius: 8px;
+    padding: 10px;
+    text-align: center;
+    font-size: 0.85em;
+    color: #6c757d;
+}
+.gallery-item img {
+    max-width: 100%;
+    height: auto;
+}
+"""
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str = ''):
+        super().__init__(message)
+        self.status = status
+
+
+def snap_width(width: int) -> int:
+    """Nearest derivative width at or above the request, so the cache holds a fixed set of sizes"""
+    for allowed in DERIVATIVE_WIDTHS:
+        if width <= allowed:
+            return allowed
+    return DERIVATIVE_WIDTHS[-1]
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Single byte range of a Range header
+    Args:
+        header: Range header value
+        size: Size of the file
+    Returns: Inclusive (start, end), or None to send the whole file (multiple or malformed ranges)
+    Raises: HTTPError 416 when the range lies outside the file
+    """
+    match = re.fullmatch(r'\s*bytes\s*=\s*(\d*)\s*-\s*(\d*)\s*', header)
+    if not match or not any(match.groups()):
+        return None
+    first, last = match.groups()
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise HTTPError(416)
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise HTTPError(416)
+    return start, end
+
+
+class DerivativeCache:
+    """Resized copies of captures, made on first request and kept in the report thumbnail cache"""
+
+    def __init__(self, screenshots_dir: str, stripes: int = 64):
+        self.screenshots_dir = screenshots_dir
+        # Striped locks: concurrent requests for one derivative decode the capture once
+        self._locks = [threading.Lock() for _ in range(stripes)]
+
+    def get(self, ref: str, width: int) -> str:
+        """Path of the derivative of a capture at a (snapped) width, generating it on a miss"""
+        box = (width, width * REPORT_MAX_ASPECT)
+        path = thumbnail_path(self.screenshots_dir, ref, box, REPORT_FORMAT)
+        if os.path.exists(path):
+            return path
+        with self._locks[hash(path) % len(self._locks)]:
+            if not os.path.exists(path):
+                with open_screenshot(ref) as img:
+                    save_thumbnail(make_thumbnail(img, box), path)
+        return path
+
+
+class ReportServer:
+    """Local HTTP server for reports, the capture gallery and run listings
+
+    Pages are rendered from the history index and run manifests per request;
+    images are served as derivatives generated on demand and cached on disk,
+    with ETag/Last-Modified validation and byte ranges, so large archives can
+    be browsed without pre-rendering anything.
+    """
+
+    def __init__(self, screenshots_dir: str, reports_dir: str, host: str = '127.0.0.1',
+                 port: int = DEFAULT_PORT):
+        """
+        Args:
+            screenshots_dir: Screenshots directory
+            reports_dir: Reports directory
+            host: Interface to listen on ("0.0.0.0" to share on the LAN)
+            port: TCP port (0 picks a free one)
+        """
+        self.screenshots_dir = os.path.realpath(screenshots_dir)
+        self.reports_dir = os.path.realpath(reports_dir)
+        self.history = HistoryIndex(self.screenshots_dir)
+        self.derivatives = DerivativeCache(self.screenshots_dir)
+        self.cold_storage = ColdStorage(self.screenshots_dir)
+        self._sync_lock = threading.Lock()
+        self._last_sync = 0.0
+        self.httpd = ThreadingHTTPServer((host, port), _RequestHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.app = self
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{'127.0.0.1' if host in ('0.0.0.0', '') else host}:{port}/"
+
+    def start(self) -> str:
+        """Serve on a background thread; returns the server URL"""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='screenqa-report-server',
+                                        daemon=True)
+        self._thread.start()
+        return self.url
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def sync_history(self):
+        """Bring the history index up to date, at most once per SYNC_INTERVAL"""
+        with self._sync_lock:
+            if time.time() - self._last_sync >= SYNC_INTERVAL:
+                self.history.sync()
+                self._last_sync = time.time()
+
+    def ref_param(self, ref: str) -> Optional[str]:
+        """URL form of a capture reference: relative to the screenshots directory"""
+        path, sep, member = ref.partition(ARCHIVE_SEPARATOR)
+        path = os.path.realpath(path)
+        if not path.startswith(self.screenshots_dir + os.sep):
+            return None
+        return os.path.relpath(path, self.screenshots_dir).replace(os.sep, '/') + sep + member
+
+    def resolve_ref(self, param: Optional[str]) -> str:
+        """Capture reference for a ref parameter, refusing anything outside the screenshots directory"""
+        if not param:
+            raise HTTPError(400, "Missing ref")
+        path, sep, member = param.partition(ARCHIVE_SEPARATOR)
+        path = os.path.realpath(os.path.join(self.screenshots_dir, path))
+        if not path.startswith(self.screenshots_dir + os.sep) or not os.path.isfile(path):
+            raise HTTPError(404)
+        if not sep:
+            if not path.lower().endswith(IMAGE_EXTENSIONS):
+                raise HTTPError(404)
+            return path
+        # Archive references must name an image inside one of the cold tier's daily zip files
+        if os.path.dirname(path) != os.path.realpath(self.cold_storage.archive_dir) or not path.endswith('.zip') or \
+                not is_safe_member(member) or not member.lower().endswith(IMAGE_EXTENSIONS):
+            raise HTTPError(404)
+        try:
+            with zipfile.ZipFile(path) as archive:
+                if member not in archive.namelist():
+                    raise HTTPError(404)
+        except zipfile.BadZipFile:
+            raise HTTPError(404)
+        return path + sep + member
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    server_version = 'ScreenQA'
+    protocol_version = 'HTTP/1.1'
+
+    @property
+    def app(self) -> ReportServer:
+        return self.server.app
+
+    def log_message(self, format, *args):
+        # Requests for every lazily loaded thumbnail would drown the application log
+        pass
+
+    def do_GET(self):
+        self._dispatch(head=False)
+
+    def do_HEAD(self):
+        self._dispatch(head=True)
+
+    def _dispatch(self, head: bool):
+        self.head = head
+        parsed = urlparse(self.path)
+        params = {key: values[-1] for key, values in parse_qs(parsed.query).items()}
+        path = unquote(parsed.path)
+        try:
+            if path == '/':
+                self._home()
+            elif path == '/report.css':
+                self._send_bytes((REPORT_CSS + SERVER_CSS).encode('utf-8'), 'text/css; charset=utf-8')
+            elif path == '/gallery':
+                self._gallery(params)
+            elif path == '/runs':
+                self._runs()
+            elif path == '/run':
+                self._run(params)
+            elif path == '/derivative':
+                ref = self.app.resolve_ref(params.get('ref'))
+                try:
+                    width = snap_width(int(params.get('w', DERIVATIVE_WIDTHS[1])))
+                except ValueError:
+                    raise HTTPError(400, "Bad width")
+                self._send_file(self.app.derivatives.get(ref, width), cache_control='public, max-age=86400')
+            elif path == '/capture':
+                ref = self.app.resolve_ref(params.get('ref'))
+                self._send_file(self.app.cold_storage.materialize(ref), cache_control='public, max-age=86400')
+            elif path.startswith('/reports/'):
+                self._send_static(self.app.reports_dir, path[len('/reports/'):])
+            elif path.startswith('/screenshots/'):
+                self._send_static(self.app.screenshots_dir, path[len('/screenshots/'):], IMAGE_EXTENSIONS)
+            else:
+                raise HTTPError(404)
+        except HTTPError as e:
+            self.send_error(e.status, str(e) or None)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        except (KeyError, FileNotFoundError):
+            # Archive member or file that disappeared between listing and request
+            self.send_error(404)
+        except Exception as e:
+            print(f"Report server error for {self.path}: {e}")
+            self.send_error(500)
+
+    # Responses
+
+    def _send_bytes(self, body: bytes, content_type: str, status: int = 200):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        if not self.head:
+            self.wfile.write(body)
+
+    def _send_page(self, title: str, subtitle: str, content: str):
+        nav = ('<div class="nav"><a href="/">Home</a><a href="/gallery">Gallery</a>'
+               '<a href="/runs">Runs</a></div>')
+        body = (render_page_head(title, subtitle) + nav + f'\n        <div class="content">\n{content}'
+                '\n        </div>\n    </div>\n</body>\n</html>\n')
+        self._send_bytes(body.encode('utf-8'), 'text/html; charset=utf-8')
+
+    def _not_modified(self, etag: str, mtime: float) -> bool:
+        """Evaluate If-None-Match / If-Modified-Since"""
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match:
+            return if_none_match.strip() == '*' or etag in [tag.strip() for tag in if_none_match.split(',')]
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since:
+            try:
+                return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def _send_file(self, path: str, cache_control: str = 'no-cache'):
+        """Send a file with validators, answering conditional and single-range requests"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            raise HTTPError(404)
+        size = stat.st_size
+        etag = f'"{size:x}-{stat.st_mtime_ns:x}"'
+        content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+        def common_headers():
+            self.send_header('ETag', etag)
+            self.send_header('Last-Modified', formatdate(stat.st_mtime, usegmt=True))
+            self.send_header('Cache-Control', cache_control)
+            self.send_header('Accept-Ranges', 'bytes')
+
+        if self._not_modified(etag, stat.st_mtime):
+            self.send_response(304)
+            common_headers()
+            self.end_headers()
+            return
+
+        byte_range = None
+        range_header = self.headers.get('Range')
+        if_range = self.headers.get('If-Range')
+        if range_header and (not if_range or if_range.strip() == etag):
+            try:
+                byte_range = parse_range(range_header, size)
+            except HTTPError:
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{size}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+
+        start, end = byte_range or (0, size - 1)
+        length = end - start + 1 if size else 0
+        self.send_response(206 if byte_range else 200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(length))
+        if byte_range:
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        common_headers()
+        self.end_headers()
+        if self.head:
+            return
+
+        with open(path, 'rb') as f:
+            f.seek(start)
+            remaining = length
+            while remaining > 0:
+                chunk = f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                remaining -= len(chunk)
+
+    def _send_static(self, root: str, relative: str, extensions: Optional[Tuple[str, ...]] = None):
+        """Serve a file below root (a directory serves its index.html)"""
+        path = os.path.realpath(os.path.join(root, relative))
+        if path != root and not path.startswith(root + os.sep):
+            raise HTTPError(404)
+        if os.path.isdir(path):
+            if not self.path.split('?')[0].endswith('/'):
+                self.send_response(301)
+                self.send_header('Location', self.path.split('?')[0] + '/')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            path = os.path.join(path, 'index.html')
+        if extensions and not path.lower().endswith(extensions):
+            raise HTTPError(404)
+        self._send_file(path)
+
+    # Pages
+
+    def _home(self):
+        reports = []
+        if os.path.isdir(self.app.reports_dir):
+            for entry in os.scandir(self.app.reports_dir):
+                if entry.is_dir() and os.path.exists(os.path.join(entry.path, 'index.html')):
+                    reports.append((entry.stat().st_mtime, entry.name + '/'))
+                elif entry.is_file() and entry.name.lower().endswith(REPORT_EXTENSIONS):
+                    reports.append((entry.stat().st_mtime, entry.name))
+        reports.sort(reverse=True)
+
+        rows = ''.join(
+            f'<tr><td><a href="/reports/{quote(name)}">{escape(name)}</a></td>'
+            f'<td>{time.strftime("%Y-%m-%d %H:%M", time.localtime(mtime))}</td></tr>\n'
+            for mtime, name in reports[:500])
+        self._send_page("ScreenQA", "Reports, captures and runs", f"""
+            <h2>Reports ({len(reports)})</h2>
+            <table class="summary-table"><tr><th>Report</th><th>Modified</th></tr>
+{rows}            </table>""")
+
+    def _gallery(self, params: Dict[str, str]):
+        self.app.sync_history()
+        try:
+            page = max(1, int(params.get('page', 1)))
+        except ValueError:
+            page = 1
+        filters = {key: params.get(key) or None for key in ('device', 'domain', 'screenshot_mode')}
+        search = params.get('q') or None
+        since = params.get('since') or None
+
+        # One extra row tells whether there is a next page without counting the whole table
+        entries = self.app.history.query(limit=GALLERY_PAGE_SIZE + 1, offset=(page - 1) * GALLERY_PAGE_SIZE,
+                                         search=search, since=since, **filters)
+        has_next = len(entries) > GALLERY_PAGE_SIZE
+        facets = self.app.history.facets()
+
+        def select(name, label):
+            options = ''.join(f'<option value="{escape(value)}"{" selected" if value == filters[name] else ""}>'
+                              f'{escape(value)}</option>' for value in facets[name])
+            return f'<select name="{name}"><option value="">All {label}</option>{options}</select>'
+
+        form = (f'<form method="get" action="/gallery">{select("device", "devices")}{select("domain", "domains")}'
+                f'{select("screenshot_mode", "modes")}'
+                f'<input name="q" placeholder="URL or filename" value="{escape(search or "")}">'
+                f'<input name="since" type="date" value="{escape(since or "")}">'
+                f'<button type="submit">Filter</button></form>')
+
+        items = []
+        for entry in entries[:GALLERY_PAGE_SIZE]:
+            ref = self.app.ref_param(entry['filepath'])
+            if ref is None:
+                continue
+            ref_query = quote(ref)
+            srcset = ', '.join(f'/derivative?ref={ref_query}&w={w} {w}w' for w in (320, 640))
+            items.append(f"""
+                <div class="gallery-item">
+                    <a href="/capture?ref={ref_query}" target="_blank">
+                        <img src="/derivative?ref={ref_query}&w=320" srcset="{srcset}" sizes="240px"
+                             loading="lazy" decoding="async" alt="{escape(entry['filename'])}">
+                    </a>
+                    <div>{escape(entry.get('device') or '')} • {escape(entry.get('screenshot_mode') or '')}</div>
+                    <div>{escape(entry.get('url') or entry.get('domain') or '')}</div>
+                    <div>{escape(entry['created'])}</div>
+                </div>""")
+
+        query = {key: value for key, value in dict(filters, q=search, since=since).items() if value}
+        pager = []
+        if page > 1:
+            pager.append(f'<a href="/gallery?{urlencode(dict(query, page=page - 1))}">&larr; Previous</a>')
+        if has_next:
+            pager.append(f'<a href="/gallery?{urlencode(dict(query, page=page + 1))}">Next &rarr;</a>')
+        self._send_page("Capture Gallery", f"Page {page}", f"""
+            <div class="nav">{form}</div>
+            <div class="gallery-grid">{''.join(items) or '<p>No captures match.</p>'}
+            </div>
+            <div class="nav">{''.join(pager)}</div>""")
+
+    def _runs(self):
+        rows = ''.join(
+            f'<tr><td><a href="/run?{urlencode({"id": run["run_id"]})}">{escape(run["run_id"])}</a></td>'
+            f'<td>{escape(str(run.get("started", "")))}</td>'
+            f'<td>{escape(str(run.get("screenshot_mode", "")))}</td></tr>\n'
+            for run in RunManifest.list_runs(self.app.screenshots_dir))
+        self._send_page("Runs", "Recorded capture runs, newest first", f"""
+            <table class="summary-table"><tr><th>Run</th><th>Started</th><th>Mode</th></tr>
+{rows}            </table>""")
+
+    def _run(self, params: Dict[str, str]):
+        run_id = params.get('id', '')
+        manifest_path = os.path.join(self.app.screenshots_dir, RUNS_DIRNAME, f'{os.path.basename(run_id)}.jsonl')
+        if not run_id or not os.path.isfile(manifest_path):
+            raise HTTPError(404)
+        try:
+            page = max(1, int(params.get('page', 1)))
+        except ValueError:
+            page = 1
+        url_filter = params.get('url') or None
+
+        # Stream the manifest up to the requested page; nothing before it is kept
+        manifest = RunManifest(manifest_path)
+        first = (page - 1) * RUN_PAGE_SIZE
+        cards = []
+        has_next = False
+        position = 0
+        for result in manifest.iter_results():
+            if url_filter and url_filter not in result.get('url', ''):
+                continue
+            if position >= first + RUN_PAGE_SIZE:
+                has_next = True
+                break
+            if position >= first:
+                ref = result.get('success') and result.get('screenshot_path') and \
+                      self.app.ref_param(result['screenshot_path'])
+                img_src = f'/derivative?ref={quote(ref)}&w=640' if ref else None
+                cards.append(render_export_card(f"{result['device']} - {result['url']}", result, img_src, None,
+                                                href=f'/capture?ref={quote(ref)}' if ref else None))
+            position += 1
+
+        query = {'id': run_id}
+        if url_filter:
+            query['url'] = url_filter
+        pager = []
+        if page > 1:
+            pager.append(f'<a href="/run?{urlencode(dict(query, page=page - 1))}">&larr; Previous</a>')
+        if has_next:
+            pager.append(f'<a href="/run?{urlencode(dict(query, page=page + 1))}">Next &rarr;</a>')
+        form = (f'<form method="get" action="/run"><input type="hidden" name="id" value="{escape(run_id)}">'
+                f'<input name="url" placeholder="Filter by URL" value="{escape(url_filter or "")}">'
+                f'<button type="submit">Filter</button></form>')
+        self._send_page(f"Run {run_id}", f"Page {page}", f"""
+            <div class="nav">{form}</div>
+            <div class="device-grid">{''.join(cards) or '<p>No results.</p>'}
+            </div>
+            <div class="nav">{''.join(pager)}</div>""")
+
+
+if __name__ == "__main__":
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+    parser = argparse.ArgumentParser(description="Serve ScreenQA reports, captures and runs over HTTP")
+    parser.add_argument('--screenshots', default=os.path.join(root, 'screenshots'), help="Screenshots directory")
+    parser.add_argument('--reports', default=os.path.join(root, 'reports'), help="Reports directory")
+    parser.add_argument('--host', default='127.0.0.1', help="Interface to listen on (0.0.0.0 for the LAN)")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+
+    server = ReportServer(args.screenshots, args.reports, args.host, args.port)
+    print(f"Serving on {server.url} (Ctrl+C to stop)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.httpd.server_close()
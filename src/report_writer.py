@@ -0,0 +1,463 @@
+import os
+import re
+import zlib
+from html import escape
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from run_manifest import RunManifest
+from thumbnails import html_url, report_thumbnails, thumbnail_img_attributes
+
+
+PAGE_SIZE = 100
+STYLESHEET_FILENAME = 'report.css'
+
+REPORT_CSS = """
+body {
+    font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
+    margin: 0;
+    padding: 20px;
+    background: #f5f5f5;
+}
+.container {
+    max-width: 1200px;
+    margin: 0 auto;
+    background: white;
+    border-radius: 8px;
+    box-shadow: 0 2px 10px rgba(0,0,0,0.1);
+    overflow: hidden;
+}
+.header {
+    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+    color: white;
+    padding: 30px;
+    text-align: center;
+}
+.header h1 {
+    margin: 0;
+    font-size: 2.5em;
+    font-weight: 300;
+}
+.stats {
+    display: flex;
+    justify-content: space-around;
+    padding: 20px;
+    background: #f8f9fa;
+    border-bottom: 1px solid #dee2e6;
+}
+.stat {
+    text-align: center;
+}
+.stat-number {
+    font-size: 2em;
+    font-weight: bold;
+    color: #495057;
+}
+.stat-label {
+    color: #6c757d;
+    font-size: 0.9em;
+}
+.success { color: #28a745; }
+.error { color: #dc3545; }
+.content {
+    padding: 30px;
+}
+.device-grid {
+    display: grid;
+    grid-template-columns: repeat(auto-fit, minmax(350px, 1fr));
+    gap: 20px;
+    margin-top: 20px;
+}
+.device-card {
+    border: 1px solid #dee2e6;
+    border-radius: 8px;
+    overflow: hidden;
+    box-shadow: 0 2px 4px rgba(0,0,0,0.1);
+}
+.device-header {
+    padding: 15px;
+    background: #f8f9fa;
+    border-bottom: 1px solid #dee2e6;
+}
+.device-name {
+    font-weight: bold;
+    font-size: 1.1em;
+}
+.device-info {
+    color: #6c757d;
+    font-size: 0.9em;
+    margin-top: 5px;
+}
+.screenshot-container {
+    text-align: center;
+    padding: 15px;
+}
+.screenshot {
+    max-width: 100%;
+    height: auto;
+    border-radius: 4px;
+    box-shadow: 0 2px 8px rgba(0,0,0,0.15);
+}
+.diff-frame {
+    position: relative;
+    display: inline-block;
+    max-width: 100%;
+}
+.diff-frame a {
+    display: block;
+}
+.diff-frame .screenshot {
+    display: block;
+}
+.change-region {
+    position: absolute;
+    border: 2px solid #dc3545;
+    background: rgba(220, 53, 69, 0.12);
+    box-sizing: border-box;
+    pointer-events: none;
+}
+.diff-summary {
+    color: #dc3545;
+    font-size: 0.9em;
+    margin-top: 5px;
+}
+.baseline-check {
+    font-size: 0.9em;
+    font-weight: bold;
+    margin-top: 5px;
+}
+.error-message {
+    color: #dc3545;
+    padding: 15px;
+    background: #f8d7da;
+    border-radius: 4px;
+    margin: 10px;
+}
+.metadata {
+    background: #f8f9fa;
+    padding: 15px;
+    font-size: 0.9em;
+    color: #6c757d;
+}
+.footer {
+    text-align: center;
+    padding: 20px;
+    background: #f8f9fa;
+    color: #6c757d;
+    border-top: 1px solid #dee2e6;
+}
+.nav {
+    display: flex;
+    justify-content: space-between;
+    padding: 15px 30px;
+    background: #f8f9fa;
+    border-bottom: 1px solid #dee2e6;
+}
+.nav a {
+    color: #667eea;
+    text-decoration: none;
+}
+.summary-table {
+    width: 100%;
+    border-collapse: collapse;
+    font-size: 0.9em;
+}
+.summary-table th, .summary-table td {
+    padding: 8px 12px;
+    border-bottom: 1px solid #dee2e6;
+    text-align: left;
+}
+.summary-table th {
+    background: #f8f9fa;
+    color: #495057;
+}
+"""
+
+
+def render_baseline_check(diff: Optional[Dict]) -> str:
+    """Pass/fail line for a diff against an approved baseline (empty for other diffs)"""
+    if not diff or 'passed' not in diff:
+        return ""
+    if diff['passed']:
+        return '<div class="baseline-check success">✓ Matches approved baseline</div>'
+    return '<div class="baseline-check error">✗ Differs from approved baseline</div>'
+
+
+def render_change_regions(diff: Optional[Dict]) -> Tuple[str, str]:
+    """HTML summary line (with the baseline verdict, if any) and positioned boxes for a diff's change regions"""
+    verdict = render_baseline_check(diff)
+    if not diff or not diff.get('mismatch_pixels'):
+        return verdict, ""
+
+    summary = verdict + (f'<div class="diff-summary">{diff["mismatch_percent"]:.2f}% changed in '
+                         f'{diff.get("regions_total", 0)} region(s)</div>')
+
+    # Percentages keep the boxes aligned however the browser scales the screenshot
+    boxes = []
+    for rank, region in enumerate(diff.get('regions', []), 1):
+        boxes.append(
+            f'<div class="change-region" title="#{rank}: {region["changed_pixels"]} px changed" style="'
+            f'left: {100 * region["x"] / diff["width"]:.3f}%; '
+            f'top: {100 * region["y"] / diff["height"]:.3f}%; '
+            f'width: {100 * region["width"] / diff["width"]:.3f}%; '
+            f'height: {100 * region["height"] / diff["height"]:.3f}%;"></div>'
+        )
+    return summary, "\n".join(boxes)
+
+
+def render_layout_note(layout: Optional[Dict]) -> str:
+    """Warning line for a device whose layout diverges from the other devices' captures"""
+    if not layout or not layout['outlier']:
+        return ""
+    return (f'<div class="diff-summary">Layout diverges from other devices '
+            f'(similarity {layout["score"]:.2f})</div>')
+
+
+def render_device_card(title: str, result: Dict, report_dir: str,
+                       variants: Optional[List[Tuple[str, int, int]]] = None) -> str:
+    """
+    HTML card for one capture result
+    Args:
+        title: Card heading (device name, or URL on per-device pages)
+        result: Capture result (success, screenshot_path, device_info, visual_diff, ...)
+        report_dir: Directory of the page the card goes into, for relative links
+        variants: report_thumbnails() entry for the capture, if any
+    Returns: Card markup
+    """
+    title = escape(title)
+    if not result.get('success'):
+        return f"""
+                        <div class="device-card">
+                            <div class="device-header">
+                                <div class="device-name error">✗ {title}</div>
+                                <div class="device-info">Capture failed</div>
+                            </div>
+                            <div class="error-message">
+                                {escape(str(result.get('error') or 'Unknown error occurred'))}
+                            </div>
+                        </div>
+        """
+
+    device_info = result.get('device_info') or {}
+    resolution = f"{device_info.get('width', 'Unknown')}x{device_info.get('height', 'Unknown')}"
+    platform = device_info.get('platform', 'Unknown')
+    try:
+        size_str = f"{os.path.getsize(result['screenshot_path']) / 1024:.1f} KB"
+    except (OSError, TypeError):
+        size_str = "Unknown"
+
+    diff_summary, region_boxes = render_change_regions(result.get('visual_diff'))
+    diff_summary += render_layout_note(result.get('layout_similarity'))
+
+    full_url = html_url(result['screenshot_path'], report_dir)
+    img_attributes = (thumbnail_img_attributes(variants, report_dir) if variants
+                      else f'src="{full_url}" loading="lazy" decoding="async"')
+    return f"""
+                        <div class="device-card">
+                            <div class="device-header">
+                                <div class="device-name success">✓ {title}</div>
+                                <div class="device-info">
+                                    {platform} • {resolution} • {size_str}
+                                </div>
+                                {diff_summary}
+                            </div>
+                            <div class="screenshot-container">
+                                <div class="diff-frame">
+                                    <a href="{full_url}" target="_blank" title="Open full-size capture">
+                                        <img {img_attributes} alt="{title} screenshot" class="screenshot">
+                                    </a>
+                                    {region_boxes}
+                                </div>
+                            </div>
+                        </div>
+        """
+
+
+def render_page_head(title: str, subtitle: str) -> str:
+    """Start of a standalone report page using the shared stylesheet"""
+    return f"""<!DOCTYPE html>
+<html>
+<head>
+    <title>{escape(title)}</title>
+    <meta charset="utf-8">
+    <link rel="stylesheet" href="{STYLESHEET_FILENAME}">
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1>{escape(title)}</h1>
+            <p>{escape(subtitle)}</p>
+        </div>
+"""
+
+
+def page_slug(key: str) -> str:
+    """Filesystem-safe page name for a URL or device, unique via a short checksum"""
+    readable = re.sub(r'[^A-Za-z0-9]+', '_', re.sub(r'^https?://', '', key)).strip('_')[:60]
+    return f"{readable}_{zlib.crc32(key.encode('utf-8')):08x}"
+
+
+class ReportWriter:
+    """Streams a run manifest into a paginated HTML report
+
+    One pass over the manifest collects summary stats and the byte offset of
+    every result, grouped by URL or device. Each page then reads back only its
+    own results and writes its cards one at a time, so memory depends on the
+    page size rather than the run size, and pages render in parallel.
+    """
+
+    PAGINATE_MODES = ('url', 'device')
+
+    def __init__(self, screenshots_dir: str, output_dir: str, paginate: str = 'url',
+                 page_size: int = PAGE_SIZE, workers: int = 4):
+        """
+        Args:
+            screenshots_dir: Screenshots directory holding the thumbnail cache
+            output_dir: Directory the index, pages and stylesheet are written to
+            paginate: Group pages by "url" or "device"
+            page_size: Maximum cards per page; larger groups continue on further pages
+            workers: Pages rendered in parallel
+        """
+        if paginate not in self.PAGINATE_MODES:
+            raise ValueError(f"Unknown pagination '{paginate}'")
+        self.screenshots_dir = screenshots_dir
+        self.output_dir = output_dir
+        self.paginate = paginate
+        self.page_size = page_size
+        self.workers = workers
+
+    def write(self, manifest: RunManifest, progress_callback: Optional[callable] = None) -> str:
+        """
+        Render a run manifest
+        Args:
+            manifest: Run to report on
+            progress_callback: Optional callback for progress updates
+        Returns: Path of the index page
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        with open(os.path.join(self.output_dir, STYLESHEET_FILENAME), 'w', encoding='utf-8') as f:
+            f.write(REPORT_CSS)
+
+        stats, groups = self._scan(manifest)
+        pages = self._plan(groups)
+        if progress_callback:
+            progress_callback(f"Writing {len(pages)} report pages for {stats['total']} results...")
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for done, _ in enumerate(executor.map(lambda page: self._write_page(manifest, page), pages), 1):
+                if progress_callback:
+                    progress_callback(f"Wrote report page {done}/{len(pages)}")
+
+        return self._write_index(manifest, stats, groups)
+
+    def _scan(self, manifest: RunManifest) -> Tuple[Dict, Dict[str, Dict]]:
+        """Summary stats plus per-group counts and result offsets, from one streaming pass"""
+        stats = {'total': 0, 'successful': 0, 'failed': 0, 'changed': 0}
+        groups = {}
+        for offset, record in manifest.iter_records():
+            key = record['url'] if self.paginate == 'url' else record['device']
+            group = groups.setdefault(key, {'offsets': [], 'total': 0, 'successful': 0,
+                                            'failed': 0, 'changed': 0})
+            group['offsets'].append(offset)
+            outcome = 'successful' if record.get('success') else 'failed'
+            changed = bool((record.get('visual_diff') or {}).get('mismatch_pixels'))
+            for counts in (stats, group):
+                counts['total'] += 1
+                counts[outcome] += 1
+                counts['changed'] += changed
+        return stats, groups
+
+    def _plan(self, groups: Dict[str, Dict]) -> List[Dict]:
+        """Split each group into pages of at most page_size results"""
+        pages = []
+        for key, group in groups.items():
+            offsets = group['offsets']
+            count = max(1, (len(offsets) + self.page_size - 1) // self.page_size)
+            group['pages'] = count
+            for number in range(1, count + 1):
+                pages.append({
+                    'key': key,
+                    'number': number,
+                    'count': count,
+                    'offsets': offsets[(number - 1) * self.page_size:number * self.page_size],
+                    'filename': self._page_filename(key, number)
+                })
+        return pages
+
+    def _page_filename(self, key: str, number: int) -> str:
+        return f"{self.paginate}_{page_slug(key)}_{number}.html"
+
+    def _write_page(self, manifest: RunManifest, page: Dict):
+        """Write one page of cards, reading only this page's results from the manifest"""
+        results = list(manifest.read_at(page['offsets']))
+        thumbnails = report_thumbnails(
+            self.screenshots_dir,
+            [r['screenshot_path'] for r in results if r.get('success') and r.get('screenshot_path')],
+            max_workers=2)
+
+        previous_link = (f'<a href="{self._page_filename(page["key"], page["number"] - 1)}">&larr; Previous</a>'
+                         if page['number'] > 1 else '<span></span>')
+        next_link = (f'<a href="{self._page_filename(page["key"], page["number"] + 1)}">Next &rarr;</a>'
+                     if page['number'] < page['count'] else '<span></span>')
+
+        with open(os.path.join(self.output_dir, page['filename']), 'w', encoding='utf-8') as f:
+            f.write(render_page_head(page['key'], f"Page {page['number']} of {page['count']}"))
+            f.write(f"""        <div class="nav">
+            {previous_link}
+            <a href="index.html">Run summary</a>
+            {next_link}
+        </div>
+        <div class="content">
+            <div class="device-grid">
+""")
+            for result in results:
+                title = result['device'] if self.paginate == 'url' else result['url']
+                f.write(render_device_card(title, result, self.output_dir,
+                                           thumbnails.get(result.get('screenshot_path'))))
+            f.write("""            </div>
+        </div>
+    </div>
+</body>
+</html>
+""")
+
+    def _write_index(self, manifest: RunManifest, stats: Dict, groups: Dict[str, Dict]) -> str:
+        """Index page with run-wide stats and one summary row per URL or device"""
+        header = manifest.header() or {}
+        rate = stats['successful'] / stats['total'] * 100 if stats['total'] else 0.0
+        index_path = os.path.join(self.output_dir, 'index.html')
+
+        with open(index_path, 'w', encoding='utf-8') as f:
+            f.write(render_page_head(f"ScreenQA Run {header.get('run_id', manifest.run_id)}",
+                                    f"Started {header.get('started', 'unknown')}"))
+            f.write('        <div class="stats">\n')
+            for value, label, style in ((stats['total'], 'Total Results', ''),
+                                        (stats['successful'], 'Successful', ' success'),
+                                        (stats['failed'], 'Failed', ' error'),
+                                        (stats['changed'], 'Visually Changed', ''),
+                                        (f"{rate:.1f}%", 'Success Rate', '')):
+                f.write(f'            <div class="stat"><div class="stat-number{style}">{value}</div>'
+                        f'<div class="stat-label">{label}</div></div>\n')
+            f.write(f"""        </div>
+        <div class="content">
+            <table class="summary-table">
+                <tr><th>{self.paginate.title()}</th><th>Results</th><th>Successful</th>
+                    <th>Failed</th><th>Changed</th><th>Pages</th></tr>
+""")
+            for key, group in groups.items():
+                links = ' '.join(f'<a href="{self._page_filename(key, number)}">{number}</a>'
+                                 for number in range(1, group['pages'] + 1))
+                f.write(f"""                <tr><td>{escape(key)}</td><td>{group['total']}</td>
+                    <td class="success">{group['successful']}</td><td class="error">{group['failed']}</td>
+                    <td>{group['changed']}</td><td>{links}</td></tr>
+""")
+            f.write(f"""            </table>
+        </div>
+        <div class="footer">
+            Generated by ScreenQA • {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+        </div>
+    </div>
+</body>
+</html>
+""")
+        return index_path
@@ -0,0 +1,457 @@
+import os
+import json
+import shutil
+import tempfile
+import zipfile
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from PIL import Image
+from recompression import recompress_file, group_by_inode, link_aliases
+from content_store import ContentStore
+
+
+SCREENSHOT_EXTENSIONS = ('.png', '.webp', '.avif')
+ARCHIVE_DIRNAME = 'archive'
+PINS_FILENAME = 'pinned.json'
+ARCHIVE_SEPARATOR = '::'
+
+
+def capture_group_key(filename: str) -> str:
+    """Return the URL/device/mode part of a capture filename (drops the timestamp)"""
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    parts = stem.rsplit('_', 2)
+    return parts[0] if len(parts) == 3 else stem
+
+
+def capture_time(filename: str, fallback: float) -> float:
+    """Capture timestamp from the filename; deduplicated captures share an inode and its mtime"""
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    try:
+        return datetime.strptime('_'.join(stem.rsplit('_', 2)[-2:]), '%Y%m%d_%H%M%S').timestamp()
+    except ValueError:
+        return fallback
+
+
+class RetentionPolicy:
+    """Retention rules applied by RetentionEngine"""
+
+    EVICTION_MODES = ('oldest_first', 'lru')
+    COLD_TIERS = ('webp', 'archive')
+
+    def __init__(self, max_age_days: Optional[float] = None,
+                 max_total_bytes: Optional[int] = None,
+                 eviction: str = 'oldest_first',
+                 keep_last: Optional[int] = None,
+                 cold_after_days: Optional[float] = None,
+                 cold_tier: str = 'webp'):
+        """
+        Args:
+            max_age_days: Delete captures older than this many days
+            max_total_bytes: Evict captures until the directory fits this quota
+            eviction: Quota eviction order, "oldest_first" or "lru" (last access)
+            keep_last: Keep only the newest N captures per URL/device/mode
+            cold_after_days: Move captures older than this to the cold tier
+            cold_tier: "webp" (lossless WebP in place) or "archive" (daily zip files)
+        """
+        if eviction not in self.EVICTION_MODES:
+            raise ValueError(f"Unknown eviction mode '{eviction}'")
+        if cold_tier not in self.COLD_TIERS:
+            raise ValueError(f"Unknown cold tier '{cold_tier}'")
+
+        self.max_age_days = max_age_days
+        self.max_total_bytes = max_total_bytes
+        self.eviction = eviction
+        self.keep_last = keep_last
+        self.cold_after_days = cold_after_days
+        self.cold_tier = cold_tier
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'RetentionPolicy':
+        """Build a policy from a config dictionary (e.g. config/retention.json)"""
+        max_total_bytes = data.get('max_total_bytes')
+        if max_total_bytes is None and data.get('max_total_gb') is not None:
+            max_total_bytes = int(data['max_total_gb'] * 1024 ** 3)
+
+        return cls(
+            max_age_days=data.get('max_age_days'),
+            max_total_bytes=max_total_bytes,
+            eviction=data.get('eviction', 'oldest_first'),
+            keep_last=data.get('keep_last'),
+            cold_after_days=data.get('cold_after_days'),
+            cold_tier=data.get('cold_tier', 'webp')
+        )
+
+    @classmethod
+    def load(cls, config_path: str) -> 'RetentionPolicy':
+        """Load a policy from a JSON file, falling back to an empty policy"""
+        try:
+            with open(config_path, 'r') as f:
+                return cls.from_dict(json.load(f))
+        except FileNotFoundError:
+            print(f"Retention config file not found at {config_path}")
+            return cls()
+
+
+class ColdStorage:
+    """Cold tier for old captures: lossless WebP files and daily zip archives"""
+
+    def __init__(self, screenshots_dir: str):
+        self.screenshots_dir = screenshots_dir
+        self.archive_dir = os.path.join(screenshots_dir, ARCHIVE_DIRNAME)
+        self.extract_dir = os.path.join(tempfile.gettempdir(), 'screenqa_cold_cache')
+
+    def to_webp(self, filepath: str) -> str:
+        """Recompress a PNG capture to lossless WebP and remove the original"""
+        result = recompress_file(filepath, 'webp_lossless', only_if_smaller=False)
+        if result['status'] != 'done':
+            raise RuntimeError(f"WebP recompression skipped: {result['reason']}")
+        return os.path.join(os.path.dirname(filepath), result['output'])
+
+    def archive_name_for(self, filepath: str) -> str:
+        """Daily archive that a capture belongs in, based on its capture time"""
+        captured = capture_time(filepath, os.path.getmtime(filepath))
+        day = datetime.fromtimestamp(captured).strftime('%Y%m%d')
+        return os.path.join(self.archive_dir, f'{day}.zip')
+
+    def pack(self, archive_path: str, filepaths: List[str]) -> List[str]:
+        """Append captures to a zip archive and remove the originals"""
+        os.makedirs(os.path.dirname(archive_path), exist_ok=True)
+        packed = []
+
+        with zipfile.ZipFile(archive_path, 'a', compression=zipfile.ZIP_STORED) as archive:
+            existing = set(archive.namelist())
+            for filepath in filepaths:
+                name = os.path.basename(filepath)
+                if name not in existing:
+                    # PNG/WebP data is already compressed, store as-is
+                    archive.write(filepath, arcname=name)
+                packed.append(filepath)
+
+        for filepath in packed:
+            os.remove(filepath)
+        return packed
+
+    def list_entries(self) -> List[Dict]:
+        """List archived captures as history-style entries"""
+        entries = []
+        if not os.path.isdir(self.archive_dir):
+            return entries
+
+        for archive_name in sorted(os.listdir(self.archive_dir)):
+            if not archive_name.endswith('.zip'):
+                continue
+            archive_path = os.path.join(self.archive_dir, archive_name)
+            try:
+                with zipfile.ZipFile(archive_path) as archive:
+                    for info in archive.infolist():
+                        entries.append({
+                            'filename': info.filename,
+                            'filepath': f'{archive_path}{ARCHIVE_SEPARATOR}{info.filename}',
+                            'size': info.file_size,
+                            'created': datetime(*info.date_time).strftime('%Y-%m-%d %H:%M:%S')
+                        })
+            except zipfile.BadZipFile as e:
+                print(f"Skipping damaged archive {archive_path}: {e}")
+
+        return entries
+
+    def materialize(self, ref: str) -> str:
+        """Return a real file path for a capture reference, extracting archive members on demand"""
+        if ARCHIVE_SEPARATOR not in ref:
+            return ref
+
+        archive_path, member = ref.split(ARCHIVE_SEPARATOR, 1)
+        if not is_safe_member(member):
+            raise ValueError(f"Invalid archive member '{member}'")
+        target_dir = os.path.realpath(
+            os.path.join(self.extract_dir, os.path.splitext(os.path.basename(archive_path))[0]))
+        target = os.path.realpath(os.path.join(target_dir, member))
+        if os.path.dirname(target) != target_dir:
+            raise ValueError(f"Archive member '{member}' escapes {target_dir}")
+        if not os.path.exists(target):
+            os.makedirs(target_dir, exist_ok=True)
+            with zipfile.ZipFile(archive_path) as archive:
+                if member not in archive.namelist():
+                    raise ValueError(f"'{member}' is not in {archive_path}")
+                with archive.open(member) as src, open(target + '.tmp', 'wb') as dst:
+                    shutil.copyfileobj(src, dst)
+            os.replace(target + '.tmp', target)
+        return target
+
+
+def is_safe_member(member: str) -> bool:
+    """Archive members are plain capture filenames; anything that could name another path is refused"""
+    return bool(member) and '/' not in member and '\\' not in member and '..' not in member
+
+
+def open_screenshot(ref: str) -> Image.Image:
+    """Open a capture by path or archive reference ("archive.zip::member")"""
+    if ARCHIVE_SEPARATOR in ref:
+        archive_path, member = ref.split(ARCHIVE_SEPARATOR, 1)
+        with zipfile.ZipFile(archive_path) as archive:
+            img = Image.open(archive.open(member))
+            img.load()
+            return img
+    return Image.open(ref)
+
+
+class RetentionEngine:
+    """Plans and applies retention policies for a screenshots directory"""
+
+    def __init__(self, screenshots_dir: str, max_workers: int = 8):
+        self.screenshots_dir = screenshots_dir
+        self.max_workers = max_workers
+        self.cold_storage = ColdStorage(screenshots_dir)
+        self.pins_path = os.path.join(screenshots_dir, PINS_FILENAME)
+
+    def get_pinned(self) -> set:
+        """Filenames that retention must never delete or move"""
+        try:
+            with open(self.pins_path, 'r') as f:
+                return set(json.load(f))
+        except (FileNotFoundError, ValueError):
+            return set()
+
+    def set_pinned(self, filename: str, pinned: bool = True):
+        """Pin or unpin a capture (e.g. an approved baseline)"""
+        pins = self.get_pinned()
+        if pinned:
+            pins.add(os.path.basename(filename))
+        else:
+            pins.discard(os.path.basename(filename))
+
+        tmp_path = self.pins_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(sorted(pins), f, indent=2)
+        os.replace(tmp_path, self.pins_path)
+
+    def scan(self) -> List[Dict]:
+        """Collect live captures and cold archives with their stats"""
+        entries = []
+
+        if os.path.isdir(self.screenshots_dir):
+            with os.scandir(self.screenshots_dir) as it:
+                for entry in it:
+                    if entry.is_file() and entry.name.endswith(SCREENSHOT_EXTENSIONS):
+                        stats = entry.stat()
+                        entries.append({
+                            'path': entry.path,
+                            'filename': entry.name,
+                            'group': capture_group_key(entry.name),
+                            'size': stats.st_size,
+                            'captured': capture_time(entry.name, stats.st_mtime),
+                            'atime': stats.st_atime,
+                            'inode': (stats.st_dev, stats.st_ino) if stats.st_nlink > 1 else None,
+                            'archive': False
+                        })
+
+        if os.path.isdir(self.cold_storage.archive_dir):
+            with os.scandir(self.cold_storage.archive_dir) as it:
+                for entry in it:
+                    if entry.is_file() and entry.name.endswith('.zip'):
+                        stats = entry.stat()
+                        try:
+                            with zipfile.ZipFile(entry.path) as archive:
+                                members = archive.namelist()
+                        except zipfile.BadZipFile as e:
+                            print(f"Could not list archive {entry.path}: {e}")
+                            members = None
+                        entries.append({
+                            'path': entry.path,
+                            'filename': entry.name,
+                            'group': None,
+                            'size': stats.st_size,
+                            'captured': stats.st_mtime,
+                            'atime': stats.st_atime,
+                            'inode': None,
+                            'archive': True,
+                            'members': members
+                        })
+
+        # Deduplicated captures are hardlinks to one stored object: spread its size over the links
+        link_counts = {}
+        for entry in entries:
+            if entry['inode'] is not None:
+                link_counts[entry['inode']] = link_counts.get(entry['inode'], 0) + 1
+        for entry in entries:
+            if entry['inode'] is not None:
+                entry['size'] = entry['size'] // link_counts[entry['inode']]
+
+        return entries
+
+    def plan(self, policy: RetentionPolicy, now: Optional[float] = None) -> Dict:
+        """Work out which captures to delete and which to move to the cold tier"""
+        now = now if now is not None else datetime.now().timestamp()
+        entries = self.scan()
+        pinned = self.get_pinned()
+
+        deletions = {}
+
+        def is_pinned(entry):
+            if entry['archive']:
+                # A daily archive goes as a whole, so one pinned capture inside keeps it; so does being unreadable
+                return entry['members'] is None or not pinned.isdisjoint(entry['members'])
+            return entry['filename'] in pinned
+
+        def mark(entry, reason):
+            if entry['path'] not in deletions and not is_pinned(entry):
+                deletions[entry['path']] = dict(entry, reason=reason)
+
+        # Maximum age
+        if policy.max_age_days is not None:
+            cutoff = now - policy.max_age_days * 24 * 60 * 60
+            for entry in entries:
+                if entry['captured'] < cutoff:
+                    mark(entry, 'max_age')
+
+        # Keep only the newest N per URL/device/mode
+        if policy.keep_last is not None:
+            groups = {}
+            for entry in entries:
+                if entry['group'] is not None and entry['filename'] not in pinned:
+                    groups.setdefault(entry['group'], []).append(entry)
+            for group_entries in groups.values():
+                group_entries.sort(key=lambda e: e['captured'], reverse=True)
+                for entry in group_entries[policy.keep_last:]:
+                    mark(entry, 'keep_last')
+
+        # Total-bytes quota
+        remaining = [e for e in entries if e['path'] not in deletions]
+        total_after = sum(e['size'] for e in remaining)
+        if policy.max_total_bytes is not None and total_after > policy.max_total_bytes:
+            sort_key = 'atime' if policy.eviction == 'lru' else 'captured'
+            for entry in sorted(remaining, key=lambda e: e[sort_key]):
+                if total_after <= policy.max_total_bytes:
+                    break
+                if is_pinned(entry):
+                    continue
+                mark(entry, 'quota')
+                total_after -= entry['size']
+
+        # Cold tier for what survives
+        cold = []
+        if policy.cold_after_days is not None:
+            cold_cutoff = now - policy.cold_after_days * 24 * 60 * 60
+            for entry in entries:
+                if (entry['path'] not in deletions and not entry['archive']
+                        and entry['filename'] not in pinned and entry['captured'] < cold_cutoff):
+                    if policy.cold_tier == 'webp' and not entry['filename'].endswith('.png'):
+                        continue
+                    cold.append(dict(entry, tier=policy.cold_tier))
+
+        bytes_before = sum(e['size'] for e in entries)
+        bytes_freed = sum(e['size'] for e in deletions.values())
+        reasons = {}
+        for entry in deletions.values():
+            reasons[entry['reason']] = reasons.get(entry['reason'], 0) + 1
+
+        return {
+            'delete': sorted(deletions.values(), key=lambda e: e['captured']),
+            'cold': cold,
+            'pinned': len(pinned),
+            'files_scanned': len(entries),
+            'bytes_before': bytes_before,
+            'bytes_freed': bytes_freed,
+            'bytes_after': bytes_before - bytes_freed,
+            'delete_reasons': reasons
+        }
+
+    def apply(self, policy: RetentionPolicy, dry_run: bool = True,
+              progress_callback: Optional[callable] = None) -> Dict:
+        """
+        Apply a retention policy
+        Args:
+            policy: Rules to apply
+            dry_run: Only report what would happen
+            progress_callback: Optional callback for progress updates
+        Returns: Plan dictionary extended with 'dry_run', 'deleted', 'cold_moved' and 'errors'
+        """
+        report = self.plan(policy)
+        report.update({'dry_run': dry_run, 'deleted': 0, 'cold_moved': 0, 'errors': []})
+
+        if dry_run:
+            return report
+
+        if progress_callback:
+            progress_callback(f"Deleting {len(report['delete'])} screenshots...")
+
+        def delete(entry):
+            try:
+                os.remove(entry['path'])
+                return None
+            except OSError as e:
+                return f"Failed to delete {entry['path']}: {e}"
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for error in executor.map(delete, report['delete']):
+                if error:
+                    report['errors'].append(error)
+                else:
+                    report['deleted'] += 1
+
+        if report['cold']:
+            if progress_callback:
+                progress_callback(f"Moving {len(report['cold'])} screenshots to cold storage...")
+            self._apply_cold_tier(report)
+
+        # Drop stored objects that no capture links to any more
+        report['store_gc'] = ContentStore(self.screenshots_dir).gc()
+
+        return report
+
+    def _apply_cold_tier(self, report: Dict):
+        """Move planned entries to the cold tier in parallel"""
+        webp_entries = [e for e in report['cold'] if e['tier'] == 'webp']
+        # Deduplicated captures share one file; convert it once and relink the rest
+        webp_aliases = group_by_inode([e['path'] for e in webp_entries])
+        webp_entries = [e for e in webp_entries if e['path'] in webp_aliases]
+        archive_groups = {}
+        for entry in report['cold']:
+            if entry['tier'] == 'archive':
+                archive_path = self.cold_storage.archive_name_for(entry['path'])
+                archive_groups.setdefault(archive_path, []).append(entry['path'])
+
+        def to_webp(entry):
+            try:
+                webp_path = self.cold_storage.to_webp(entry['path'])
+                aliases = link_aliases(webp_path, webp_aliases[entry['path']])
+                return 1 + len(aliases), None
+            except Exception as e:
+                return 0, f"Failed to recompress {entry['path']}: {e}"
+
+        def pack(item):
+            archive_path, paths = item
+            try:
+                return len(self.cold_storage.pack(archive_path, paths)), None
+            except Exception as e:
+                return 0, f"Failed to archive into {archive_path}: {e}"
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            outcomes = list(executor.map(to_webp, webp_entries))
+            outcomes += list(executor.map(pack, archive_groups.items()))
+
+        for moved, error in outcomes:
+            report['cold_moved'] += moved
+            if error:
+                report['errors'].append(error)
+
+
+def format_retention_report(report: Dict) -> str:
+    """Human readable summary of a retention plan or run"""
+    mb = 1024 * 1024
+    lines = [
+        f"{'Dry run' if report.get('dry_run', True) else 'Applied'}: "
+        f"{report['files_scanned']} files, {report['bytes_before'] / mb:.1f} MB",
+        f"Delete: {len(report['delete'])} files ({report['bytes_freed'] / mb:.1f} MB)"
+    ]
+    for reason, count in sorted(report['delete_reasons'].items()):
+        lines.append(f"  {reason}: {count}")
+    lines.append(f"Cold tier: {len(report['cold'])} files")
+    lines.append(f"Pinned: {report['pinned']}")
+    lines.append(f"Size after: {report['bytes_after'] / mb:.1f} MB")
+    if not report.get('dry_run', True):
+        lines.append(f"Deleted: {report['deleted']}, moved to cold tier: {report['cold_moved']}")
+    for error in report.get('errors', []):
+        lines.append(f"Error: {error}")
+    return '\n'.join(lines)
@@ -0,0 +1,308 @@
+import os
+from html import escape
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from report_writer import (PAGE_SIZE, REPORT_CSS, STYLESHEET_FILENAME, page_slug,
+                           render_change_regions, render_page_head)
+from run_manifest import RunManifest
+from thumbnails import html_url, report_thumbnails, thumbnail_img_attributes
+from visual_diff import compare_images
+
+
+RUN_DIFF_CSS = """
+.pair-images {
+    display: grid;
+    grid-template-columns: 1fr 1fr;
+    gap: 10px;
+    padding: 15px;
+    text-align: center;
+}
+.pair-label {
+    color: #6c757d;
+    font-size: 0.85em;
+    margin-bottom: 5px;
+}
+.pair-links {
+    padding: 0 15px 15px;
+    font-size: 0.9em;
+}
+"""
+
+
+def pair_key(record: Dict) -> Tuple[str, str, str]:
+    """Join key of a manifest result: URL, device and screenshot mode"""
+    return record['url'], record['device'], record.get('screenshot_mode') or 'full_page'
+
+
+def _pair_image(label: str, ref: str, report_dir: str, variants, region_boxes: str = '') -> str:
+    full_url = html_url(ref, report_dir)
+    img_attributes = (thumbnail_img_attributes(variants, report_dir, sizes='(max-width: 800px) 50vw, 300px')
+                      if variants else f'src="{full_url}" loading="lazy" decoding="async"')
+    return f"""
+                                <div>
+                                    <div class="pair-label">{label}</div>
+                                    <div class="diff-frame">
+                                        <a href="{full_url}" target="_blank" title="Open full-size capture">
+                                            <img {img_attributes} alt="{label}" class="screenshot">
+                                        </a>
+                                        {region_boxes}
+                                    </div>
+                                </div>"""
+
+
+def render_pair_card(pair: Dict, report_dir: str, thumbnails: Dict) -> str:
+    """HTML card for a changed pair: before and after side by side, change regions on the after image"""
+    url, device, mode = pair['key']
+    diff = pair['diff']
+    diff_summary, region_boxes = render_change_regions(diff)
+    if diff.get('size_mismatch'):
+        diff_summary += '<div class="diff-summary">Page size changed</div>'
+    overlay_link = (f'<a href="{html_url(diff["overlay_path"], report_dir)}" target="_blank">Diff overlay</a>'
+                    if diff.get('overlay_path') else '')
+    return f"""
+                        <div class="device-card">
+                            <div class="device-header">
+                                <div class="device-name">{escape(device)} • {escape(mode)}</div>
+                                <div class="device-info">{escape(url)}</div>
+                                {diff_summary}
+                            </div>
+                            <div class="pair-images">{
+        _pair_image('Before', pair['before'], report_dir, thumbnails.get(pair['before']))}{
+        _pair_image('After', pair['after'], report_dir, thumbnails.get(pair['after']), region_boxes)}
+                            </div>
+                            <div class="pair-links">{overlay_link}</div>
+                        </div>
+        """
+
+
+class RunDiffWriter:
+    """Report of what changed between two runs
+
+    Results are joined by URL + device + screenshot mode. Pairs with equal
+    pixel hashes are identical and never decoded; only pairs whose hashes
+    differ are pixel-diffed (in parallel), and only those with a visible
+    change get a card. Everything else is summarised in tables, so review
+    effort scales with the number of changes rather than the run size.
+    """
+
+    def __init__(self, screenshots_dir: str, output_dir: str, channel_tolerance=0,
+                 page_size: int = PAGE_SIZE, workers: int = 4):
+        """
+        Args:
+            screenshots_dir: Screenshots directory holding the thumbnail cache
+            output_dir: Directory for index.html, change pages and diff overlays
+            channel_tolerance: Allowed per-channel difference, one value or (r, g, b[, a])
+            page_size: Changed pairs per page
+            workers: Pairs diffed in parallel
+        """
+        self.screenshots_dir = screenshots_dir
+        self.output_dir = output_dir
+        self.channel_tolerance = channel_tolerance
+        self.page_size = page_size
+        self.workers = workers
+
+    def write(self, baseline: RunManifest, candidate: RunManifest,
+              progress_callback: Optional[callable] = None) -> str:
+        """
+        Compare two runs
+        Args:
+            baseline: Earlier run
+            candidate: Later run
+            progress_callback: Optional callback for progress updates
+        Returns: Path of the index page
+        """
+        os.makedirs(os.path.join(self.output_dir, 'diffs'), exist_ok=True)
+        with open(os.path.join(self.output_dir, STYLESHEET_FILENAME), 'w', encoding='utf-8') as f:
+            f.write(REPORT_CSS + RUN_DIFF_CSS)
+
+        joined = self._join(baseline, candidate)
+        if progress_callback:
+            progress_callback(f"{len(joined['differ'])} of {joined['compared']} pairs differ by hash; diffing...")
+
+        changed = []
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pairs = executor.map(lambda job: self._diff_pair(baseline, candidate, job), joined['differ'])
+            for done, pair in enumerate(pairs, 1):
+                if pair['diff'] is None:
+                    # Not compared at all: neither changed nor unchanged
+                    joined['failed'].append((pair['key'], 'comparison', pair['note']))
+                elif pair['diff']['mismatch_pixels']:
+                    changed.append(pair)
+                else:
+                    # Different bytes but nothing beyond tolerance: list it, don't show it
+                    joined['unchanged'].append((pair['key'], pair['note']))
+                if progress_callback:
+                    progress_callback(f"Diffed {done}/{len(joined['differ'])} changed pairs")
+
+        # Largest changes first
+        changed.sort(key=lambda pair: pair['diff']['mismatch_percent'], reverse=True)
+        pages = [changed[start:start + self.page_size] for start in range(0, len(changed), self.page_size)]
+        for number, page in enumerate(pages, 1):
+            if progress_callback:
+                progress_callback(f"Writing change page {number}/{len(pages)}")
+            self._write_page(page, number, len(pages))
+        self._write_unchanged(joined['unchanged'])
+        return self._write_index(baseline, candidate, joined, changed)
+
+    def _join(self, baseline: RunManifest, candidate: RunManifest) -> Dict:
+        """
+        Pair the runs' results from one streaming pass over each manifest
+        Returns: Pairs to diff, identical pairs, and results only one run has or that failed (diffs that fail join these)
+        """
+        # Only the join keys, hashes and offsets of the baseline are kept in memory
+        before = {}
+        for offset, record in baseline.iter_records():
+            before[pair_key(record)] = (offset, record.get('success'), record.get('pixel_hash'))
+
+        joined = {'compared': 0, 'differ': [], 'unchanged': [], 'added': [], 'failed': []}
+        for offset, record in candidate.iter_records():
+            key = pair_key(record)
+            previous = before.pop(key, None)
+            if previous is None:
+                joined['added'].append((key, 'success' if record.get('success') else 'failed'))
+                continue
+            before_offset, before_success, before_hash = previous
+            if not record.get('success'):
+                joined['failed'].append((key, candidate.run_id, record.get('error') or ''))
+                continue
+            if not before_success:
+                joined['failed'].append((key, baseline.run_id, ''))
+                continue
+            joined['compared'] += 1
+            if before_hash and before_hash == record.get('pixel_hash'):
+                joined['unchanged'].append((key, 'identical'))
+            else:
+                joined['differ'].append((key, before_offset, offset))
+        joined['removed'] = list(before)
+        return joined
+
+    def _diff_pair(self, baseline: RunManifest, candidate: RunManifest, job: Tuple) -> Dict:
+        """Pixel-diff one pair whose hashes differ, writing its overlay next to the report"""
+        key, before_offset, after_offset = job
+        pair = {'key': key, 'before': None, 'after': None, 'diff': None, 'note': ''}
+        overlay_path = os.path.join(self.output_dir, 'diffs', f"{page_slug('|'.join(key))}.png")
+        try:
+            pair['before'] = next(baseline.read_at([before_offset]))['screenshot_path']
+            pair['after'] = next(candidate.read_at([after_offset]))['screenshot_path']
+            # Pairs already run in parallel; one band thread each avoids oversubscribing the CPU
+            pair['diff'] = compare_images(pair['before'], pair['after'], self.channel_tolerance,
+                                          overlay_path=overlay_path, workers=1)
+            pair['note'] = 'within tolerance'
+        except Exception as e:
+            print(f"Error diffing {' / '.join(key)}: {e}")
+            pair['note'] = f'diff failed: {e}'
+        return pair
+
+    def _page_filename(self, number: int) -> str:
+        return f"changes_{number}.html"
+
+    def _write_page(self, pairs: List[Dict], number: int, count: int):
+        """One page of changed-pair cards"""
+        thumbnails = report_thumbnails(
+            self.screenshots_dir, [ref for pair in pairs for ref in (pair['before'], pair['after'])],
+            max_workers=self.workers)
+
+        previous_link = (f'<a href="{self._page_filename(number - 1)}">&larr; Previous</a>'
+                         if number > 1 else '<span></span>')
+        next_link = (f'<a href="{self._page_filename(number + 1)}">Next &rarr;</a>'
+                     if number < count else '<span></span>')
+
+        with open(os.path.join(self.output_dir, self._page_filename(number)), 'w', encoding='utf-8') as f:
+            f.write(render_page_head("Changed captures", f"Page {number} of {count}"))
+            f.write(f"""        <div class="nav">
+            {previous_link}
+            <a href="index.html">Run comparison</a>
+            {next_link}
+        </div>
+        <div class="content">
+            <div class="device-grid">
+""")
+            for pair in pairs:
+                f.write(render_pair_card(pair, self.output_dir, thumbnails))
+            f.write("""            </div>
+        </div>
+    </div>
+</body>
+</html>
+""")
+
+    def _write_table(self, f, headings: List[str], rows):
+        f.write('            <table class="summary-table">\n                <tr>' +
+                ''.join(f'<th>{heading}</th>' for heading in headings) + '</tr>\n')
+        for row in rows:
+            f.write('                <tr>' + ''.join(f'<td>{escape(str(cell))}</td>' for cell in row) + '</tr>\n')
+        f.write('            </table>\n')
+
+    def _write_unchanged(self, unchanged: List[Tuple]):
+        """Table of pairs without visible changes"""
+        with open(os.path.join(self.output_dir, 'unchanged.html'), 'w', encoding='utf-8') as f:
+            f.write(render_page_head("Unchanged captures", f"{len(unchanged)} pairs"))
+            f.write("""        <div class="nav">
+            <span></span>
+            <a href="index.html">Run comparison</a>
+            <span></span>
+        </div>
+        <div class="content">
+""")
+            self._write_table(f, ['URL', 'Device', 'Mode', 'Result'],
+                              (key + (note,) for key, note in unchanged))
+            f.write("""        </div>
+    </div>
+</body>
+</html>
+""")
+
+    def _write_index(self, baseline: RunManifest, candidate: RunManifest, joined: Dict,
+                     changed: List[Dict]) -> str:
+        """Summary page: counts, a table of changed pairs and everything that could not be compared"""
+        index_path = os.path.join(self.output_dir, 'index.html')
+        with open(index_path, 'w', encoding='utf-8') as f:
+            f.write(render_page_head("ScreenQA Run Comparison",
+                                     f"{baseline.run_id} → {candidate.run_id}"))
+            f.write('        <div class="stats">\n')
+            for value, label, style in ((joined['compared'], 'Compared', ''),
+                                        (len(changed), 'Changed', ' error'),
+                                        (len(joined['unchanged']), 'Unchanged', ' success'),
+                                        (len(joined['added']), 'New', ''),
+                                        (len(joined['removed']), 'Missing', ''),
+                                        (len(joined['failed']), 'Failed', ' error')):
+                f.write(f'            <div class="stat"><div class="stat-number{style}">{value}</div>'
+                        f'<div class="stat-label">{label}</div></div>\n')
+            f.write('        </div>\n        <div class="content">\n')
+
+            f.write(f'            <h2>Changed ({len(changed)})</h2>\n')
+            f.write('            <table class="summary-table">\n                <tr><th>URL</th><th>Device</th>'
+                    '<th>Mode</th><th>Changed</th><th>Regions</th><th>Page</th></tr>\n')
+            for position, pair in enumerate(changed):
+                url, device, mode = pair['key']
+                page = self._page_filename(position // self.page_size + 1)
+                f.write(f"""                <tr><td>{escape(url)}</td><td>{escape(device)}</td><td>{escape(mode)}</td>
+                    <td class="error">{pair['diff']['mismatch_percent']:.2f}%</td>
+                    <td>{pair['diff'].get('regions_total', 0)}</td><td><a href="{page}">View</a></td></tr>
+""")
+            f.write('            </table>\n')
+
+            f.write(f'            <h2>Unchanged ({len(joined["unchanged"])})</h2>\n'
+                    f'            <p><a href="unchanged.html">List unchanged captures</a></p>\n')
+            if joined['added']:
+                f.write(f'            <h2>Only in {escape(candidate.run_id)} ({len(joined["added"])})</h2>\n')
+                self._write_table(f, ['URL', 'Device', 'Mode', 'Result'],
+                                  (key + (outcome,) for key, outcome in joined['added']))
+            if joined['removed']:
+                f.write(f'            <h2>Only in {escape(baseline.run_id)} ({len(joined["removed"])})</h2>\n')
+                self._write_table(f, ['URL', 'Device', 'Mode'], joined['removed'])
+            if joined['failed']:
+                f.write(f'            <h2>Failed captures and comparisons ({len(joined["failed"])})</h2>\n')
+                self._write_table(f, ['URL', 'Device', 'Mode', 'Failed in', 'Error'],
+                                  (key + (side, error) for key, side, error in joined['failed']))
+
+            f.write(f"""        </div>
+        <div class="footer">
+            Generated by ScreenQA • {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+        </div>
+    </div>
+</body>
+</html>
+""")
+        return index_path
@@ -0,0 +1,194 @@
+import os
+import json
+import threading
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+RUNS_DIRNAME = 'runs'
+
+
+class RunManifest:
+    """Append-only JSONL record of one capture run
+
+    The first line is a header describing the run; every following line is
+    one URL x device result. Lines are appended and flushed as results
+    arrive, and readers stream them back one at a time, so neither side ever
+    holds a whole run in memory. Device profiles are stored once in the
+    header and results refer to them by device name; readers fill in
+    ``device_info`` from there.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._profiles = None
+        self._tail_checked = False
+
+    @classmethod
+    def create(cls, screenshots_dir: str, run_id: Optional[str] = None, **info) -> 'RunManifest':
+        """
+        Start a new run manifest under screenshots/runs
+        Args:
+            screenshots_dir: Screenshots directory
+            run_id: Run identifier (defaults to the start timestamp)
+            info: Extra header fields (screenshot mode, device profiles by name, ...)
+        Returns: Manifest ready for appending results
+        """
+        started = datetime.now()
+        run_id = run_id or started.strftime('run_%Y%m%d_%H%M%S')
+        runs_dir = os.path.join(screenshots_dir, RUNS_DIRNAME)
+        os.makedirs(runs_dir, exist_ok=True)
+
+        manifest = cls(os.path.join(runs_dir, f'{run_id}.jsonl'))
+        header = dict(info, type='run', run_id=run_id, started=started.isoformat(timespec='seconds'))
+        with open(manifest.path, 'x', encoding='utf-8') as f:
+            f.write(json.dumps(header) + '\n')
+        return manifest
+
+    @classmethod
+    def list_runs(cls, screenshots_dir: str) -> List[Dict]:
+        """Headers of all recorded runs, newest first, each with its manifest path"""
+        runs_dir = os.path.join(screenshots_dir, RUNS_DIRNAME)
+        if not os.path.isdir(runs_dir):
+            return []
+
+        runs = []
+        for name in os.listdir(runs_dir):
+            if name.endswith('.jsonl'):
+                path = os.path.join(runs_dir, name)
+                header = cls(path).header()
+                if header:
+                    runs.append(dict(header, path=path))
+        runs.sort(key=lambda run: run.get('started', ''), reverse=True)
+        return runs
+
+    @classmethod
+    def latest(cls, screenshots_dir: str) -> Optional['RunManifest']:
+        """Most recently started run, finished or not"""
+        runs = cls.list_runs(screenshots_dir)
+        return cls(runs[0]['path']) if runs else None
+
+    @property
+    def run_id(self) -> str:
+        return os.path.splitext(os.path.basename(self.path))[0]
+
+    def header(self) -> Optional[Dict]:
+        """Run header (first line), or None for an empty or unreadable manifest"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.loads(f.readline())
+        except (OSError, ValueError):
+            return None
+
+    def append(self, url: str, device_name: str, result: Dict):
+        """Record one result; the line is on disk when this returns"""
+        record = dict(result, type='result', url=url, device=device_name)
+        # The profile lives in the header; the device name is the reference
+        record.pop('device_info', None)
+        self._write(record)
+
+    def append_attempt(self, url: str, device_name: str, error: str, attempt: int):
+        """Record a failed attempt that will be retried; only the final outcome is a result"""
+        self._write({'type': 'attempt', 'url': url, 'device': device_name, 'error': error, 'attempt': attempt})
+
+    def finish(self, **info):
+        """Mark the run as finished; a manifest without this line is a partial run"""
+        self._write(dict(info, type='end', finished=datetime.now().isoformat(timespec='seconds')))
+
+    def _write(self, record: Dict):
+        line = json.dumps(record, default=str) + '\n'
+        with self._lock:
+            if not self._tail_checked:
+                self._drop_torn_tail()
+                self._tail_checked = True
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+                # Survive a host crash, not just a process crash: the manifest is what a resume starts from
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _drop_torn_tail(self):
+        """Cut a partial last line left by a crash, so the next record does not run onto it"""
+        with open(self.path, 'rb+') as f:
+            end = f.seek(0, os.SEEK_END)
+            position = end
+            while position > 0:
+                start = max(0, position - 4096)
+                f.seek(start)
+                newline = f.read(position - start).rfind(b'\n')
+                if newline >= 0:
+                    position = start + newline + 1
+                    break
+                position = start
+            if position < end:
+                f.truncate(position)
+
+    def add_results(self, url: str, results: Dict[str, Dict]):
+        """Record a {device: result} dictionary for one URL"""
+        for device_name, result in results.items():
+            self.append(url, device_name, result)
+
+    def iter_records(self, types: Tuple[str, ...] = ('result',)) -> Iterator[Tuple[int, Dict]]:
+        """Stream (byte offset, record) pairs of the given types; a torn last line from a crashed run is skipped"""
+        with open(self.path, 'rb') as f:
+            while True:
+                offset = f.tell()
+                line = f.readline()
+                if not line:
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get('type') in types:
+                    yield offset, record
+
+    def job_states(self) -> Dict[Tuple[str, str], Dict]:
+        """
+        Where every recorded URL x device job stands, for resuming the run
+        Returns: (url, device) -> {'success': bool or None while only retries are recorded, 'attempts': int}
+        """
+        states = {}
+        for _, record in self.iter_records(('result', 'attempt')):
+            state = states.setdefault((record['url'], record['device']), {'success': None, 'attempts': 0})
+            if record['type'] == 'attempt':
+                state['attempts'] = max(state['attempts'], record.get('attempt', 0))
+            else:
+                state['attempts'] = max(state['attempts'] + 1, record.get('attempts', 0))
+                state['success'] = bool(record.get('success'))
+        return states
+
+    def is_finished(self) -> bool:
+        """Whether the run recorded its end line (runs cut short have none)"""
+        return any(True for _ in self.iter_records(('end',)))
+
+    def iter_results(self) -> Iterator[Dict]:
+        """Stream results in the order they were recorded, with their device profiles"""
+        for _, record in self.iter_records():
+            yield self.resolve(record)
+
+    def read_at(self, offsets: List[int]) -> Iterator[Dict]:
+        """Read specific results back by the byte offsets iter_records() reported"""
+        with open(self.path, 'rb') as f:
+            for offset in offsets:
+                f.seek(offset)
+                yield self.resolve(json.loads(f.readline()))
+
+    def resolve(self, record: Dict) -> Dict:
+        """Fill in a result's device_info from the profile the header holds for its device"""
+        if 'device_info' not in record:
+            if self._profiles is None:
+                self._profiles = (self.header() or {}).get('devices') or {}
+            record['device_info'] = self._profiles.get(record.get('device'), {})
+        return record
+
+    def results(self, url: Optional[str] = None) -> Dict[str, Dict]:
+        """
+        Results by device, the shape single-URL captures were always reported in
+        Args:
+            url: Only this URL's results (defaults to all; a later result for a device replaces an earlier one)
+        Returns: Dictionary with results for each device
+        """
+        return {record['device']: record for record in self.iter_results()
+                if url is None or record['url'] == url}
@@ -2,15 +2,18 @@ import os
 import json
 import time
 from datetime import datetime
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from webdriver_manager.chrome import ChromeDriverManager
 from PIL import Image
-import requests
 from urllib.parse import urlparse
 import threading
-from typing import Dict, List, Tuple, Optional
+from typing import TYPE_CHECKING, Dict, List, Tuple, Optional
+from content_store import ContentStore
+from capture_pipeline import CapturePipeline, CaptureFrame
+from history_index import HistoryIndex
+from masking import MaskConfig, resolve_masks
+from run_manifest import RunManifest
+
+if TYPE_CHECKING:
+    from selenium import webdriver
 
 
 class ScreenshotCapture:
@@ -18,6 +21,11 @@ class ScreenshotCapture:
         self.devices = self.load_devices()
         self.screenshots_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'screenshots')
         self.ensure_directories()
+        self.content_store = ContentStore(self.screenshots_dir)
+        self.pipeline = CapturePipeline(self.screenshots_dir, self.content_store)
+        self.history_index = HistoryIndex(self.screenshots_dir, content_store=self.content_store)
+        self.mask_config = MaskConfig.load(
+            os.path.join(os.path.dirname(os.path.dirname(__file__)), 'config', 'masks.json'))
         
     def load_devices(self) -> Dict:
         """Load device configurations from JSON file"""
@@ -34,8 +42,14 @@ class ScreenshotCapture:
         if not os.path.exists(self.screenshots_dir):
             os.makedirs(self.screenshots_dir)
     
-    def create_webdriver(self, device_config: Dict) -> webdriver.Chrome:
+    def create_webdriver(self, device_config: Dict) -> 'webdriver.Chrome':
         """Create a Chrome WebDriver instance with specific device configuration"""
+        # Selenium and webdriver_manager load on the first capture, not at application startup
+        from selenium import webdriver
+        from selenium.webdriver.chrome.service import Service
+        from selenium.webdriver.chrome.options import Options
+        from webdriver_manager.chrome import ChromeDriverManager
+        
         chrome_options = Options()
         
         # Add common options for better screenshot quality
@@ -83,8 +97,32 @@ class ScreenshotCapture:
             screenshot_mode: "full_page", "viewport_only", or "auto"
         Returns: (success, screenshot_path, error_message)
         """
+        success, frame, error = self.capture_frame(url, device_name, progress_callback, screenshot_mode)
+        if not success:
+            return False, "", error
+        
+        try:
+            self.pipeline.wait(frame)
+        except Exception as e:
+            return False, "", f"Error saving screenshot for {device_name}: {str(e)}"
+        self._report_stored(frame, progress_callback)
+        return True, frame.filepath, ""
+    
+    def _report_stored(self, frame: CaptureFrame, progress_callback: Optional[callable]):
+        """Tell the user a written capture matched stored pixels, from the flag the content store returned"""
+        if progress_callback and frame.results.get('deduplicated'):
+            progress_callback(f"Screenshot unchanged, stored once: {frame.filename}")
+    
+    def capture_frame(self, url: str, device_name: str,
+                      progress_callback: Optional[callable] = None,
+                      screenshot_mode: str = "full_page",
+                      run_id: Optional[str] = None) -> Tuple[bool, Optional[CaptureFrame], str]:
+        """
+        Capture a screenshot into the in-memory pipeline; the file is written in the background
+        Returns: (success, frame, error_message)
+        """
         if device_name not in self.devices['devices']:
-            return False, "", f"Device '{device_name}' not found in configuration"
+            return False, None, f"Device '{device_name}' not found in configuration"
         
         device_config = self.devices['devices'][device_name]
         driver = None
@@ -100,7 +138,9 @@ class ScreenshotCapture:
                 progress_callback(f"Loading {url}...")
             
             # Navigate to URL
+            started = time.time()
             driver.get(url)
+            load_seconds = time.time() - started
             
             # Wait for page to load
             time.sleep(3)
@@ -113,7 +153,9 @@ class ScreenshotCapture:
                 progress_callback(f"Capturing screenshot for {device_name}...")
             
             # Create filename with mode indicator
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            captured_at = datetime.now()
+            capture_started = time.time()
+            timestamp = captured_at.strftime("%Y%m%d_%H%M%S")
             domain = urlparse(url).netloc or "unknown_site"
             safe_device_name = device_name.replace(" ", "_").replace("\"", "")
             mode_suffix = f"_{screenshot_mode}" if screenshot_mode != "full_page" else ""
@@ -123,7 +165,7 @@ class ScreenshotCapture:
             # Capture screenshot based on mode
             if screenshot_mode == "viewport_only":
                 # Capture only visible viewport
-                driver.save_screenshot(screenshot_path)
+                png_bytes = driver.get_screenshot_as_png()
                 
             elif screenshot_mode == "full_page":
                 # Capture full page height
@@ -141,10 +183,10 @@ class ScreenshotCapture:
                     # Set window to full page height and capture
                     driver.set_window_size(device_config['width'], full_height)
                     time.sleep(1)
-                    driver.save_screenshot(screenshot_path)
+                    png_bytes = driver.get_screenshot_as_png()
                 else:
                     # Page fits in viewport, just take regular screenshot
-                    driver.save_screenshot(screenshot_path)
+                    png_bytes = driver.get_screenshot_as_png()
                     
             elif screenshot_mode == "auto":
                 # Auto-detect: capture full page if content extends beyond viewport
@@ -163,27 +205,60 @@ class ScreenshotCapture:
                 if full_height > viewport_height * 1.2:  # 20% threshold
                     driver.set_window_size(device_config['width'], full_height)
                     time.sleep(1)
-                    driver.save_screenshot(screenshot_path)
+                    png_bytes = driver.get_screenshot_as_png()
                     if progress_callback:
                         progress_callback(f"Auto-detected long content, captured full page ({full_height}px)")
                 else:
-                    driver.save_screenshot(screenshot_path)
+                    png_bytes = driver.get_screenshot_as_png()
                     if progress_callback:
                         progress_callback(f"Auto-detected short content, captured viewport only")
             else:
                 # Default to viewport only for unknown modes
-                driver.save_screenshot(screenshot_path)
+                png_bytes = driver.get_screenshot_as_png()
+            
+            capture_seconds = time.time() - capture_started
+            
+            # Resolve mask selectors while the page still has the layout that was captured
+            masks = resolve_masks(driver, self.mask_config.for_url(url))
+            if masks:
+                masks['fill'] = self.mask_config.fill
+            metadata = {
+                'filename': filename,
+                'url': url,
+                'domain': domain,
+                'device': device_name,
+                'screenshot_mode': screenshot_mode,
+                'captured': captured_at.isoformat(timespec='seconds'),
+                'viewport': {'width': device_config['width'], 'height': device_config['height']},
+                'device_pixel_ratio': driver.execute_script("return window.devicePixelRatio;"),
+                'user_agent': device_config.get('user_agent', ''),
+                'run_id': run_id,
+                'timings': {
+                    'load_ms': round(load_seconds * 1000),
+                    'capture_ms': round(capture_seconds * 1000)
+                }
+            }
+            
+            # Hash, thumbnail and inspect in memory; the single file write happens in the background
+            frame = self.pipeline.process(png_bytes, screenshot_path, {
+                'url': url,
+                'device': device_name,
+                'screenshot_mode': screenshot_mode,
+                'metadata': metadata,
+                'masks': masks
+            })
             
+            # Whether it was a duplicate is only known once the store has written it (see _report_stored)
             if progress_callback:
-                progress_callback(f"Screenshot saved: {filename}")
+                progress_callback(f"Screenshot captured: {filename}")
             
-            return True, screenshot_path, ""
+            return True, frame, ""
             
         except Exception as e:
             error_msg = f"Error capturing screenshot for {device_name}: {str(e)}"
             if progress_callback:
                 progress_callback(error_msg)
-            return False, "", error_msg
+            return False, None, error_msg
             
         finally:
             if driver:
@@ -191,38 +266,82 @@ class ScreenshotCapture:
     
     def capture_multiple_devices(self, url: str, selected_devices: List[str], 
                                progress_callback: Optional[callable] = None,
-                               screenshot_mode: str = "full_page") -> Dict:
+                               screenshot_mode: str = "full_page",
+                               manifest: Optional[RunManifest] = None) -> RunManifest:
         """
-        Capture screenshots for multiple devices
+        Capture screenshots for multiple devices, recording each result as soon as it is on disk
         Args:
             url: Website URL to capture
             selected_devices: List of device names to capture
             progress_callback: Optional callback for progress updates
             screenshot_mode: "full_page", "viewport_only", or "auto"
-        Returns: Dictionary with results for each device
+            manifest: Run to record into (defaults to a new run under screenshots/runs)
+        Returns: Run manifest; manifest.results() gives the results for each device
         """
-        results = {}
+        if manifest is None:
+            manifest = RunManifest.create(
+                self.screenshots_dir, url=url, screenshot_mode=screenshot_mode,
+                devices={name: self.devices['devices'][name] for name in selected_devices
+                         if name in self.devices['devices']})
+        recorded = []
         total_devices = len(selected_devices)
         
         for i, device_name in enumerate(selected_devices, 1):
             if progress_callback:
                 progress_callback(f"Processing device {i}/{total_devices}: {device_name}")
             
-            success, path, error = self.capture_screenshot(url, device_name, progress_callback, screenshot_mode)
-            results[device_name] = {
+            # File writes overlap with the next device's browser start-up
+            success, frame, error = self.capture_frame(url, device_name, progress_callback, screenshot_mode,
+                                                       manifest.run_id)
+            result = {
                 'success': success,
-                'screenshot_path': path,
+                'screenshot_path': frame.filepath if success else "",
                 'error': error,
-                'device_info': self.devices['devices'].get(device_name, {}),
                 'screenshot_mode': screenshot_mode
             }
+            if success:
+                recorded.append(self._record_when_written(manifest, url, device_name, frame, result,
+                                                          progress_callback))
+            else:
+                manifest.append(url, device_name, result)
             
             # Small delay between captures
             time.sleep(1)
         
-        return results
+        self.pipeline.flush()
+        for done in recorded:
+            done.wait()
+        manifest.finish()
+        return manifest
+    
+    def _record_when_written(self, manifest: RunManifest, url: str, device_name: str,
+                             frame: CaptureFrame, result: Dict,
+                             progress_callback: Optional[callable] = None) -> threading.Event:
+        """Append a capture's result to the run once its background write finishes; returns an event set after"""
+        done = threading.Event()
+        
+        def record(future):
+            try:
+                future.result()
+                result.update(frame.results)
+                self._report_stored(frame, progress_callback)
+            except Exception as e:
+                result.update({
+                    'success': False,
+                    'screenshot_path': "",
+                    'error': f"Error saving screenshot for {device_name}: {str(e)}"
+                })
+            try:
+                manifest.append(url, device_name, result)
+            except Exception as e:
+                print(f"Could not record {device_name} in {manifest.path}: {e}")
+            finally:
+                done.set()
+        
+        frame.write_future.add_done_callback(record)
+        return done
     
-    def capture_all_devices(self, url: str, progress_callback: Optional[callable] = None) -> Dict:
+    def capture_all_devices(self, url: str, progress_callback: Optional[callable] = None) -> RunManifest:
         """Capture screenshots for all available devices"""
         all_devices = list(self.devices['devices'].keys())
         return self.capture_multiple_devices(url, all_devices, progress_callback)
@@ -246,6 +365,8 @@ class ScreenshotCapture:
     
     def validate_url(self, url: str) -> Tuple[bool, str]:
         """Validate if URL is accessible"""
+        import requests
+        
         try:
             if not url.startswith(('http://', 'https://')):
                 url = 'https://' + url
@@ -261,36 +382,20 @@ class ScreenshotCapture:
     
     def get_screenshot_history(self) -> List[Dict]:
         """Get list of previously captured screenshots"""
-        screenshots = []
-        
         if not os.path.exists(self.screenshots_dir):
-            return screenshots
+            return []
         
-        for filename in os.listdir(self.screenshots_dir):
-            if filename.endswith('.png'):
-                filepath = os.path.join(self.screenshots_dir, filename)
-                stats = os.stat(filepath)
-                
-                # Parse filename to extract info
-                parts = filename.replace('.png', '').split('_')
-                if len(parts) >= 3:
-                    domain = parts[0]
-                    device = '_'.join(parts[1:-1])  # Device name might contain underscores
-                    timestamp = parts[-1]
-                    
-                    screenshots.append({
-                        'filename': filename,
-                        'filepath': filepath,
-                        'domain': domain,
-                        'device': device,
-                        'timestamp': timestamp,
-                        'size': stats.st_size,
-                        'created': datetime.fromtimestamp(stats.st_ctime).strftime('%Y-%m-%d %H:%M:%S')
-                    })
+        # Pending background writes must land before the directory is scanned
+        self.pipeline.flush()
         
-        # Sort by creation time (newest first)
-        screenshots.sort(key=lambda x: x['created'], reverse=True)
-        return screenshots
+        # Capture details come from metadata embedded in each file (including cold storage archives);
+        # only new or changed files are read
+        self.history_index.sync()
+        return self.history_index.query()
+    
+    def get_run_history(self) -> List[Dict]:
+        """Recorded capture runs, newest first, including runs that never finished"""
+        return RunManifest.list_runs(self.screenshots_dir)
 
 
 # Threading wrapper for async screenshot capture
@@ -311,9 +416,10 @@ class AsyncScreenshotCapture:
         def capture_thread():
             self.is_running = True
             try:
-                results = self.capture.capture_multiple_devices(url, selected_devices, progress_callback, screenshot_mode)
+                manifest = self.capture.capture_multiple_devices(url, selected_devices, progress_callback,
+                                                                 screenshot_mode)
                 if complete_callback:
-                    complete_callback(results)
+                    complete_callback(manifest)
             except Exception as e:
                 if progress_callback:
                     progress_callback(f"Error: {str(e)}")
@@ -1,15 +1,25 @@
 import os
 import json
 import shutil
+import warnings
 from datetime import datetime
 from typing import Dict, List, Tuple, Optional
-from PIL import Image, ImageDraw, ImageFont
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.lib.utils import ImageReader
-from reportlab.lib.colors import black, red, green
+from PIL import Image
+from retention import RetentionEngine, RetentionPolicy, ARCHIVE_SEPARATOR
+from capture_pipeline import open_image
+from history_index import HistoryIndex
+from visual_diff import compare_images
+from baseline_store import BaselineStore
+from color_analysis import color_profile
+from layout_similarity import reduce_for_layout, score_layouts
+from image_composer import TARGET_HEIGHT, compose
+from contact_sheet import contact_sheet
+from thumbnails import report_thumbnails
+from run_manifest import RunManifest
+from report_writer import PAGE_SIZE, REPORT_CSS, ReportWriter, render_device_card, page_slug
+from pdf_report import MAX_PAGES, PDFReportWriter
+from run_diff import RunDiffWriter
+from report_export import ReportExporter, WEBP_QUALITY
 
 
 class ScreenshotManager:
@@ -62,15 +72,12 @@ class ScreenshotManager:
         """Organize screenshots by device"""
         organized = {}
         
-        for filename in os.listdir(self.screenshots_dir):
-            if filename.endswith('.png'):
-                # Parse device from filename
-                parts = filename.replace('.png', '').split('_')
-                if len(parts) >= 3:
-                    device = '_'.join(parts[1:-1])  # Device name might contain underscores
-                    if device not in organized:
-                        organized[device] = []
-                    organized[device].append(filename)
+        # Device names come from embedded capture metadata rather than the filename
+        index = HistoryIndex(self.screenshots_dir)
+        index.sync()
+        for entry in index.query():
+            if os.path.dirname(entry['filepath']) == self.screenshots_dir:
+                organized.setdefault(entry['device'], []).append(entry['filename'])
         
         return organized
     
@@ -111,79 +118,49 @@ class ScreenshotManager:
     
     def cleanup_old_screenshots(self, days: int = 30) -> int:
         """Remove screenshots older than specified days"""
-        removed_count = 0
-        cutoff_time = datetime.now().timestamp() - (days * 24 * 60 * 60)
-        
-        for filename in os.listdir(self.screenshots_dir):
-            if filename.endswith('.png'):
-                filepath = os.path.join(self.screenshots_dir, filename)
-                if os.path.getctime(filepath) < cutoff_time:
-                    os.remove(filepath)
-                    removed_count += 1
-        
-        return removed_count
+        report = self.apply_retention(RetentionPolicy(max_age_days=days), dry_run=False)
+        return report['deleted']
+    
+    def apply_retention(self, policy: RetentionPolicy, dry_run: bool = True,
+                        progress_callback: Optional[callable] = None) -> Dict:
+        """Apply a retention policy (age, quota, keep-last-N, cold tier); dry run by default"""
+        engine = RetentionEngine(self.screenshots_dir)
+        return engine.apply(policy, dry_run=dry_run, progress_callback=progress_callback)
     
-    def create_comparison_image(self, screenshot_paths: List[str], 
-                              output_path: str, labels: List[str] = None) -> bool:
-        """Create side-by-side comparison of screenshots"""
+    def create_comparison_image(self, screenshot_paths: List, 
+                              output_path: str, labels: List[str] = None,
+                              columns: Optional[int] = None,
+                              target_height: Optional[int] = TARGET_HEIGHT,
+                              progress_callback: Optional[callable] = None) -> bool:
+        """
+        Create a side-by-side or grid comparison of screenshots (paths or in-memory capture frames)
+        Args:
+            screenshot_paths: Captures to compare
+            output_path: Where to save the comparison image
+            labels: Caption under each capture
+            columns: Captures per row (all in one row by default)
+            target_height: Each capture is scaled down to at most this height first
+            progress_callback: Optional callback for progress updates
+        Returns: True when the image was written
+        """
         try:
             if not screenshot_paths or len(screenshot_paths) < 2:
                 return False
             
-            # Load images
-            images = []
             for path in screenshot_paths:
-                if os.path.exists(path):
-                    img = Image.open(path)
-                    images.append(img)
-                else:
+                if isinstance(path, str) and not os.path.exists(path):
                     return False
             
-            if not images:
-                return False
-            
-            # Calculate dimensions for comparison
-            max_height = max(img.height for img in images)
-            total_width = sum(img.width for img in images)
-            
-            # Create comparison image
-            comparison = Image.new('RGB', (total_width, max_height + 50), 'white')
-            
-            x_offset = 0
-            for i, img in enumerate(images):
-                comparison.paste(img, (x_offset, 0))
-                
-                # Add label if provided
-                if labels and i < len(labels):
-                    draw = ImageDraw.Draw(comparison)
-                    label_text = labels[i]
-                    
-                    # Try to use a nice font, fall back to default
-                    try:
-                        font = ImageFont.truetype("arial.ttf", 16)
-                    except:
-                        font = ImageFont.load_default()
-                    
-                    text_bbox = draw.textbbox((0, 0), label_text, font=font)
-                    text_width = text_bbox[2] - text_bbox[0]
-                    
-                    # Center text under image
-                    text_x = x_offset + (img.width - text_width) // 2
-                    text_y = max_height + 10
-                    
-                    draw.text((text_x, text_y), label_text, fill='black', font=font)
-                
-                x_offset += img.width
-            
-            comparison.save(output_path)
+            compose(screenshot_paths, output_path, labels, columns=columns, target_height=target_height,
+                    progress_callback=progress_callback)
             return True
             
         except Exception as e:
             print(f"Error creating comparison: {e}")
             return False
     
-    def analyze_layout_differences(self, screenshot_paths: List[str]) -> Dict:
-        """Analyze layout differences between screenshots"""
+    def analyze_layout_differences(self, screenshot_paths: List) -> Dict:
+        """Analyze layout differences between screenshots (paths or in-memory capture frames)"""
         analysis = {
             'dimensions': [],
             'file_sizes': [],
@@ -191,9 +168,9 @@ class ScreenshotManager:
         }
         
         for path in screenshot_paths:
-            if os.path.exists(path):
+            if not isinstance(path, str) or os.path.exists(path):
                 try:
-                    img = Image.open(path)
+                    img = open_image(path)
                     
                     # Dimensions
                     analysis['dimensions'].append({
@@ -203,22 +180,80 @@ class ScreenshotManager:
                     })
                     
                     # File size
-                    analysis['file_sizes'].append(os.path.getsize(path))
+                    analysis['file_sizes'].append(os.path.getsize(path if isinstance(path, str) else path.filepath))
                     
-                    # Basic color analysis
-                    if img.mode == 'RGB':
-                        colors = img.getcolors(maxcolors=1000000)
-                        if colors:
-                            dominant_colors = sorted(colors, reverse=True)[:5]
-                            analysis['color_profiles'].append({
-                                'dominant_colors': [(count, color) for count, color in dominant_colors],
-                                'unique_colors': len(colors)
-                            })
+                    # Colour analysis on a downsampled, quantised view (any image mode)
+                    analysis['color_profiles'].append(color_profile(img))
                     
                 except Exception as e:
                     print(f"Error analyzing {path}: {e}")
         
+        analysis['layout_similarity'] = self.score_layout_consistency(
+            {str(index): path for index, path in enumerate(screenshot_paths)})
         return analysis
+    
+    def score_layout_consistency(self, screenshots: Dict) -> Dict:
+        """
+        Structural similarity of one URL's captures across devices
+        Args:
+            screenshots: Device name -> capture path or in-memory capture frame
+        Returns: score_layouts() result; 'outliers' lists devices whose layout diverges from the rest
+        """
+        images = {}
+        for device_name, path in screenshots.items():
+            if not isinstance(path, str) or os.path.exists(path):
+                try:
+                    # One full-size capture open at a time: shrink it, then close it before the next
+                    img = open_image(path)
+                    try:
+                        images[device_name] = reduce_for_layout(img)
+                    finally:
+                        if isinstance(path, str):
+                            img.close()
+                except Exception as e:
+                    print(f"Error loading {path}: {e}")
+        return score_layouts(images)
+
+    
+    def find_previous_capture(self, screenshot_path: str) -> Optional[str]:
+        """Most recent earlier capture of the same site, device and mode"""
+        index = HistoryIndex(self.screenshots_dir)
+        index.sync()
+        previous = index.previous_capture(screenshot_path)
+        return previous['filepath'] if previous else None
+    
+    def compare_with_baseline(self, screenshot_path: str, channel_tolerance=0,
+                              antialiasing: bool = True, max_mismatch_percent: float = 0.0) -> Optional[Dict]:
+        """Pixel-diff a capture against the approved baseline of its page and device, if any, with a pass/fail"""
+        stem = os.path.splitext(os.path.basename(screenshot_path))[0]
+        overlay_path = os.path.join(self.reports_dir, 'diffs', f'{stem}_baseline_diff.png')
+        result = BaselineStore(self.screenshots_dir).compare(
+            screenshot_path, max_mismatch_percent=max_mismatch_percent, channel_tolerance=channel_tolerance,
+            antialiasing=antialiasing, overlay_path=overlay_path)
+        if result is not None:
+            result['screenshot_path'] = screenshot_path
+        return result
+    
+    def compare_with_previous(self, screenshot_path: str, channel_tolerance=0,
+                              antialiasing: bool = True) -> Optional[Dict]:
+        """
+        Pixel-diff a capture against the previous capture of the same page and device
+        Args:
+            screenshot_path: Capture to check
+            channel_tolerance: Allowed per-channel difference, one value or (r, g, b[, a])
+            antialiasing: Ignore anti-aliasing noise along edges
+        Returns: Diff result with mismatch percentage and overlay path, or None without a previous capture
+        """
+        previous = self.find_previous_capture(screenshot_path)
+        if previous is None:
+            return None
+        
+        stem = os.path.splitext(os.path.basename(screenshot_path))[0]
+        overlay_path = os.path.join(self.reports_dir, 'diffs', f'{stem}_diff.png')
+        result = compare_images(previous, screenshot_path, channel_tolerance, antialiasing, overlay_path)
+        result['baseline_path'] = previous
+        result['screenshot_path'] = screenshot_path
+        return result
 
 
 class QAReportGenerator:
@@ -230,129 +265,27 @@ class QAReportGenerator:
         self.manager = ScreenshotManager(screenshots_dir)
     
     def generate_html_report(self, results: Dict, url: str, 
-                           output_path: str = None) -> str:
-        """Generate comprehensive HTML report"""
+                           output_path: str = None, progress_callback: Optional[callable] = None) -> str:
+        """Generate comprehensive HTML report, written to disk card by card"""
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         if not output_path:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             output_path = os.path.join(self.reports_dir, f'qa_report_{timestamp}.html')
+        report_dir = os.path.dirname(output_path)
+        os.makedirs(report_dir or '.', exist_ok=True)
         
         # Calculate stats
         total_devices = len(results)
         successful = sum(1 for r in results.values() if r['success'])
         failed = total_devices - successful
         
-        html_content = f"""
+        page_head = f"""
         <!DOCTYPE html>
         <html>
         <head>
             <title>ScreenQA Report - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</title>
             <meta charset="utf-8">
             <style>
-                body {{
-                    font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
-                    margin: 0;
-                    padding: 20px;
-                    background: #f5f5f5;
-                }}
-                .container {{
-                    max-width: 1200px;
-                    margin: 0 auto;
-                    background: white;
-                    border-radius: 8px;
-                    box-shadow: 0 2px 10px rgba(0,0,0,0.1);
-                    overflow: hidden;
-                }}
-                .header {{
-                    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                    color: white;
-                    padding: 30px;
-                    text-align: center;
-                }}
-                .header h1 {{
-                    margin: 0;
-                    font-size: 2.5em;
-                    font-weight: 300;
-                }}
-                .stats {{
-                    display: flex;
-                    justify-content: space-around;
-                    padding: 20px;
-                    background: #f8f9fa;
-                    border-bottom: 1px solid #dee2e6;
-                }}
-                .stat {{
-                    text-align: center;
-                }}
-                .stat-number {{
-                    font-size: 2em;
-                    font-weight: bold;
-                    color: #495057;
-                }}
-                .stat-label {{
-                    color: #6c757d;
-                    font-size: 0.9em;
-                }}
-                .success {{ color: #28a745; }}
-                .error {{ color: #dc3545; }}
-                .content {{
-                    padding: 30px;
-                }}
-                .device-grid {{
-                    display: grid;
-                    grid-template-columns: repeat(auto-fit, minmax(350px, 1fr));
-                    gap: 20px;
-                    margin-top: 20px;
-                }}
-                .device-card {{
-                    border: 1px solid #dee2e6;
-                    border-radius: 8px;
-                    overflow: hidden;
-                    box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-                }}
-                .device-header {{
-                    padding: 15px;
-                    background: #f8f9fa;
-                    border-bottom: 1px solid #dee2e6;
-                }}
-                .device-name {{
-                    font-weight: bold;
-                    font-size: 1.1em;
-                }}
-                .device-info {{
-                    color: #6c757d;
-                    font-size: 0.9em;
-                    margin-top: 5px;
-                }}
-                .screenshot-container {{
-                    text-align: center;
-                    padding: 15px;
-                }}
-                .screenshot {{
-                    max-width: 100%;
-                    height: auto;
-                    border-radius: 4px;
-                    box-shadow: 0 2px 8px rgba(0,0,0,0.15);
-                }}
-                .error-message {{
-                    color: #dc3545;
-                    padding: 15px;
-                    background: #f8d7da;
-                    border-radius: 4px;
-                    margin: 10px;
-                }}
-                .metadata {{
-                    background: #f8f9fa;
-                    padding: 15px;
-                    font-size: 0.9em;
-                    color: #6c757d;
-                }}
-                .footer {{
-                    text-align: center;
-                    padding: 20px;
-                    background: #f8f9fa;
-                    color: #6c757d;
-                    border-top: 1px solid #dee2e6;
-                }}
+{REPORT_CSS}
             </style>
         </head>
         <body>
@@ -391,50 +324,20 @@ class QAReportGenerator:
                     <div class="device-grid">
         """
         
-        # Add device cards
-        for device_name, result in results.items():
-            if result['success']:
-                # Convert path to relative for HTML
-                rel_path = os.path.relpath(result['screenshot_path'], os.path.dirname(output_path))
-                
-                device_info = result.get('device_info', {})
-                resolution = f"{device_info.get('width', 'Unknown')}x{device_info.get('height', 'Unknown')}"
-                platform = device_info.get('platform', 'Unknown')
-                
-                # Get file size
-                try:
-                    file_size = os.path.getsize(result['screenshot_path'])
-                    size_str = f"{file_size / 1024:.1f} KB"
-                except:
-                    size_str = "Unknown"
-                
-                html_content += f"""
-                        <div class="device-card">
-                            <div class="device-header">
-                                <div class="device-name success">✓ {device_name}</div>
-                                <div class="device-info">
-                                    {platform} • {resolution} • {size_str}
-                                </div>
-                            </div>
-                            <div class="screenshot-container">
-                                <img src="{rel_path}" alt="{device_name} screenshot" class="screenshot">
-                            </div>
-                        </div>
-                """
-            else:
-                html_content += f"""
-                        <div class="device-card">
-                            <div class="device-header">
-                                <div class="device-name error">✗ {device_name}</div>
-                                <div class="device-info">Capture failed</div>
-                            </div>
-                            <div class="error-message">
-                                {result.get('error', 'Unknown error occurred')}
-                            </div>
-                        </div>
-                """
+        # Thumbnails for every capture, generated in parallel; full captures only load on click
+        thumbnails = report_thumbnails(
+            self.screenshots_dir,
+            [r['screenshot_path'] for r in results.values() if r['success'] and r.get('screenshot_path')],
+            progress_callback=progress_callback)
         
-        html_content += f"""
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write(page_head)
+            for index, (device_name, result) in enumerate(results.items(), 1):
+                if progress_callback:
+                    progress_callback(f"Writing report card {index}/{total_devices}")
+                f.write(render_device_card(device_name, result, report_dir,
+                                           thumbnails.get(result.get('screenshot_path'))))
+            f.write(f"""
                     </div>
                 </div>
                 
@@ -444,79 +347,208 @@ class QAReportGenerator:
             </div>
         </body>
         </html>
-        """
-        
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(html_content)
+        """)
         
         return output_path
     
+    def generate_run_report(self, manifest_path: str, paginate: str = 'url', page_size: int = PAGE_SIZE,
+                            workers: int = 4, progress_callback: Optional[callable] = None) -> str:
+        """
+        Paginated HTML report for a whole run, streamed from its manifest
+        Args:
+            manifest_path: Run manifest (JSONL)
+            paginate: One page per "url" or per "device"
+            page_size: Maximum results per page
+            workers: Pages rendered in parallel
+            progress_callback: Optional callback for progress updates
+        Returns: Path of the index page
+        """
+        manifest = RunManifest(manifest_path)
+        output_dir = os.path.join(self.reports_dir, f'{manifest.run_id}_by_{paginate}')
+        writer = ReportWriter(self.screenshots_dir, output_dir, paginate, page_size, workers)
+        return writer.write(manifest, progress_callback)
+    
+    def generate_run_diff(self, baseline_manifest_path: str, candidate_manifest_path: str,
+                          channel_tolerance=0, workers: int = 4,
+                          progress_callback: Optional[callable] = None) -> str:
+        """
+        Report what changed between two runs, joined by URL, device and screenshot mode
+        Args:
+            baseline_manifest_path: Manifest of the earlier run
+            candidate_manifest_path: Manifest of the later run
+            channel_tolerance: Allowed per-channel difference, one value or (r, g, b[, a])
+            workers: Pairs diffed in parallel
+            progress_callback: Optional callback for progress updates
+        Returns: Path of the index page
+        """
+        baseline = RunManifest(baseline_manifest_path)
+        candidate = RunManifest(candidate_manifest_path)
+        output_dir = os.path.join(self.reports_dir, f'{baseline.run_id}_vs_{candidate.run_id}')
+        writer = RunDiffWriter(self.screenshots_dir, output_dir, channel_tolerance, workers=workers)
+        return writer.write(baseline, candidate, progress_callback)
+    
+    def export_report(self, results: Dict, url: str, output_path: str = None, bundle: bool = False,
+                      quality: int = WEBP_QUALITY, max_size: Optional[Tuple[int, int]] = None,
+                      max_total_bytes: Optional[int] = None, progress_callback: Optional[callable] = None) -> str:
+        """
+        Self-contained report that can be moved or shared: one HTML file with inline images, or a zip bundle
+        Args:
+            results: Capture results by device
+            url: Captured URL
+            output_path: Output path (defaults to a timestamped .html or .zip in the reports directory)
+            bundle: Write a zip bundle with a manifest instead of a single HTML file
+            quality: WebP quality of embedded images
+            max_size: Box each image is scaled into
+            max_total_bytes: Budget for all embedded images
+            progress_callback: Optional callback for progress updates
+        Returns: Path of the export
+        """
+        if not output_path:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            output_path = os.path.join(self.reports_dir, f'qa_report_{timestamp}.{"zip" if bundle else "html"}')
+        exporter = ReportExporter(quality, max_size, max_total_bytes)
+        export = exporter.export_zip if bundle else exporter.export_html
+        return export(output_path, "ScreenQA Testing Report", url, results.items(), progress_callback)
+    
+    def export_run(self, manifest_path: str, bundle: bool = True, quality: int = WEBP_QUALITY,
+                   max_size: Optional[Tuple[int, int]] = None, max_total_bytes: Optional[int] = None,
+                   progress_callback: Optional[callable] = None) -> str:
+        """
+        Self-contained export of a whole run, streamed from its manifest
+        Args:
+            manifest_path: Run manifest (JSONL)
+            bundle: Write a zip bundle with a manifest instead of a single HTML file
+            quality: WebP quality of embedded images
+            max_size: Box each image is scaled into
+            max_total_bytes: Budget for all embedded images
+            progress_callback: Optional callback for progress updates
+        Returns: Path of the export
+        """
+        manifest = RunManifest(manifest_path)
+        header = manifest.header() or {}
+        output_path = os.path.join(self.reports_dir, f'{manifest.run_id}.{"zip" if bundle else "html"}')
+        results = ((f"{r['device']} - {r['url']}", r) for r in manifest.iter_results())
+        exporter = ReportExporter(quality, max_size, max_total_bytes)
+        export = exporter.export_zip if bundle else exporter.export_html
+        return export(output_path, f"ScreenQA Run {manifest.run_id}",
+                      f"Started {header.get('started', 'unknown')}", results, progress_callback)
+    
+    def add_visual_diffs(self, results: Dict, channel_tolerance=0,
+                         progress_callback: Optional[callable] = None) -> Dict:
+        """Diff each successful capture against its approved baseline, or the previous capture without one"""
+        for index, (device_name, result) in enumerate(results.items(), 1):
+            if result.get('success') and result.get('screenshot_path') and 'visual_diff' not in result:
+                if progress_callback:
+                    progress_callback(f"Diffing {device_name} ({index}/{len(results)})")
+                try:
+                    result['visual_diff'] = (
+                        self.manager.compare_with_baseline(result['screenshot_path'], channel_tolerance) or
+                        self.manager.compare_with_previous(result['screenshot_path'], channel_tolerance))
+                except Exception as e:
+                    print(f"Error diffing {device_name}: {e}")
+        return results
+    
+    def add_layout_similarity(self, results: Dict, progress_callback: Optional[callable] = None) -> Dict:
+        """Score cross-device layout consistency and flag the devices that diverge"""
+        screenshots = {device_name: result['screenshot_path'] for device_name, result in results.items()
+                       if result.get('success') and result.get('screenshot_path')}
+        if progress_callback:
+            progress_callback(f"Scoring layout consistency of {len(screenshots)} captures")
+        try:
+            similarity = self.manager.score_layout_consistency(screenshots)
+        except Exception as e:
+            print(f"Error scoring layouts: {e}")
+            return results
+        for device_name, scores in similarity['devices'].items():
+            results[device_name]['layout_similarity'] = scores
+        return results
+    
     def generate_pdf_report(self, results: Dict, url: str, 
-                           output_path: str = None) -> str:
-        """Generate PDF report"""
+                           output_path: str = None, max_pages: Optional[int] = MAX_PAGES,
+                           progress_callback: Optional[callable] = None) -> str:
+        """
+        Generate a PDF report with a downsampled image of every capture
+        Args:
+            results: Capture results by device
+            url: Captured URL
+            output_path: PDF path (defaults to a timestamped file in the reports directory)
+            max_pages: Pages per file; longer reports continue in _part<N> files
+            progress_callback: Optional callback for progress updates
+        Returns: Path of the (first) PDF file
+        """
         if not output_path:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             output_path = os.path.join(self.reports_dir, f'qa_report_{timestamp}.pdf')
-        
-        # Create PDF
-        c = canvas.Canvas(output_path, pagesize=A4)
-        width, height = A4
-        
-        # Title page
-        c.setFont("Helvetica-Bold", 24)
-        c.drawCentredText(width/2, height - 100, "ScreenQA Testing Report")
-        
-        c.setFont("Helvetica", 12)
-        c.drawCentredText(width/2, height - 150, f"URL: {url}")
-        c.drawCentredText(width/2, height - 170, f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
         
         # Stats
         total_devices = len(results)
         successful = sum(1 for r in results.values() if r['success'])
-        
-        c.drawCentredText(width/2, height - 220, f"Total Devices: {total_devices}")
-        c.drawCentredText(width/2, height - 240, f"Successful Captures: {successful}")
-        c.drawCentredText(width/2, height - 260, f"Success Rate: {successful/total_devices*100:.1f}%")
-        
-        y_position = height - 320
-        
-        # Device results
-        c.setFont("Helvetica-Bold", 16)
-        c.drawString(50, y_position, "Device Results:")
-        y_position -= 30
-        
-        c.setFont("Helvetica", 10)
-        for device_name, result in results.items():
-            if y_position < 100:
-                c.showPage()
-                y_position = height - 50
-            
-            status = "SUCCESS" if result['success'] else "FAILED"
-            c.drawString(50, y_position, f"• {device_name}: {status}")
-            
-            if result['success'] and result.get('device_info'):
-                device_info = result['device_info']
-                resolution = f"{device_info.get('width')}x{device_info.get('height')}"
-                c.drawString(70, y_position - 15, f"Resolution: {resolution}")
-                c.drawString(70, y_position - 30, f"Platform: {device_info.get('platform', 'Unknown')}")
-                y_position -= 45
-            elif not result['success']:
-                c.drawString(70, y_position - 15, f"Error: {result.get('error', 'Unknown error')}")
-                y_position -= 30
-            else:
-                y_position -= 15
-        
-        c.save()
-        return output_path
+        title_lines = [
+            f"URL: {url}",
+            f"Total Devices: {total_devices}",
+            f"Successful Captures: {successful}",
+            f"Success Rate: {successful / total_devices * 100 if total_devices else 0:.1f}%"
+        ]
+        
+        writer = PDFReportWriter(max_pages=max_pages)
+        return writer.write(output_path, title_lines, results.items(), progress_callback)[0]
+    
+    def generate_run_pdf(self, manifest_path: str, split_by_url: bool = False,
+                         max_pages: Optional[int] = MAX_PAGES,
+                         progress_callback: Optional[callable] = None) -> List[str]:
+        """
+        PDF report for a whole run, streamed from its manifest
+        Args:
+            manifest_path: Run manifest (JSONL)
+            split_by_url: Write one PDF per URL instead of one for the run
+            max_pages: Pages per file; longer reports continue in _part<N> files
+            progress_callback: Optional callback for progress updates
+        Returns: Paths of all written PDF files
+        """
+        manifest = RunManifest(manifest_path)
+        output_dir = os.path.join(self.reports_dir, f'{manifest.run_id}_pdf')
+        os.makedirs(output_dir, exist_ok=True)
+        writer = PDFReportWriter(max_pages=max_pages)
+        
+        # One pass for stats and per-URL offsets; pages then read results back lazily
+        total = successful = 0
+        offsets_by_url = {}
+        for offset, record in manifest.iter_records():
+            offsets_by_url.setdefault(record['url'], []).append(offset)
+            total += 1
+            successful += bool(record.get('success'))
+        
+        def stats_lines(count, ok):
+            return [f"Captures: {count}", f"Successful: {ok}",
+                    f"Success Rate: {ok / count * 100 if count else 0:.1f}%"]
+        
+        if not split_by_url:
+            results = ((f"{r['device']} - {r['url']}", r) for r in manifest.iter_results())
+            return writer.write(os.path.join(output_dir, f'{manifest.run_id}.pdf'),
+                                [f"Run: {manifest.run_id}"] + stats_lines(total, successful), results,
+                                progress_callback)
+        
+        paths = []
+        for url, offsets in offsets_by_url.items():
+            ok = sum(1 for r in manifest.read_at(offsets) if r.get('success'))
+            results = ((r['device'], r) for r in manifest.read_at(offsets))
+            filename = f"{manifest.run_id}_{page_slug(url)}.pdf"
+            paths.extend(writer.write(os.path.join(output_dir, filename),
+                                      [f"URL: {url}"] + stats_lines(len(offsets), ok), results,
+                                      progress_callback))
+        return paths
     
     def generate_comparison_report(self, screenshot_groups: Dict[str, List[str]], 
-                                 output_path: str = None) -> str:
-        """Generate comparison report for multiple screenshot sets"""
+                                 output_path: str = None, progress_callback: Optional[callable] = None) -> str:
+        """Generate comparison report for multiple screenshot sets, written to disk group by group"""
         if not output_path:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             output_path = os.path.join(self.reports_dir, f'comparison_report_{timestamp}.html')
+        report_dir = os.path.dirname(output_path)
+        os.makedirs(report_dir or '.', exist_ok=True)
         
-        html_content = """
+        page_head = """
         <!DOCTYPE html>
         <html>
         <head>
@@ -532,34 +564,42 @@ class QAReportGenerator:
             <h1>ScreenQA Comparison Report</h1>
         """
         
-        for group_name, screenshots in screenshot_groups.items():
-            html_content += f"""
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write(page_head)
+            for index, (group_name, screenshots) in enumerate(screenshot_groups.items(), 1):
+                if progress_callback:
+                    progress_callback(f"Writing comparison group {index}/{len(screenshot_groups)}")
+                f.write(f"""
             <div class="comparison-group">
                 <h2>{group_name}</h2>
                 <div class="screenshots">
-            """
-            
-            for screenshot in screenshots:
-                rel_path = os.path.relpath(screenshot, os.path.dirname(output_path))
-                filename = os.path.basename(screenshot)
-                html_content += f'<img src="{rel_path}" alt="{filename}" class="screenshot">'
+            """)
+                
+                for screenshot in screenshots:
+                    rel_path = os.path.relpath(screenshot, report_dir or '.')
+                    filename = os.path.basename(screenshot)
+                    f.write(f'<img src="{rel_path}" alt="{filename}" class="screenshot" loading="lazy">')
+                
+                f.write("</div></div>")
             
-            html_content += "</div></div>"
-        
-        html_content += """
+            f.write("""
         </body>
         </html>
-        """
-        
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(html_content)
+        """)
         
         return output_path
 
 
 # Additional utility functions
 def batch_resize_screenshots(screenshots_dir: str, max_width: int = 1920, max_height: int = 1080):
-    """Batch resize screenshots to reduce file size"""
+    """Batch resize screenshots to reduce file size
+
+    Deprecated: resizing in place throws away the pixels baselines, diffs and
+    deduplication compare. Use recompression.batch_recompress (Tools >
+    Recompress Screenshots...), which shrinks files losslessly in parallel.
+    """
+    warnings.warn("batch_resize_screenshots is deprecated; use recompression.batch_recompress",
+                  DeprecationWarning, stacklevel=2)
     resized_count = 0
     
     for filename in os.listdir(screenshots_dir):
@@ -577,36 +617,17 @@ def batch_resize_screenshots(screenshots_dir: str, max_width: int = 1920, max_he
     return resized_count
 
 
-def create_device_comparison_matrix(results: Dict, output_path: str):
-    """Create a visual comparison matrix of all devices"""
-    devices = list(results.keys())
-    successful_devices = [name for name, result in results.items() if result['success']]
-    
-    if not successful_devices:
+def create_device_comparison_matrix(results: Dict, output_path: str,
+                                    screenshots_dir: Optional[str] = None,
+                                    progress_callback: Optional[callable] = None) -> bool:
+    """Create a contact sheet of all successful devices from cached thumbnails"""
+    entries = [(device_name, result['screenshot_path']) for device_name, result in results.items()
+               if result['success']]
+    if not entries:
         return False
     
-    # Create figure
-    fig, axes = plt.subplots(1, len(successful_devices), figsize=(20, 5))
-    if len(successful_devices) == 1:
-        axes = [axes]
-    
-    for i, device_name in enumerate(successful_devices):
-        result = results[device_name]
-        if result['success']:
-            try:
-                img = Image.open(result['screenshot_path'])
-                axes[i].imshow(img)
-                axes[i].set_title(f"{device_name}\\n{img.width}x{img.height}", fontsize=8)
-                axes[i].axis('off')
-            except Exception as e:
-                axes[i].text(0.5, 0.5, f"Error loading\\n{device_name}", 
-                           ha='center', va='center', transform=axes[i].transAxes)
-    
-    plt.tight_layout()
-    plt.savefig(output_path, dpi=150, bbox_inches='tight')
-    plt.close()
-    
-    return True
+    screenshots_dir = screenshots_dir or os.path.dirname(entries[0][1].split(ARCHIVE_SEPARATOR)[0])
+    return bool(contact_sheet(entries, output_path, screenshots_dir, progress_callback=progress_callback))
 
 
 if __name__ == "__main__":
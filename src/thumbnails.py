@@ -0,0 +1,138 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+from urllib.parse import quote
+from PIL import Image
+from retention import open_screenshot, ARCHIVE_SEPARATOR
+
+
+THUMBS_DIRNAME = '.thumbs'
+GALLERY_SIZE = (200, 150)
+
+# Report thumbnails: srcset widths, each fitted in a box this many times taller than wide
+REPORT_WIDTHS = (320, 640, 960)
+REPORT_MAX_ASPECT = 16
+REPORT_FORMAT = 'jpg'
+REPORT_QUALITY = 80
+
+
+def thumbnail_path(screenshots_dir: str, filename: str, size: Tuple[int, int] = GALLERY_SIZE,
+                   ext: str = 'png') -> str:
+    """Cache location of a capture thumbnail"""
+    stem = os.path.splitext(os.path.basename(filename.split(ARCHIVE_SEPARATOR)[-1]))[0]
+    return os.path.join(screenshots_dir, THUMBS_DIRNAME, f'{stem}_{size[0]}x{size[1]}.{ext}')
+
+
+def make_thumbnail(img: Image.Image, size: Tuple[int, int] = GALLERY_SIZE) -> Image.Image:
+    """Downscale a decoded capture to fit a thumbnail box"""
+    ratio = min(size[0] / img.width, size[1] / img.height, 1.0)
+    target = (max(1, round(img.width * ratio)), max(1, round(img.height * ratio)))
+    if img.mode not in ('RGB', 'RGBA'):
+        img = img.convert('RGBA')
+    # reducing_gap lets Pillow box-reduce large full-page captures before the LANCZOS pass
+    return img.resize(target, Image.Resampling.LANCZOS, reducing_gap=2.0)
+
+
+def save_thumbnail(thumb: Image.Image, path: str):
+    """Write a thumbnail atomically, in the format its extension names"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Per-thread temp name: parallel report pages may generate the same thumbnail at once
+    tmp_path = f'{path}.{threading.get_ident()}.tmp'
+    if path.endswith('.jpg'):
+        # Report thumbnails favour fast encoding and small downloads over exact pixels
+        thumb.convert('RGB').save(tmp_path, format='JPEG', quality=REPORT_QUALITY)
+    else:
+        thumb.save(tmp_path, format='PNG')
+    os.replace(tmp_path, path)
+
+
+def load_thumbnail(screenshots_dir: str, ref: str, size: Tuple[int, int] = GALLERY_SIZE) -> Image.Image:
+    """Load a cached thumbnail, generating it from the capture on a miss"""
+    path = thumbnail_path(screenshots_dir, ref, size)
+    if os.path.exists(path):
+        thumb = Image.open(path)
+        thumb.load()
+        return thumb
+
+    # Smaller sizes can be derived from the gallery thumbnail instead of the full capture
+    gallery_path = thumbnail_path(screenshots_dir, ref, GALLERY_SIZE)
+    source = gallery_path if size != GALLERY_SIZE and os.path.exists(gallery_path) else None
+
+    with (Image.open(source) if source else open_screenshot(ref)) as img:
+        thumb = make_thumbnail(img, size)
+    try:
+        save_thumbnail(thumb, path)
+    except OSError as e:
+        print(f"Could not cache thumbnail {path}: {e}")
+    return thumb
+
+
+def _report_variants(screenshots_dir: str, ref: str, widths: Sequence[int]) -> List[Tuple[str, int, int]]:
+    """Cached report thumbnails of one capture as (path, width, height), decoding it only on a miss"""
+    boxes = [(width, width * REPORT_MAX_ASPECT) for width in sorted(widths, reverse=True)]
+    paths = [thumbnail_path(screenshots_dir, ref, box, REPORT_FORMAT) for box in boxes]
+    variants = []
+    if all(os.path.exists(path) for path in paths):
+        for path in paths:
+            with Image.open(path) as thumb:
+                variants.append((path, thumb.width, thumb.height))
+        return variants[::-1]
+
+    # Decode once; each smaller size is derived from the previous one rather than the capture
+    with open_screenshot(ref) as img:
+        source = make_thumbnail(img, boxes[0])
+    for box, path in zip(boxes, paths):
+        thumb = make_thumbnail(source, box)
+        if not os.path.exists(path):
+            save_thumbnail(thumb, path)
+        variants.append((path, thumb.width, thumb.height))
+        source = thumb
+    return variants[::-1]
+
+
+def report_thumbnails(screenshots_dir: str, refs: Sequence[str], widths: Sequence[int] = REPORT_WIDTHS,
+                      max_workers: int = 8, progress_callback: Optional[callable] = None
+                      ) -> Dict[str, List[Tuple[str, int, int]]]:
+    """
+    Generate (or reuse) report thumbnails for many captures in parallel
+    Args:
+        screenshots_dir: Screenshots directory holding the thumbnail cache
+        refs: Capture paths or archive references
+        widths: Thumbnail widths for srcset
+        max_workers: Parallel decode threads
+        progress_callback: Optional callback for progress updates
+    Returns: Capture -> [(thumbnail path, width, height)] smallest first; failed captures are left out
+    """
+    def generate(ref):
+        try:
+            return ref, _report_variants(screenshots_dir, ref, widths)
+        except Exception as e:
+            print(f"Could not create report thumbnails for {ref}: {e}")
+            return ref, None
+
+    refs = list(dict.fromkeys(refs))
+    thumbnails = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for done, (ref, variants) in enumerate(executor.map(generate, refs), 1):
+            if variants:
+                thumbnails[ref] = variants
+            if progress_callback:
+                progress_callback(f"Preparing thumbnails {done}/{len(refs)}")
+    return thumbnails
+
+
+def html_url(path: str, base_dir: str) -> str:
+    """Relative, URL-quoted link from an HTML file's directory to a local file"""
+    return quote(os.path.relpath(path, base_dir).replace(os.sep, '/'))
+
+
+def thumbnail_img_attributes(variants: List[Tuple[str, int, int]], base_dir: str,
+                             sizes: str = '(max-width: 800px) 100vw, 360px') -> str:
+    """src, srcset, sizes and intrinsic dimensions for a lazily loaded report image"""
+    path, width, height = variants[0]
+    # Captures narrower than the larger sizes yield identical widths; list each width once
+    distinct = {w: p for p, w, _ in reversed(variants)}
+    srcset = ', '.join(f'{html_url(p, base_dir)} {w}w' for w, p in sorted(distinct.items()))
+    return (f'src="{html_url(path, base_dir)}" srcset="{srcset}" sizes="{sizes}" '
+            f'width="{width}" height="{height}" loading="lazy" decoding="async"')
@@ -0,0 +1,402 @@
+import io
+import os
+import time
+import zlib
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+import numpy as np
+from PIL import Image
+from capture_pipeline import CaptureFrame, open_image
+from change_regions import add_band_cells, cell_grid, regions_from_cells, MAX_REGIONS
+from png_stream import PngBandReader, PngBandWriter, UnsupportedPng
+from retention import ARCHIVE_SEPARATOR
+
+
+BAND_HEIGHT = 64
+DENSE_BAND_RATIO = 0.05  # Above this share of changed pixels, AA checks shift whole bands instead of gathering
+OVERLAY_DIFF_COLOR = (255, 0, 0)
+OVERLAY_AA_COLOR = (255, 200, 0)
+OVERLAY_FADE = np.array([255 - (255 - v) // 4 for v in range(256)], dtype=np.uint8)
+
+
+def _tolerance_array(channel_tolerance: Union[int, Sequence[int]]) -> np.ndarray:
+    """Per-channel RGBA tolerance from a single value or an (r, g, b[, a]) tuple"""
+    if isinstance(channel_tolerance, int):
+        return np.full(4, channel_tolerance, dtype=np.uint8)
+    values = list(channel_tolerance) + [0] * (4 - len(channel_tolerance))
+    return np.array(values[:4], dtype=np.uint8)
+
+
+def _close(a: np.ndarray, b: np.ndarray, tolerance: np.ndarray) -> np.ndarray:
+    """Pixels whose every channel is within tolerance"""
+    if not tolerance.any():
+        # Exact match: compare whole RGBA pixels as 32-bit words
+        return a.view(np.uint32)[..., 0] == b.view(np.uint32)[..., 0]
+    # max - min stays in uint8, avoiding a widened copy of the band
+    return np.all(np.maximum(a, b) - np.minimum(a, b) <= tolerance, axis=-1)
+
+
+def _has_neighbour_match(pixels: np.ndarray, other: np.ndarray, tolerance: np.ndarray,
+                         ys: np.ndarray, xs: np.ndarray) -> np.ndarray:
+    """For the given pixel coordinates, whether any 3x3 neighbour in other matches within tolerance"""
+    height, width = other.shape[:2]
+    target = pixels[ys, xs]
+    matched = np.zeros(len(ys), dtype=bool)
+    for dy in (-1, 0, 1):
+        ny = np.clip(ys + dy, 0, height - 1)
+        for dx in (-1, 0, 1):
+            if dx == 0 and dy == 0:
+                continue  # The pixel itself is already known to differ
+            # Only pixels still without a match are gathered again
+            idx = np.nonzero(~matched)[0]
+            if not len(idx):
+                return matched
+            nx = np.clip(xs[idx] + dx, 0, width - 1)
+            neighbour = other[ny[idx], nx]
+            matched[idx] = _close(target[idx], neighbour, tolerance)
+    return matched
+
+
+def _has_neighbour_match_dense(pixels: np.ndarray, other: np.ndarray, tolerance: np.ndarray,
+                               top: int, rows: int) -> np.ndarray:
+    """Whole-band variant of _has_neighbour_match using shifted slices, for heavily changed bands"""
+    height, width = other.shape[:2]
+    target = pixels[top:top + rows]
+    matched = np.zeros(target.shape[:2], dtype=bool)
+    for dy in (-1, 0, 1):
+        src_top = top + dy
+        lo = max(0, -src_top)
+        hi = rows - max(0, src_top + rows - height)
+        for dx in (-1, 0, 1):
+            if (dx == 0 and dy == 0) or hi <= lo:
+                continue
+            x0 = max(0, -dx)
+            x1 = width - max(0, dx)
+            shifted = other[src_top + lo:src_top + hi, x0 + dx:x1 + dx]
+            matched[lo:hi, x0:x1] |= _close(target[lo:hi, x0:x1], shifted, tolerance)
+    return matched
+
+
+def diff_band(baseline: np.ndarray, candidate: np.ndarray, top: int, rows: int,
+              tolerance: np.ndarray, antialiasing: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Diff rows [top, top + rows) of two equally sized RGBA arrays
+    Args:
+        baseline: Baseline pixels (neighbouring rows are read for anti-aliasing checks)
+        candidate: Candidate pixels
+        top: First row of the band
+        rows: Number of rows in the band
+        tolerance: Per-channel RGBA tolerance
+        antialiasing: Ignore pixels that match a 3x3 neighbour in the other image
+    Returns: (changed mask, anti-aliased mask) for the band
+    """
+    changed = ~_close(baseline[top:top + rows], candidate[top:top + rows], tolerance)
+    antialiased = np.zeros_like(changed)
+    if antialiasing and changed.any():
+        # A one-pixel shift of an edge is rendering noise, not a regression;
+        # neighbours are only gathered for the changed pixels
+        if changed.mean() > DENSE_BAND_RATIO:
+            antialiased = changed & \
+                _has_neighbour_match_dense(candidate, baseline, tolerance, top, rows) & \
+                _has_neighbour_match_dense(baseline, candidate, tolerance, top, rows)
+        else:
+            ys, xs = np.nonzero(changed)
+            ys = ys + top
+            shifted = _has_neighbour_match(candidate, baseline, tolerance, ys, xs)
+            if shifted.any():
+                hit = np.nonzero(shifted)[0]
+                shifted[hit] = _has_neighbour_match(baseline, candidate, tolerance, ys[hit], xs[hit])
+            antialiased[ys[shifted] - top, xs[shifted]] = True
+        changed &= ~antialiased
+    return changed, antialiased
+
+
+def _band(pixels: np.ndarray, top: int, rows: int, width: int) -> np.ndarray:
+    """Rows [top, top + rows) padded with transparent pixels to the comparison size"""
+    band = pixels[top:top + rows]
+    if band.shape[:2] == (rows, width):
+        return band
+    padded = np.zeros((rows, width, 4), dtype=np.uint8)
+    padded[:band.shape[0], :band.shape[1]] = band
+    return padded
+
+
+def _band_hash(pixels: np.ndarray, top: int, rows: int, width: int) -> int:
+    return zlib.crc32(np.ascontiguousarray(_band(pixels, top, rows, width)))
+
+
+def band_hashes(pixels: np.ndarray, band_height: int = BAND_HEIGHT) -> List[int]:
+    """Per-band CRC32 fingerprints of an unpadded image (cacheable for baselines)"""
+    height, width = pixels.shape[:2]
+    return [_band_hash(pixels, top, min(band_height, height - top), width)
+            for top in range(0, height, band_height)]
+
+
+def _padded_band(band: Optional[np.ndarray], rows: int, width: int) -> np.ndarray:
+    """A streamed band padded with transparent pixels to the comparison size (all padding past the image end)"""
+    if band is None:
+        return np.zeros((rows, width, 4), dtype=np.uint8)
+    return _band(band, 0, rows, width)
+
+
+def _image_bands(img: Image.Image, band_height: int) -> Iterator[np.ndarray]:
+    """RGBA bands cropped from a decoded image, one band converted at a time"""
+    for top in range(0, img.height, band_height):
+        band = img.crop((0, top, img.width, min(img.height, top + band_height)))
+        yield np.asarray(band if band.mode == 'RGBA' else band.convert('RGBA'))
+
+
+def _array_bands(pixels: np.ndarray, band_height: int) -> Iterator[np.ndarray]:
+    return (pixels[top:top + band_height] for top in range(0, pixels.shape[0], band_height))
+
+
+@contextmanager
+def _open_binary(source: Union[str, bytes]):
+    """Binary file object for a path, archive reference ("archive.zip::member") or encoded bytes"""
+    if isinstance(source, (bytes, bytearray)):
+        yield io.BytesIO(source)
+    elif ARCHIVE_SEPARATOR in source:
+        archive_path, member = source.split(ARCHIVE_SEPARATOR, 1)
+        with zipfile.ZipFile(archive_path) as archive, archive.open(member) as f:
+            yield f
+    else:
+        with open(source, 'rb') as f:
+            yield f
+
+
+@contextmanager
+def open_bands(source, band_height: int = BAND_HEIGHT):
+    """
+    Stream a capture as RGBA bands of rows
+    PNG files are inflated one band at a time, so memory follows the band
+    size rather than the page height; other formats and PNG layouts the
+    band reader does not handle are decoded whole and cropped into bands.
+    Args:
+        source: Capture (path, archive reference, bytes, image, capture frame, RGBA array or .npy path)
+        band_height: Rows per band
+    Returns: Context manager giving ((width, height), iterator of RGBA bands, the last one possibly shorter)
+    """
+    if isinstance(source, str) and source.endswith('.npy'):
+        source = np.load(source, mmap_mode='r')
+    if isinstance(source, np.ndarray):
+        yield (source.shape[1], source.shape[0]), _array_bands(source, band_height)
+        return
+    if isinstance(source, CaptureFrame) and source._image is None:
+        # Not decoded yet: stream the encoded capture instead of decoding it whole
+        source = source.png_bytes if source.png_bytes is not None else source.filepath
+    if isinstance(source, (Image.Image, CaptureFrame)):
+        # Caller-owned pixels: read them, leave closing to the caller
+        img = open_image(source)
+        yield img.size, _image_bands(img, band_height)
+        return
+
+    with _open_binary(source) as f:
+        try:
+            reader = PngBandReader(f)
+        except UnsupportedPng:
+            reader = None
+        if reader is not None:
+            yield reader.size, reader.bands(band_height)
+            return
+    with open_image(source) as img:
+        yield img.size, _image_bands(img, band_height)
+
+
+def _diff_streams(baseline_bands: Iterator[np.ndarray], candidate_bands: Iterator[np.ndarray],
+                  height: int, width: int, size_mismatch: bool, tolerance: np.ndarray, antialiasing: bool,
+                  band_height: int, workers: Optional[int], baseline_hashes: Optional[List[int]],
+                  on_band: Callable[[int, np.ndarray, np.ndarray], None]) -> Dict:
+    """
+    Walk two band streams in lockstep, diffing only the bands whose hashes differ
+    Each diffed band gets a one-row halo from its neighbours so anti-aliasing
+    checks see across band edges; at most three bands per image and a few
+    diffs in flight are held at any time. on_band(top, changed, antialiased)
+    receives every band that was diffed.
+    Returns: Summary counts (see compare_images)
+    """
+    tops = range(0, height, band_height)
+    summary = {
+        'width': width,
+        'height': height,
+        'size_mismatch': size_mismatch,
+        'identical': False,
+        'mismatch_pixels': 0,
+        'antialiased_pixels': 0,
+        'mismatch_percent': 0.0,
+        'bands_total': len(tops),
+        'bands_compared': 0,
+        'bands_changed': 0
+    }
+    # Stored baseline hashes are only valid when no padding is involved
+    use_stored = baseline_hashes is not None and not size_mismatch and len(baseline_hashes) == len(tops)
+    workers = workers or os.cpu_count() or 1
+    in_flight = deque()
+
+    def collect(limit):
+        while len(in_flight) > limit:
+            top, future = in_flight.popleft()
+            changed, antialiased = future.result()
+            summary['bands_compared'] += 1
+            summary['antialiased_pixels'] += int(antialiased.sum())
+            mismatches = int(changed.sum())
+            if mismatches:
+                summary['mismatch_pixels'] += mismatches
+                summary['bands_changed'] += 1
+            on_band(top, changed, antialiased)
+
+    def submit(before, band, after):
+        top, rows, a, b, _ = band
+        halo = 1 if before else 0
+        a = np.concatenate(([before[2][-1:]] if before else []) + [a] + ([after[2][:1]] if after else []))
+        b = np.concatenate(([before[3][-1:]] if before else []) + [b] + ([after[3][:1]] if after else []))
+        in_flight.append((top, executor.submit(diff_band, a, b, halo, rows, tolerance, antialiasing)))
+        collect(2 * workers)
+
+    # NumPy and zlib release the GIL on large buffers, so threads scale without copying bands to processes
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Bands as (top, rows, baseline pixels, candidate pixels, hashes differ); a band is diffed once the next arrives
+        previous = current = None
+        for index, top in enumerate(tops):
+            rows = min(band_height, height - top)
+            a = _padded_band(next(baseline_bands, None), rows, width)
+            b = _padded_band(next(candidate_bands, None), rows, width)
+            baseline_hash = baseline_hashes[index] if use_stored else zlib.crc32(np.ascontiguousarray(a))
+            following = (top, rows, a, b, baseline_hash != zlib.crc32(np.ascontiguousarray(b)))
+            if current and current[4]:
+                submit(previous, current, following)
+            previous, current = current, following
+        if current and current[4]:
+            submit(previous, current, None)
+        collect(0)
+
+    summary['identical'] = summary['bands_compared'] == 0
+    summary['mismatch_percent'] = round(100.0 * summary['mismatch_pixels'] / (width * height), 4) \
+        if width * height else 0.0
+    return summary
+
+
+def _write_overlay(candidate_bands: Iterator[np.ndarray], band_masks: Dict[int, Tuple[bytes, bytes]],
+                   height: int, width: int, band_height: int, overlay_path: str):
+    """
+    Stream the diff overlay: the faded greyscale candidate with changed pixels in red and anti-aliased ones in yellow
+    Args:
+        candidate_bands: Candidate RGBA bands
+        band_masks: {band top row: (packed changed mask, packed anti-aliased mask)} for bands to colour
+        height: Overlay height
+        width: Overlay width
+        band_height: Rows per band
+        overlay_path: Output PNG
+    """
+    with PngBandWriter(overlay_path, width, height) as writer:
+        for top in range(0, height, band_height):
+            rows = min(band_height, height - top)
+            band = np.ascontiguousarray(_padded_band(next(candidate_bands, None), rows, width))
+            grey = OVERLAY_FADE[np.asarray(Image.fromarray(band, 'RGBA').convert('L'))]
+            overlay = np.repeat(grey[..., None], 3, axis=2)
+            if top in band_masks:
+                changed, antialiased = (np.unpackbits(packed, count=rows * width).view(bool).reshape(rows, width)
+                                        for packed in band_masks[top])
+                overlay[antialiased] = OVERLAY_AA_COLOR
+                overlay[changed] = OVERLAY_DIFF_COLOR
+            writer.write(overlay)
+
+
+def diff_arrays(baseline: np.ndarray, candidate: np.ndarray,
+                channel_tolerance: Union[int, Sequence[int]] = 0,
+                antialiasing: bool = True,
+                band_height: int = BAND_HEIGHT,
+                workers: Optional[int] = None,
+                baseline_hashes: Optional[List[int]] = None) -> Tuple[Dict, Dict[int, Tuple[np.ndarray, np.ndarray]]]:
+    """
+    Diff two RGBA arrays (in memory or memory-mapped) in parallel bands, skipping bands whose hashes match
+    Returns: (summary, {band top row: (changed mask, anti-aliased mask)} for changed bands only)
+    """
+    band_masks = {}
+
+    def keep(top, changed, antialiased):
+        if changed.any() or antialiased.any():
+            band_masks[top] = (changed, antialiased)
+
+    summary = _diff_streams(_array_bands(baseline, band_height), _array_bands(candidate, band_height),
+                            max(baseline.shape[0], candidate.shape[0]), max(baseline.shape[1], candidate.shape[1]),
+                            baseline.shape[:2] != candidate.shape[:2], _tolerance_array(channel_tolerance),
+                            antialiasing, band_height, workers, baseline_hashes, keep)
+    return summary, band_masks
+
+
+def decode_to_npy(source, npy_path: str, chunk_rows: int = 1024) -> np.ndarray:
+    """
+    Decode a capture into an RGBA .npy file and return it memory-mapped read-only
+    Args:
+        source: Capture (path, archive reference, bytes, image or capture frame)
+        npy_path: Output .npy file
+        chunk_rows: Rows converted to RGBA at a time
+    Returns: Read-only memory map of the pixels
+    """
+    with open_bands(source, chunk_rows) as ((width, height), bands):
+        pixels = np.lib.format.open_memmap(npy_path, mode='w+', dtype=np.uint8, shape=(height, width, 4))
+        for top, band in zip(range(0, height, chunk_rows), bands):
+            pixels[top:top + band.shape[0]] = band
+        pixels.flush()
+        del pixels
+    return np.load(npy_path, mmap_mode='r')
+
+
+def compare_images(baseline, candidate, channel_tolerance: Union[int, Sequence[int]] = 0,
+                   antialiasing: bool = True, overlay_path: Optional[str] = None,
+                   band_height: int = BAND_HEIGHT, workers: Optional[int] = None,
+                   max_regions: int = MAX_REGIONS, baseline_hashes: Optional[List[int]] = None) -> Dict:
+    """
+    Compare a capture against a baseline
+    Both captures are read band by band in lockstep and each band is hashed
+    as it is decoded; only bands whose hashes differ are diffed, so identical
+    captures cost one decode and a checksum per band. Memory follows the band
+    size and the number of changed bands, not the page height.
+    Args:
+        baseline: Baseline capture (path, archive reference, bytes, image, capture frame or .npy path)
+        candidate: Capture to check
+        channel_tolerance: Allowed absolute difference per channel, one value or (r, g, b[, a])
+        antialiasing: Ignore anti-aliasing noise along edges
+        overlay_path: Where to write the diff overlay PNG (only when something changed)
+        band_height: Rows per band for hashing and diffing
+        workers: Diff threads (defaults to CPU count)
+        max_regions: Number of change regions to report, largest first
+        baseline_hashes: Precomputed band_hashes() of the baseline
+    Returns: Result dictionary with mismatch count/percentage, change regions and the overlay path
+    """
+    started = time.time()
+    band_masks = {}
+    counts = None
+
+    def keep(top, changed, antialiased):
+        # Regions are counted per band; only the overlay needs the masks, packed to a bit per pixel
+        add_band_cells(counts, changed, top)
+        if overlay_path and (changed.any() or antialiased.any()):
+            band_masks[top] = (np.packbits(changed), np.packbits(antialiased))
+
+    with open_bands(baseline, band_height) as (baseline_size, baseline_bands), \
+            open_bands(candidate, band_height) as (candidate_size, candidate_bands):
+        width = max(baseline_size[0], candidate_size[0])
+        height = max(baseline_size[1], candidate_size[1])
+        counts = cell_grid(height, width)
+        summary = _diff_streams(baseline_bands, candidate_bands, height, width, baseline_size != candidate_size,
+                                _tolerance_array(channel_tolerance), antialiasing, band_height, workers,
+                                baseline_hashes, keep)
+
+    regions = regions_from_cells(counts, height, width, max_regions=0)
+    summary['regions_total'] = len(regions)
+    summary['regions'] = regions[:max_regions]
+
+    summary['overlay_path'] = None
+    if overlay_path and summary['mismatch_pixels']:
+        os.makedirs(os.path.dirname(overlay_path) or '.', exist_ok=True)
+        # A second streamed pass over the candidate; only changed bands carry masks
+        with open_bands(candidate, band_height) as (_, candidate_bands):
+            _write_overlay(candidate_bands, band_masks, height, width, band_height, overlay_path)
+        summary['overlay_path'] = overlay_path
+
+    summary['elapsed_ms'] = round((time.time() - started) * 1000)
+    return summary